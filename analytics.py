@@ -0,0 +1,187 @@
+import logging
+import os
+from datetime import date
+
+import numpy as np
+
+from cache import LRUCache
+from log_config import setup_logging
+from archive import active_entries
+from reports import bucket_expression
+from response_cache import data_version
+from rollup import ROLLUP_METRICS
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Metrics that add up over a day or week (heart rates are averaged instead)
+CUMULATIVE_METRICS = ('steps_taken', 'distance', 'calories_burned', 'exercise_duration')
+ANALYTICS_PERCENTILES = (50, 75, 90, 95)
+ANALYTICS_ROLLING_WINDOWS = (7, 30)
+ANALYTICS_WEEKS = 12
+
+# Computed insights memoized per (user, data version, day)
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 1000))
+insights_cache = LRUCache(ANALYTICS_CACHE_SIZE)
+
+
+def load_columns(session_db, user_id: int):
+    """
+    Load a user's active tracker entries, hot and archived, into one NumPy array per column, ordered by date.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int): The user whose entries are loaded.
+
+    Returns:
+        dict: A ``datetime64[D]`` array under ``day`` and a float64 array per metric, or None without entries.
+    """
+    # Truncating to days in SQL spares building a Python datetime per entry
+    entries = active_entries(user_id)
+    day = bucket_expression(entries.c.date, 'day', session_db.get_bind().dialect.name)
+    rows = session_db.query(day, *[entries.c[metric] for metric in ROLLUP_METRICS]).order_by(entries.c.date).all()
+    if not rows:
+        return None
+
+    columns = list(zip(*rows))
+    arrays = {'day': np.array(columns[0], dtype='datetime64[D]')}
+    for metric, values in zip(ROLLUP_METRICS, columns[1:]):
+        arrays[metric] = np.array(values, dtype=np.float64)
+    return arrays
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` samples, shorter at the start of the series, computed with one cumsum."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    ends = np.arange(1, len(values) + 1)
+    return (cumulative[ends] - cumulative[ends - counts]) / counts
+
+
+def _streaks(active_days: np.ndarray, today: np.datetime64) -> dict:
+    """Longest and current runs of consecutive active days from sorted unique days."""
+    ordinals = active_days.astype(np.int64)
+    boundaries = np.flatnonzero(np.diff(ordinals) != 1) + 1
+    run_lengths = np.diff(np.concatenate(([0], boundaries, [len(ordinals)])))
+    # The current streak survives until a whole day is missed
+    last_run = int(run_lengths[-1]) if ordinals[-1] >= today.astype(np.int64) - 1 else 0
+    return {'current': last_run, 'longest': int(run_lengths.max())}
+
+
+def _iso(day: np.datetime64) -> str:
+    return str(day.astype('datetime64[D]'))
+
+
+def compute_insights(arrays: dict, today: date) -> dict:
+    """
+    Compute a user's trends and records from the arrays of `load_columns`, fully vectorized.
+
+    Args:
+        arrays (dict): The column arrays of one user.
+        today (date): The day rolling windows, weeks and the current streak end on.
+
+    Returns:
+        dict: ``summary``, ``rolling_averages`` (mean daily totals over the last 7 and 30 days), ``weeks``
+        (the last `ANALYTICS_WEEKS` weekly totals with week-over-week deltas), ``streaks``, ``percentiles``
+        (per entry) and ``personal_bests`` (best entry, day and week per cumulative metric).
+    """
+    today = np.datetime64(today, 'D')
+    days = arrays['day']
+    active_days, first_index = np.unique(days, return_index=True)
+
+    # Dense calendar of daily totals from the first entry to today, with zeros on rest days
+    first_day = active_days[0]
+    last_day = max(today, active_days[-1])
+    offsets = (active_days - first_day).astype(np.int64)
+    calendar_length = int((last_day - first_day).astype(np.int64)) + 1
+
+    # Weeks start on Monday; 1970-01-01 was a Thursday
+    first_monday = first_day - (first_day.astype(np.int64) + 3) % 7
+    week_offsets = (active_days - first_monday).astype(np.int64) // 7
+    week_count = int((last_day - first_monday).astype(np.int64)) // 7 + 1
+    week_starts = first_monday + np.arange(week_count) * 7
+    today_offset = int((today - first_day).astype(np.int64))
+
+    insights = {
+        'summary': {
+            'entry_count': int(len(days)),
+            'active_days': int(len(active_days)),
+            'first_day': _iso(active_days[0]),
+            'last_day': _iso(active_days[-1]),
+        },
+        'rolling_averages': {},
+        'weeks': [],
+        'streaks': _streaks(active_days, today),
+        'percentiles': {},
+        'personal_bests': {},
+    }
+
+    weekly_totals = {}
+    for metric in CUMULATIVE_METRICS:
+        values = arrays[metric]
+        daily = np.add.reduceat(values, first_index)
+        calendar = np.zeros(calendar_length)
+        calendar[offsets] = daily
+        weekly = np.bincount(week_offsets, weights=daily, minlength=week_count)
+        weekly_totals[metric] = weekly
+
+        if today_offset >= 0:
+            insights['rolling_averages'][metric] = {
+                f'{window}d': round(float(rolling_mean(calendar[:today_offset + 1], window)[-1]), 2)
+                for window in ANALYTICS_ROLLING_WINDOWS
+            }
+
+        best_entry, best_day, best_week = int(values.argmax()), int(daily.argmax()), int(weekly.argmax())
+        insights['personal_bests'][metric] = {
+            'entry': {'value': float(values[best_entry]), 'day': _iso(days[best_entry])},
+            'day': {'value': float(daily[best_day]), 'day': _iso(active_days[best_day])},
+            'week': {'value': float(weekly[best_week]), 'week_start': _iso(week_starts[best_week])},
+        }
+
+    for metric in ROLLUP_METRICS:
+        insights['percentiles'][metric] = {
+            f'p{percentile}': round(float(value), 2)
+            for percentile, value in zip(ANALYTICS_PERCENTILES, np.percentile(arrays[metric], ANALYTICS_PERCENTILES))
+        }
+
+    # Week-over-week changes; the change from an empty week is undefined
+    recent = slice(max(week_count - ANALYTICS_WEEKS, 0), week_count)
+    for position in range(recent.start, recent.stop):
+        week = {'week_start': _iso(week_starts[position]), 'totals': {}, 'deltas': {}, 'changes': {}}
+        for metric, weekly in weekly_totals.items():
+            previous = weekly[position - 1] if position else 0.0
+            week['totals'][metric] = round(float(weekly[position]), 2)
+            week['deltas'][metric] = round(float(weekly[position] - previous), 2)
+            week['changes'][metric] = round(float((weekly[position] - previous) / previous), 4) if previous else None
+        insights['weeks'].append(week)
+
+    return insights
+
+
+def get_insights(session_db, user_id: int, today: date = None) -> dict:
+    """
+    Get a user's insights, memoized until their tracker data changes or the day rolls over.
+
+    Args:
+        session_db: The database session to use on a cache miss.
+        user_id (int): The user to analyse.
+        today (date, optional): The current day. Defaults to today.
+
+    Returns:
+        dict: The insights of `compute_insights`, or None when the user has no entries.
+    """
+    today = today or date.today()
+    version = data_version(user_id)
+    key = (user_id, version, today)
+
+    if version is not None:
+        insights = insights_cache.get(key)
+        if insights is not None:
+            return insights
+
+    arrays = load_columns(session_db, user_id)
+    insights = compute_insights(arrays, today) if arrays is not None else None
+
+    if version is not None and insights is not None:
+        insights_cache.set(key, insights)
+    return insights
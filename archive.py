@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete, false, insert, literal, or_, select, union_all
+
+from log_config import setup_logging
+from models import DailyExerciseTracker, ArchivedExerciseTracker, Session, shard_engines
+from response_cache import bump_data_version
+from rollup import ROLLUP_METRICS
+
+load_dotenv()
+
+# Active entries older than this many days, and soft-deleted entries not touched for this many days, are
+# moved from the hot tracker table to the archive
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 730))
+ARCHIVE_DELETED_AFTER_DAYS = int(os.getenv("ARCHIVE_DELETED_AFTER_DAYS", 30))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))
+# Seconds between runs of the in-process archiver thread; 0 leaves archiving to the `archive-exercises` command
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", 0))
+
+# Columns shared by the hot and archive tables
+ENTRY_COLUMNS = ('id', 'user_id', 'date', *ROLLUP_METRICS)
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+_archiver = None
+
+
+def active_entries(user_id: int = None, start: datetime = None, end: datetime = None):
+    """
+    Get a subquery of the active (not soft-deleted) tracker entries, hot and archived.
+
+    The filters are applied to each table separately so both are read through their (user_id, date) index.
+
+    Args:
+        user_id (int, optional): Only this user's entries; all users when omitted.
+        start (datetime, optional): Only entries on or after this date.
+        end (datetime, optional): Only entries before this date.
+
+    Returns:
+        Subquery: The `ENTRY_COLUMNS` of every matching entry, plus whether it is `archived` (ids are only unique
+        within one table).
+    """
+    selects = []
+    for archived, model in ((False, DailyExerciseTracker), (True, ArchivedExerciseTracker)):
+        statement = select(*[getattr(model, column) for column in ENTRY_COLUMNS],
+                           literal(archived).label('archived')).where(model.is_active.is_(True))
+        if user_id is not None:
+            statement = statement.where(model.user_id == user_id)
+        if start is not None:
+            statement = statement.where(model.date >= start)
+        if end is not None:
+            statement = statement.where(model.date < end)
+        selects.append(statement)
+    return union_all(*selects).subquery('active_entries')
+
+
+def archive_entries(session_db, now: datetime = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move old and soft-deleted entries from the hot tracker table to the archive table.
+
+    Entries are moved in batches, each copied and deleted in one transaction, so the job can be interrupted
+    at any point. The rollups already cover archived entries and are left untouched; the response cache of
+    every affected user is invalidated since their listings show archived entries as read-only.
+
+    Args:
+        session_db: The database session to use.
+        now (datetime, optional): The current time the age cut-offs are measured from. Defaults to now.
+        batch_size (int, optional): The number of entries moved per transaction. Defaults to ARCHIVE_BATCH_SIZE.
+
+    Returns:
+        int: The number of entries archived.
+    """
+    now = now or datetime.now()
+    # Each branch is served by its own index (`date`, and `is_active, updated_at`), so a batch costs the same however
+    # large the hot table is; `= false` rather than `IS false`, which the indexes cannot serve
+    archivable = or_(
+        DailyExerciseTracker.date < now - timedelta(days=ARCHIVE_AFTER_DAYS),
+        and_(DailyExerciseTracker.is_active == false(),
+             DailyExerciseTracker.updated_at < now - timedelta(days=ARCHIVE_DELETED_AFTER_DAYS)),
+    )
+    # Archived entries are numbered by the archive table itself: a hot id can be used again once its entry is
+    # archived (SQLite hands out the highest rowid + 1), and entries moved between shards are renumbered
+    columns = [column for column in ENTRY_COLUMNS if column != 'id'] + ['is_active']
+
+    archived = 0
+    while True:
+        batch = session_db.query(DailyExerciseTracker.id, DailyExerciseTracker.user_id).filter(
+            archivable
+        ).limit(batch_size).all()
+        if not batch:
+            break
+
+        ids = [entry_id for entry_id, _ in batch]
+        session_db.execute(insert(ArchivedExerciseTracker).from_select(
+            columns,
+            select(*[getattr(DailyExerciseTracker, column) for column in columns]).where(
+                DailyExerciseTracker.id.in_(ids)
+            ),
+        ))
+        session_db.execute(delete(DailyExerciseTracker).where(DailyExerciseTracker.id.in_(ids)))
+        session_db.commit()
+
+        for user_id in {user_id for _, user_id in batch}:
+            bump_data_version(user_id)
+        archived += len(ids)
+
+    if archived:
+        logger.info(f"Archived {archived} exercise entries.")
+    return archived
+
+
+def archive_all_shards(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Run `archive_entries` on every shard and return the number of entries archived."""
+    archived = 0
+    for shard in range(len(shard_engines)):
+        with Session(shard=shard) as session_db:
+            archived += archive_entries(session_db, batch_size=batch_size)
+    return archived
+
+
+def _run_archiver(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            archive_all_shards()
+        except Exception as e:
+            logger.error(f"Archiving exercise entries failed: {str(e)}")
+
+
+def start_archiver(interval: float = ARCHIVE_INTERVAL_SECONDS):
+    """
+    Start the background thread archiving entries every `interval` seconds, once per process.
+
+    Args:
+        interval (float, optional): Seconds between runs; 0 disables the thread. Defaults to
+            ARCHIVE_INTERVAL_SECONDS.
+    """
+    global _archiver
+
+    if interval <= 0 or _archiver is not None:
+        return
+    _archiver = threading.Thread(target=_run_archiver, args=(interval,), name="exercise-archiver", daemon=True)
+    _archiver.start()
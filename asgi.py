@@ -0,0 +1,268 @@
+"""
+ASGI entry point serving the read-heavy routes natively on asyncio.
+
+`/dashboard`, `/report/<action>` and `/api/exercises` are served by coroutines that authenticate from the
+in-process caches, query through SQLAlchemy's asyncio engine (aiosqlite for SQLite) and render with the Flask
+app's templates, so a request waiting on the database holds no thread. Every other request, and every read
+request those coroutines cannot complete on their own (no session, a user not cached yet, pending flash
+messages, invalid arguments, NDJSON streaming), is handed to the regular Flask WSGI app on a thread pool.
+
+Run it with any ASGI server, e.g.:
+    uvicorn asgi:app --workers 4
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+
+from flask import request, session, jsonify
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from log_config import setup_logging
+from main_app import create_app, warm_up
+from metrics import instrument_engine
+from models import SQLALCHEMY_DATABASE_URL, SHARD_DATABASE_URLS, create_async_db_engine
+from reports import REPORT_ACTIONS, build_report, parse_report_window
+from response_cache import response_cache, page_cache_key, cached_page, store_page
+from session_store import session_store
+from tracker_route import render_report, parse_exercise_query, exercise_page
+from user_route import load_dashboard, render_dashboard
+from utils import get_current_user, user_cache
+
+# Threads running the WSGI app for the requests that are not served natively
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 16))
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def build_environ(scope: dict, body) -> dict:
+    """
+    Build the WSGI environ of an ASGI HTTP request.
+
+    Args:
+        scope (dict): The ASGI connection scope.
+        body: A file object holding the request body.
+
+    Returns:
+        dict: The WSGI environ.
+    """
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def _cached_user():
+    """The user of the current request if its session (and token) are valid and the user is cached, else None."""
+    username = session.get('user_name')
+    if not username or session.get('_flashes'):
+        return None
+    if session_store is None:
+        token = request.cookies.get('token')
+        if not token:
+            return None
+        try:
+            if get_current_user(token) != username:
+                return None
+        except ValueError:
+            return None
+    return user_cache.get(username)
+
+
+class AsyncApp:
+    """
+    The ASGI application: native coroutines for the read routes in `routes`, the Flask app for the rest.
+
+    Args:
+        flask_app (Flask): The application to serve.
+        db_engine (AsyncEngine): The asyncio engine the native routes query.
+        wsgi_threads (int): Threads running the Flask app for the other requests.
+    """
+
+    def __init__(self, flask_app, db_engine, wsgi_threads: int = ASGI_WSGI_THREADS):
+        self.flask_app = flask_app
+        self.AsyncSession = async_sessionmaker(db_engine, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='asgi-wsgi')
+        self.routes = (
+            (re.compile(r"/dashboard"), self.dashboard, True),
+            (re.compile(r"/report/(?P<action>[^/]+)"), self.report, True),
+            (re.compile(r"/api/exercises"), self.exercises, False),
+        )
+        if SHARD_DATABASE_URLS:
+            # The asyncio engine only reaches the primary database; sharded reads go through the Flask app
+            self.routes = ()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}.")
+
+        if scope["method"] in ("GET", "HEAD"):
+            for pattern, handler, cached in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match and await self._serve_native(scope, send, handler, cached, match.groupdict()):
+                    return
+        await self._serve_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _serve_native(self, scope, send, handler, cached: bool, arguments: dict) -> bool:
+        """Serve a request with a native handler; False when it has to go through the WSGI app instead."""
+        with self.flask_app.request_context(build_environ(scope, None)):
+            user = _cached_user()
+            if user is None:
+                return False
+
+            try:
+                response = self.flask_app.preprocess_request()
+                if response is None:
+                    if cached and response_cache is not None:
+                        key, etag = page_cache_key(user)
+                        response = cached_page(key, etag)
+                        if response is None:
+                            response = await handler(user, **arguments)
+                            if response is None:
+                                return False
+                            response = store_page(key, etag, self.flask_app.make_response(response))
+                    else:
+                        response = await handler(user, **arguments)
+                        if response is None:
+                            return False
+                response = self.flask_app.process_response(self.flask_app.make_response(response))
+            except Exception as e:
+                response = self.flask_app.make_response(self.flask_app.handle_exception(e))
+
+            body = b"" if scope["method"] == "HEAD" else response.get_data()
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in response.headers.items()],
+            })
+            await send({"type": "http.response.body", "body": body})
+        return True
+
+    async def _serve_wsgi(self, scope, receive, send):
+        """Run the Flask app on the thread pool, streaming its response back chunk by chunk."""
+        loop = asyncio.get_running_loop()
+        body = SpooledTemporaryFile(max_size=1024 * 1024)
+        while True:
+            message = await receive()
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                  for name, value in headers]
+
+        environ = build_environ(scope, body)
+        app_iter = await loop.run_in_executor(self.executor, self.flask_app, environ, start_response)
+        chunks = iter(app_iter)
+        try:
+            first = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            chunk = first
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(app_iter, "close"):
+                await loop.run_in_executor(self.executor, app_iter.close)
+            body.close()
+
+    async def dashboard(self, user):
+        try:
+            window = parse_report_window(request.args, datetime.now().date())
+        except ValueError:
+            return None
+
+        async with self.AsyncSession() as session_db:
+            dashboard_data = await session_db.run_sync(load_dashboard, user.id, window)
+        return render_dashboard(user, window, dashboard_data)
+
+    async def report(self, user, action):
+        try:
+            window = parse_report_window(request.args, datetime.now().date())
+        except ValueError:
+            return None
+        if action not in REPORT_ACTIONS:
+            return None
+
+        async with self.AsyncSession() as session_db:
+            report = await session_db.run_sync(build_report, user.id, window['start'], window['end'],
+                                               window['bucket'])
+        return render_report(action, window, report)
+
+    async def exercises(self, user):
+        if request.args.get('format') == 'ndjson':
+            return None
+        try:
+            params = parse_exercise_query(request.args)
+        except ValueError:
+            return None
+
+        async with self.AsyncSession() as session_db:
+            page = await session_db.run_sync(exercise_page, user.id, params)
+        return jsonify(page)
+
+
+def create_asgi_app(database_url: str = SQLALCHEMY_DATABASE_URL) -> AsyncApp:
+    """
+    Create the ASGI application around a new Flask app.
+
+    Args:
+        database_url (str, optional): The database the native routes query. Defaults to SQLALCHEMY_DATABASE_URL.
+
+    Returns:
+        AsyncApp: The ASGI application.
+    """
+    db_engine = create_async_db_engine(database_url)
+    instrument_engine(db_engine.sync_engine)
+    flask_app = create_app()
+    warm_up(flask_app)
+    return AsyncApp(flask_app, db_engine)
+
+
+app = create_asgi_app()
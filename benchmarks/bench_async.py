@@ -0,0 +1,158 @@
+"""
+Sync vs. async serving benchmark for the read-heavy routes.
+
+Seeds a throwaway SQLite database, logs every simulated connection in as its own user, then for each concurrency
+level keeps that many connections issuing a random mix of `/dashboard`, `/report/<action>` and `/api/exercises`
+requests for a fixed duration, through:
+
+1. the sync path: one thread per connection calling the Flask WSGI app (the test client), and
+2. the async path: one asyncio task per connection calling the ASGI app of `asgi.py`, whose native routes
+   query through the aiosqlite engine.
+
+Both run in-process so only the serving model differs. The response cache is disabled unless --response-cache
+is given, so every request reaches the database.
+
+Usage:
+    python -m benchmarks.bench_async [--users 50] [--rows-per-user 365] [--concurrency 8 32 128]
+                                     [--duration 10] [--response-cache]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.stats import peak_rss_mb, summarize
+
+BASE_URL = "https://localhost"
+READ_ROUTES = (
+    ("/dashboard", ""),
+    ("/report/by_steps", ""),
+    ("/report/all", "range=30d"),
+    ("/report/all", "range=1y&bucket=week"),
+    ("/api/exercises", "limit=50"),
+)
+
+
+def login(app, username: str, password: str):
+    """Log a fresh test client in and return it with the Cookie header of its session."""
+    client = app.test_client()
+    response = client.post(f"{BASE_URL}/login", data={"username_or_email": username, "password": password})
+    if response.status_code != 302 or "/dashboard" not in response.headers["Location"]:
+        raise RuntimeError(f"Login of {username} failed with {response.status_code}")
+    cookie = "; ".join(f"{name}={client.get_cookie(name).value}" for name in ("session", "token"))
+    return client, cookie
+
+
+def run_sync(app, clients: list, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(number: int):
+        generator = random.Random(number)
+        client = clients[number % len(clients)][0]
+        while time.perf_counter() < deadline:
+            path, query = generator.choice(READ_ROUTES)
+            started = time.perf_counter()
+            response = client.get(f"{BASE_URL}{path}?{query}")
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code != 200:
+                    errors.append(f"{path} returned {response.status_code}")
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError(f"{len(errors)} sync requests failed: {errors[0]}")
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_async(asgi_app, clients: list, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], []
+
+    async def request(path: str, query: str, cookie: str) -> int:
+        scope = {
+            "type": "http", "method": "GET", "path": path, "query_string": query.encode("ascii"), "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode("latin-1"))],
+            "scheme": "https", "server": ("localhost", 443), "http_version": "1.1", "client": ("127.0.0.1", 0),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_app(scope, receive, send)
+        return messages[0]["status"]
+
+    async def worker(number: int, deadline: float):
+        generator = random.Random(number)
+        cookie = clients[number % len(clients)][1]
+        while time.perf_counter() < deadline:
+            path, query = generator.choice(READ_ROUTES)
+            started = time.perf_counter()
+            status = await request(path, query, cookie)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(f"{path} returned {status}")
+
+    async def main():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[worker(number, deadline) for number in range(concurrency)])
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    if errors:
+        raise RuntimeError(f"{len(errors)} async requests failed: {errors[0]}")
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rows-per-user", type=int, default=365)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128],
+                        help="Concurrent connections, one run per value.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds each run lasts.")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the rendered page cache enabled.")
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix="bench-async-"), "bench.db")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    if not args.response_cache:
+        os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+
+    from benchmarks.seed import SEED_PASSWORD, seed_database
+
+    started = time.perf_counter()
+    usernames = seed_database(users=args.users, rows_per_user=args.rows_per_user)
+    print(f"Seeded {args.users} users x {args.rows_per_user} rows in {time.perf_counter() - started:.1f}s")
+
+    from asgi import app as asgi_app
+
+    flask_app = asgi_app.flask_app
+    flask_app.config["TESTING"] = True
+    clients = [login(flask_app, username, SEED_PASSWORD) for username in usernames]
+
+    print(f"\n{'mode':<6} {'connections':>11} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        for mode, runner, target in (("sync", run_sync, flask_app), ("async", run_async, asgi_app)):
+            summary = runner(target, clients, concurrency, args.duration)
+            print(f"{mode:<6} {concurrency:>11} {summary['requests']:>9} {summary['throughput']:>9} "
+                  f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9}")
+    print(f"\nPeak RSS: {peak_rss_mb()} MiB")
+
+
+if __name__ == "__main__":
+    main()
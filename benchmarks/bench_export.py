@@ -0,0 +1,52 @@
+"""
+Export memory benchmark.
+
+Seeds a throwaway SQLite database with growing numbers of exercise rows and streams a full export of each size,
+reporting the peak Python heap allocated during the export. Peak memory should stay flat as row counts grow.
+
+Usage:
+    python -m benchmarks.bench_export [--rows 10000 100000 500000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--rows-per-user", type=int, default=1000)
+    parser.add_argument("--format", choices=["csv", "columnar"], default="csv")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-export-")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+    from benchmarks.seed import seed_database
+    from export import export_csv_gzip, export_columnar
+    from models import DailyExerciseTracker, Session
+
+    exporter = export_csv_gzip if args.format == "csv" else export_columnar
+    seeded = 0
+
+    print(f"{'rows':>10} {'seconds':>10} {'MB out':>10} {'peak MB':>10}")
+    for rows in sorted(args.rows):
+        seed_database(users=max(1, (rows - seeded) // args.rows_per_user), rows_per_user=args.rows_per_user, seed=rows)
+        with Session() as session_db:
+            seeded = rows = session_db.query(DailyExerciseTracker).count()
+
+        with Session() as session_db:
+            tracemalloc.start()
+            started = time.perf_counter()
+            written = sum(len(piece) for piece in exporter(session_db))
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        print(f"{rows:>10} {elapsed:>10.2f} {written / 2 ** 20:>10.2f} {peak / 2 ** 20:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Logging overhead benchmark.
+
+Measures dashboard request latency through the Flask test client with logging off, with the synchronous
+handlers and with the queue-based pipeline. Each mode runs in its own process (logging is configured once per
+process) at LOG_LEVEL=DEBUG, so every request emits the per-request "validated successfully" line.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 2000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "off": {"LOG_LEVEL": "CRITICAL"},
+    "sync": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE": "false"},
+    "queue": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE": "true"},
+    "queue-json-sampled": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE": "true", "LOG_FORMAT": "json", "LOG_SAMPLE_EVERY": "100"},
+}
+
+
+def run_mode(requests: int):
+    from benchmarks.seed import SEED_PASSWORD, seed_database
+    from main_app import create_app
+
+    username, = seed_database(users=1, rows_per_user=7)
+    app = create_app()
+    client = app.test_client()
+    client.post("https://localhost/login", data={"username_or_email": username, "password": SEED_PASSWORD})
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get("https://localhost/dashboard")
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    mean = sum(latencies) / len(latencies)
+    print(f"{mean * 1000:.3f} {latencies[len(latencies) // 2] * 1000:.3f} {latencies[int(len(latencies) * 0.99)] * 1000:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.requests)
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'mode':<20} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for mode, settings in MODES.items():
+        directory = tempfile.mkdtemp(prefix="bench-logging-")
+        env = dict(os.environ, PYTHONPATH=root, BCRYPT_ROUNDS="4",
+                   SQLALCHEMY_DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}", **settings)
+        # Logs go to the throwaway directory; console output is discarded like a detached worker's would be
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_logging", "--mode", mode, "--requests", str(args.requests)],
+            cwd=directory, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True,
+        ).stdout.split()
+        mean, p50, p99 = output[-3:]
+        print(f"{mode:<20} {mean:>10} {p50:>10} {p99:>10}")
+
+
+if __name__ == "__main__":
+    main()
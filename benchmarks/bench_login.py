@@ -0,0 +1,74 @@
+"""
+Login throughput benchmark.
+
+Seeds a throwaway SQLite database with users and fires concurrent logins at `/login` through the Flask test client,
+reporting throughput, latency percentiles and how many logins were turned away by the password hashing pool.
+Tune the pool with PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE and BCRYPT_ROUNDS.
+
+Usage:
+    python -m benchmarks.bench_login [--users 20] [--concurrency 32] [--requests 200]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.stats import summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-login-")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+    from benchmarks.seed import SEED_PASSWORD, seed_database
+    from main_app import create_app
+
+    usernames = seed_database(users=args.users, rows_per_user=0)
+    app = create_app()
+    app.config["TESTING"] = True
+
+    latencies, rejected = [], []
+    lock = threading.Lock()
+    remaining = iter(range(args.requests))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                number = next(remaining, None)
+            if number is None:
+                return
+            started = time.perf_counter()
+            response = client.post("https://localhost/login", data={
+                "username_or_email": usernames[number % len(usernames)], "password": SEED_PASSWORD,
+            })
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.headers.get("Location", "").endswith("/dashboard"):
+                    latencies.append(elapsed)
+                else:
+                    rejected.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies, elapsed)
+    print(f"logins: {len(latencies)} ok, {len(rejected)} rejected in {elapsed:.2f}s "
+          f"({summary['throughput']} logins/s)")
+    print(f"latency ms: p50 {summary['p50_ms']}  p95 {summary['p95_ms']}  p99 {summary['p99_ms']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Load test and micro-benchmarks for the hot routes.
+
+Seeds a throwaway SQLite database with a configurable number of users and DailyExerciseTracker rows, then:
+
+1. times every hot route (login, dashboard, add_exercise_tracker and every /report/<action>) sequentially
+   through the Flask test client, and
+2. runs a concurrent load generator where each worker thread logs in as its own user and issues a random
+   mix of those routes for a fixed duration,
+
+reporting p50/p95/p99 latency and throughput per route plus the peak RSS of the process.
+
+Results can be saved with --json and compared against a saved baseline with --compare; the run exits with
+status 1 when a route's p95 latency regresses by more than --tolerance, so it can gate a CI job.
+
+Usage:
+    python -m benchmarks.bench_routes [--users 50] [--rows-per-user 365] [--iterations 200]
+                                      [--concurrency 8] [--duration 10] [--json out.json]
+                                      [--compare baseline.json --tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.stats import peak_rss_mb, summarize
+
+BASE_URL = "https://localhost"
+REPORT_ACTIONS = ('by_steps', 'by_distance', 'by_calories', 'by_heart_rate', 'by_duration', 'all')
+TRACKER_FORM = {
+    "steps_taken": "8000", "distance": "5.5", "calories_burned": "320", "max_heart_rate": "160",
+    "min_heart_rate": "65", "exercise_duration": "45",
+}
+
+
+def build_routes(username: str, password: str) -> dict:
+    """Map route names to callables issuing one request with a logged-in test client."""
+    routes = {
+        "login": lambda client: client.post(f"{BASE_URL}/login",
+                                            data={"username_or_email": username, "password": password}),
+        "dashboard": lambda client: client.get(f"{BASE_URL}/dashboard"),
+        "add_exercise_tracker": lambda client: client.post(f"{BASE_URL}/add_exercise_tracker", data=TRACKER_FORM),
+    }
+    for action in REPORT_ACTIONS:
+        routes[f"report/{action}"] = lambda client, action=action: client.get(f"{BASE_URL}/report/{action}")
+    return routes
+
+
+def check(response):
+    if response.status_code >= 400 or "/login" in response.headers.get("Location", ""):
+        raise RuntimeError(f"Benchmark request failed with {response.status_code} {response.headers}")
+
+
+def run_sequential(app, username: str, password: str, iterations: int) -> dict:
+    client = app.test_client()
+    routes = build_routes(username, password)
+    check(routes["login"](client))
+
+    results = {}
+    for name, route in routes.items():
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request_started = time.perf_counter()
+            check(route(client))
+            latencies.append(time.perf_counter() - request_started)
+        results[name] = summarize(latencies, time.perf_counter() - started)
+    return results
+
+
+def run_concurrent(app, usernames: list, password: str, concurrency: int, duration: float) -> dict:
+    latencies = {}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(number: int):
+        generator = random.Random(number)
+        client = app.test_client()
+        routes = build_routes(usernames[number % len(usernames)], password)
+        names = list(routes)
+        try:
+            check(routes["login"](client))
+            while time.perf_counter() < deadline:
+                name = generator.choice(names)
+                started = time.perf_counter()
+                check(routes[name](client))
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.setdefault(name, []).append(elapsed)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} load generator workers failed: {errors[0]}")
+
+    results = {name: summarize(values, elapsed) for name, values in sorted(latencies.items())}
+    results["total"] = summarize([value for values in latencies.values() for value in values], elapsed)
+    return results
+
+
+def print_table(title: str, results: dict):
+    print(f"\n{title}")
+    print(f"{'route':<26} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in results.items():
+        print(f"{name:<26} {summary['requests']:>9} {summary['throughput']:>9} {summary['p50_ms']:>9} "
+              f"{summary['p95_ms']:>9} {summary['p99_ms']:>9}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """List the routes whose p95 latency regressed by more than `tolerance` against the baseline."""
+    regressions = []
+    for phase in ("sequential", "concurrent"):
+        for name, summary in results.get(phase, {}).items():
+            previous = baseline.get(phase, {}).get(name)
+            if previous and previous["p95_ms"] and summary["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{phase} {name}: p95 {previous['p95_ms']} ms -> {summary['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rows-per-user", type=int, default=365)
+    parser.add_argument("--iterations", type=int, default=200, help="Requests per route in the sequential phase.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Load generator worker threads.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds the load generator runs.")
+    parser.add_argument("--database", help="SQLite file to use instead of a fresh throwaway database.")
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier --json run.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 regression, e.g. 0.25 for 25%%.")
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix="bench-routes-"), "bench.db")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{database}"
+    # Keep password hashing cheap unless the caller asks otherwise, so login measures the route, not bcrypt
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+    from benchmarks.seed import SEED_PASSWORD, seed_database
+    from main_app import create_app
+
+    started = time.perf_counter()
+    usernames = seed_database(users=args.users, rows_per_user=args.rows_per_user)
+    print(f"Seeded {args.users} users x {args.rows_per_user} rows in {time.perf_counter() - started:.1f}s")
+
+    app = create_app()
+    app.config["TESTING"] = True
+
+    results = {
+        "config": vars(args),
+        "sequential": run_sequential(app, usernames[0], SEED_PASSWORD, args.iterations),
+        "concurrent": run_concurrent(app, usernames, SEED_PASSWORD, args.concurrency, args.duration),
+    }
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    print_table("Sequential (single client)", results["sequential"])
+    print_table(f"Concurrent ({args.concurrency} workers, {args.duration:g}s)", results["concurrent"])
+    print(f"\nPeak RSS: {results['peak_rss_mb']} MiB")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
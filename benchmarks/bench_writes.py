@@ -0,0 +1,99 @@
+"""
+Tracker insert throughput benchmark: one commit per request vs. the write-coalescing queue.
+
+Seeds a throwaway SQLite database, logs every simulated device in as its own user, then for each concurrency level
+keeps that many threads posting `/add_exercise_tracker` through the Flask test client for a fixed duration, first
+with the per-request commit and then with the write queue (WRITE_QUEUE) acknowledging on commit. Reports inserts/s,
+latency percentiles and, for the queue, the average number of entries per commit.
+
+Usage:
+    python -m benchmarks.bench_writes [--users 50] [--concurrency 1 8 32] [--duration 10]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.stats import summarize
+
+BASE_URL = "https://localhost"
+FORM = {"steps_taken": "8000", "distance": "5.5", "calories_burned": "320", "max_heart_rate": "160",
+        "min_heart_rate": "70", "exercise_duration": "45"}
+
+
+def login(app, username: str, password: str):
+    client = app.test_client()
+    response = client.post(f"{BASE_URL}/login", data={"username_or_email": username, "password": password})
+    if response.status_code != 302 or "/dashboard" not in response.headers["Location"]:
+        raise RuntimeError(f"Login of {username} failed with {response.status_code}")
+    return client
+
+
+def run(clients: list, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(number: int):
+        client = clients[number % len(clients)]
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = client.post(f"{BASE_URL}/add_exercise_tracker", data=FORM)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if not response.headers.get("Location", "").endswith("/dashboard"):
+                    errors.append(f"add returned {response.status_code} to {response.headers.get('Location')}")
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError(f"{len(errors)} inserts failed: {errors[0]}")
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="Concurrent devices, one run per value.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds each run lasts.")
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix="bench-writes-"), "bench.db")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ["WRITE_QUEUE_ACK"] = "commit"
+
+    from benchmarks.seed import SEED_PASSWORD, seed_database
+    from main_app import create_app
+    import write_queue
+
+    usernames = seed_database(users=args.users, rows_per_user=0)
+    app = create_app()
+    app.config["TESTING"] = True
+    clients = [login(app, username, SEED_PASSWORD) for username in usernames]
+
+    print(f"\n{'mode':<8} {'devices':>7} {'inserts':>8} {'inserts/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'per commit':>10}")
+    for concurrency in args.concurrency:
+        for mode in ("commit", "queue"):
+            write_queue.WRITE_QUEUE_ENABLED = mode == "queue"
+            before = write_queue.get_write_queue().stats() if mode == "queue" else None
+            summary = run(clients, concurrency, args.duration)
+            per_commit = "1.0"
+            if before is not None:
+                after = write_queue.get_write_queue().stats()
+                commits = after["commits"] - before["commits"]
+                per_commit = f"{(after['written'] - before['written']) / commits:.1f}" if commits else "-"
+            print(f"{mode:<8} {concurrency:>7} {summary['requests']:>8} {summary['throughput']:>10} "
+                  f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9} {per_commit:>10}")
+
+
+if __name__ == "__main__":
+    main()
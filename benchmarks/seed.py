@@ -0,0 +1,69 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import DailyExerciseTracker, Session, User, init_db
+from rollup import rebuild_rollups
+from utils import hash_password
+
+SEED_PASSWORD = "benchmark-password"
+
+
+def seed_database(users: int, rows_per_user: int, batch_size: int = 10000, seed: int = 2024) -> list:
+    """
+    Fill the configured database with synthetic users and exercise entries.
+
+    Entries are spread one per day backwards from today, so the most recent week of every user is populated.
+
+    Args:
+        users (int): Number of users to create.
+        rows_per_user (int): Number of DailyExerciseTracker rows per user.
+        batch_size (int): Number of rows inserted per executemany.
+        seed (int): Random seed, so runs are reproducible.
+
+    Returns:
+        list: The usernames created; they all share the password `SEED_PASSWORD`.
+    """
+    init_db()
+    generator = random.Random(seed)
+    password = hash_password(SEED_PASSWORD)
+    now = datetime.now().replace(microsecond=0)
+
+    with Session() as session_db:
+        offset = session_db.query(User).count()
+        usernames = [f"bench-user-{offset + number}" for number in range(users)]
+        session_db.execute(insert(User), [
+            {"username": username, "fullname": username.replace('-', ' ').title(), "email": f"{username}@example.com",
+             "password": password}
+            for username in usernames
+        ])
+        user_ids = [user_id for user_id, in session_db.query(User.id).filter(User.username.in_(usernames))]
+
+        batch = []
+        for user_id in user_ids:
+            for day in range(rows_per_user):
+                min_heart_rate = generator.randint(55, 80)
+                max_heart_rate = generator.randint(120, 190)
+                batch.append({
+                    "user_id": user_id,
+                    "date": now - timedelta(days=day, minutes=generator.randint(0, 600)),
+                    "steps_taken": generator.randint(1000, 25000),
+                    "distance": round(generator.uniform(0.5, 20), 2),
+                    "calories_burned": round(generator.uniform(50, 1200), 1),
+                    "max_heart_rate": max_heart_rate,
+                    "min_heart_rate": min_heart_rate,
+                    "avg_heart_rate": (max_heart_rate + min_heart_rate) // 2,
+                    "exercise_duration": generator.randint(10, 120),
+                })
+                if len(batch) >= batch_size:
+                    session_db.execute(insert(DailyExerciseTracker), batch)
+                    batch.clear()
+        if batch:
+            session_db.execute(insert(DailyExerciseTracker), batch)
+
+        for user_id in user_ids:
+            rebuild_rollups(session_db, user_id)
+        session_db.commit()
+
+    return usernames
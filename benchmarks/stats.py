@@ -0,0 +1,37 @@
+import resource
+import sys
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    """
+    Summarize request latencies in seconds into throughput and p50/p95/p99 in milliseconds.
+
+    Args:
+        latencies (list): Per-request latencies in seconds.
+        elapsed (float): Wall-clock seconds the requests took in total.
+
+    Returns:
+        dict: `requests`, `throughput` (requests/s) and `p50_ms`, `p95_ms`, `p99_ms`.
+    """
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
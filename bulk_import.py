@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from archive import active_entries
+from log_config import setup_logging
+from models import DailyExerciseTracker
+from rollup import add_to_rollups
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+# Number of rejected rows reported back to the caller; the rest are only counted
+IMPORT_MAX_REPORTED_ERRORS = 20
+
+IMPORT_INT_FIELDS = ('steps_taken', 'max_heart_rate', 'min_heart_rate', 'exercise_duration')
+IMPORT_FLOAT_FIELDS = ('distance', 'calories_burned')
+
+
+def iter_csv_records(stream):
+    """
+    Lazily read exercise records from a CSV file with a header row.
+
+    Args:
+        stream: A binary file object.
+
+    Yields:
+        dict: One record per CSV row, keyed by the header.
+
+    Raises:
+        csv.Error: If the input is not valid CSV, e.g. a field is longer than `csv.field_size_limit()`.
+    """
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+
+def iter_json_records(stream, chunk_size: int = 64 * 1024):
+    """
+    Lazily read exercise records from a JSON array of objects or from JSON lines.
+
+    The input is decoded incrementally chunk by chunk, so files of any size are read in constant memory.
+
+    Args:
+        stream: A binary file object.
+        chunk_size (int): Number of characters read per chunk.
+
+    Yields:
+        dict: One record per JSON object.
+
+    Raises:
+        ValueError: If the input is not valid JSON.
+    """
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = ''
+    in_array = None
+
+    while True:
+        chunk = text.read(chunk_size)
+        buffer += chunk
+
+        while True:
+            buffer = buffer.lstrip()
+            if in_array is None and buffer:
+                in_array = buffer.startswith('[')
+                if in_array:
+                    buffer = buffer[1:]
+                    continue
+            if in_array and buffer.startswith(','):
+                buffer = buffer[1:]
+                continue
+            if in_array and buffer.startswith(']'):
+                return
+            if not buffer:
+                break
+
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise ValueError("Invalid JSON input.")
+                break  # Incomplete object, wait for the next chunk
+
+            yield record
+            buffer = buffer[end:]
+
+        if not chunk:
+            if in_array:
+                raise ValueError("Invalid JSON input: unterminated array.")
+            return
+
+
+def parse_record(record: dict, user_id: int) -> dict:
+    """
+    Validate an imported record and convert it into a tracker row.
+
+    Args:
+        record (dict): The raw record, with a `date` and all tracker metrics.
+        user_id (int): The owner of the imported entries.
+
+    Returns:
+        dict: The column values of the DailyExerciseTracker row.
+
+    Raises:
+        ValueError: If a field is missing or invalid.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object.")
+
+    missing = [field for field in ('date',) + IMPORT_INT_FIELDS + IMPORT_FLOAT_FIELDS
+               if record.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}.")
+
+    row = {'user_id': user_id}
+    try:
+        row['date'] = datetime.fromisoformat(str(record['date']))
+        for field in IMPORT_INT_FIELDS:
+            row[field] = int(record[field])
+        for field in IMPORT_FLOAT_FIELDS:
+            row[field] = float(record[field])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value: {str(e)}")
+
+    if row['date'].tzinfo is not None:
+        row['date'] = row['date'].replace(tzinfo=None)
+    if any(row[field] < 0 for field in IMPORT_INT_FIELDS + IMPORT_FLOAT_FIELDS):
+        raise ValueError("Values must not be negative.")
+    if row['min_heart_rate'] > row['max_heart_rate']:
+        raise ValueError("Min heart rate is above max heart rate.")
+
+    row['avg_heart_rate'] = (row['max_heart_rate'] + row['min_heart_rate']) // 2
+    return row
+
+
+def _insert_batch(session_db, user_id: int, rows: list) -> int:
+    """Insert one batch of validated rows, skipping dates the user already has an active entry for."""
+    entries = active_entries(user_id, min(row['date'] for row in rows),
+                             max(row['date'] for row in rows) + timedelta(microseconds=1))
+    existing = {entry_date for entry_date, in session_db.query(entries.c.date)}
+
+    new_rows = []
+    for row in rows:
+        if row['date'] not in existing:
+            existing.add(row['date'])
+            new_rows.append(row)
+
+    if new_rows:
+        session_db.execute(insert(DailyExerciseTracker), new_rows)
+        add_to_rollups(session_db, new_rows)
+    session_db.commit()
+    return len(new_rows)
+
+
+def import_records(session_db, user_id: int, records, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Bulk import exercise records for a user.
+
+    Records are validated and inserted in batches with one executemany and one commit per batch,
+    and entries whose (user, date) already exists, in the database or earlier in the input, are skipped.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int): The owner of the imported entries.
+        records: An iterable of raw records, e.g. from `iter_csv_records` or `iter_json_records`.
+        batch_size (int): Number of rows inserted and committed at a time.
+
+    Returns:
+        dict: Counts of `inserted`, `duplicates` and `invalid` records plus the first few `errors`.
+    """
+    result = {'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        inserted = _insert_batch(session_db, user_id, batch)
+        result['inserted'] += inserted
+        result['duplicates'] += len(batch) - inserted
+        batch.clear()
+
+    for number, record in enumerate(records, start=1):
+        try:
+            batch.append(parse_record(record, user_id))
+        except ValueError as e:
+            result['invalid'] += 1
+            if len(result['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+                result['errors'].append(f"Record {number}: {str(e)}")
+            continue
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    logger.info(f"Imported {result['inserted']} exercise records for user {user_id} "
+                f"({result['duplicates']} duplicates, {result['invalid']} invalid).")
+    return result
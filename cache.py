@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel distinguishing a cache miss from a cached falsy value
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded LRU cache with optional per-entry expiry.
+
+    Entries expire `ttl` seconds after they are set (or at the explicit `expires_at` given to `set`),
+    and the least recently used entry is evicted once `maxsize` entries are held.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get a cached value and mark it as recently used.
+
+        Args:
+            key: The cache key.
+            default: Returned when the key is missing or expired.
+
+        Returns:
+            The cached value, or `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is not MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, expires_at: float = None):
+        """
+        Cache a value, evicting the least recently used entry when full.
+
+        Args:
+            key: The cache key.
+            value: The value to cache.
+            expires_at (float, optional): `time.monotonic()` deadline overriding the default ttl.
+        """
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove a key from the cache, returning its value or `default`."""
+        with self._lock:
+            entry = self._entries.pop(key, MISSING)
+        return default if entry is MISSING else entry[0]
+
+    def clear(self):
+        """Remove every entry and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Get the size and hit/miss counters of the cache."""
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
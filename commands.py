@@ -0,0 +1,134 @@
+import csv
+import logging
+
+import click
+
+from archive import ARCHIVE_BATCH_SIZE, archive_all_shards
+from bulk_import import IMPORT_BATCH_SIZE, iter_csv_records, iter_json_records, import_records
+from export import EXPORT_CHUNK_SIZE, export_csv_gzip, export_columnar
+from log_config import setup_logging
+from models import Session, User, init_db, shard_engines
+from response_cache import bump_data_version
+from rollup import rebuild_rollups
+from sharding import REBALANCE_BATCH_SIZE, rebalance_shards
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@click.command("init-db")
+@click.option("--force", is_flag=True, help="Create and migrate even when the schema is recorded as current.")
+def init_db_command(force):
+    """Create the database schema and apply pending migrations."""
+    if init_db(force=force):
+        click.echo("Database schema created or migrated.")
+    else:
+        click.echo("Database schema is already current.")
+
+
+@click.command("rebuild-rollups")
+@click.option("--user-id", type=int, default=None, help="Only rebuild the rollups of this user.")
+def rebuild_rollups_command(user_id):
+    """Rebuild the daily and weekly exercise rollups from the raw tracker rows."""
+    # One user lives on a single shard; all users are rebuilt shard by shard
+    shards = [None] if user_id is not None else range(len(shard_engines))
+    rebuilt = 0
+    for shard in shards:
+        with Session(shard=shard, user_id=user_id) as session_db:
+            rebuilt += rebuild_rollups(session_db, user_id)
+            session_db.commit()
+    click.echo(f"Rebuilt {rebuilt} daily rollups.")
+
+
+@click.command("import-exercises")
+@click.argument("username")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["csv", "json"]), default=None,
+              help="Input format; guessed from the file extension when omitted.")
+@click.option("--batch-size", type=int, default=IMPORT_BATCH_SIZE, show_default=True,
+              help="Rows inserted and committed per batch.")
+def import_exercises_command(username, path, file_format, batch_size):
+    """Bulk import exercise entries for USERNAME from a CSV or JSON export at PATH."""
+    if file_format is None:
+        file_format = "csv" if path.lower().endswith(".csv") else "json"
+
+    with Session() as session_db:
+        user = session_db.query(User).filter_by(username=username).first()
+        if not user:
+            raise click.ClickException(f"User {username} not found.")
+
+    with Session(user_id=user.id) as session_db:
+        with open(path, "rb") as stream:
+            records = iter_csv_records(stream) if file_format == "csv" else iter_json_records(stream)
+            try:
+                result = import_records(session_db, user.id, records, batch_size=batch_size)
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                raise click.ClickException(f"Import failed: {str(e)}")
+            finally:
+                bump_data_version(user.id)
+
+    for error in result['errors']:
+        click.echo(error, err=True)
+    click.echo(f"Imported {result['inserted']} entries, skipped {result['duplicates']} duplicates "
+               f"and {result['invalid']} invalid records.")
+
+
+@click.command("export-exercises")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option("--username", default=None, help="Only export this user; all users when omitted.")
+@click.option("--format", "file_format", type=click.Choice(["csv", "columnar"]), default="csv", show_default=True,
+              help="gzip-compressed CSV or the compact columnar binary format.")
+@click.option("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, show_default=True,
+              help="Rows fetched and encoded per chunk.")
+def export_exercises_command(output, username, file_format, chunk_size):
+    """Stream exercise entries to OUTPUT without loading them all in memory."""
+    exporter = export_csv_gzip if file_format == "csv" else export_columnar
+
+    with Session() as session_db:
+        user_id = None
+        if username:
+            user_id = session_db.query(User.id).filter_by(username=username).scalar()
+            if user_id is None:
+                raise click.ClickException(f"User {username} not found.")
+
+        with open(output, "wb") as stream:
+            for piece in exporter(session_db, user_id, chunk_size):
+                stream.write(piece)
+
+    click.echo(f"Exported exercise entries to {output}.")
+
+
+@click.command("archive-exercises")
+@click.option("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, show_default=True,
+              help="Entries moved per transaction.")
+def archive_exercises_command(batch_size):
+    """Move old and soft-deleted exercise entries from the hot table to the archive table."""
+    archived = archive_all_shards(batch_size=batch_size)
+    click.echo(f"Archived {archived} exercise entries.")
+
+
+@click.command("rebalance-shards")
+@click.option("--drain", "drain_urls", multiple=True,
+              help="URL of a database removed from SHARD_DATABASE_URLS whose users must be moved out; repeatable.")
+@click.option("--batch-size", type=int, default=REBALANCE_BATCH_SIZE, show_default=True,
+              help="Rows copied per batch.")
+@click.option("--dry-run", is_flag=True, help="Only list the users that would move.")
+def rebalance_shards_command(drain_urls, batch_size, dry_run):
+    """Move users whose rows are not on the shard the hash ring assigns them to. Run it with the app stopped."""
+    result = rebalance_shards(drain_urls, batch_size=batch_size, dry_run=dry_run)
+    for user_id, source, target in result['moves']:
+        click.echo(f"User {user_id}: shard {source} -> shard {target}")
+    if dry_run:
+        click.echo(f"{len(result['moves'])} users would move.")
+    else:
+        click.echo(f"Moved {len(result['moves'])} users ({result['rows']} rows).")
+
+
+def register_commands(app):
+    """Register the maintenance CLI commands on the Flask app."""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(import_exercises_command)
+    app.cli.add_command(export_exercises_command)
+    app.cli.add_command(archive_exercises_command)
+    app.cli.add_command(rebalance_shards_command)
@@ -0,0 +1,172 @@
+import csv
+import io
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import select
+
+from archive import active_entries
+from models import shard_engines
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+
+# Exported columns with their array type code in the columnar format ('q' int64, 'd' float64);
+# dates are stored as epoch milliseconds
+EXPORT_FIELDS = (
+    ('id', 'q'),
+    ('user_id', 'q'),
+    ('date', 'q'),
+    ('steps_taken', 'q'),
+    ('distance', 'd'),
+    ('calories_burned', 'd'),
+    ('max_heart_rate', 'q'),
+    ('min_heart_rate', 'q'),
+    ('avg_heart_rate', 'q'),
+    ('exercise_duration', 'q'),
+)
+
+COLUMNAR_MAGIC = b'EXTC'
+COLUMNAR_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+
+def iter_row_chunks(session_db, user_id: int = None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Stream the active tracker rows, hot and archived, in chunks through a server-side cursor.
+
+    A single user is read from their shard; all users are read shard after shard, each in id order.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int, optional): Export a single user; all users when omitted.
+        chunk_size (int): Number of rows fetched and yielded at a time.
+
+    Yields:
+        list: Up to `chunk_size` row tuples ordered like `EXPORT_FIELDS`.
+    """
+    entries = active_entries(user_id)
+    statement = select(*[entries.c[field] for field, _ in EXPORT_FIELDS])
+    if user_id is not None:
+        statement = statement.order_by(entries.c.date, entries.c.id)
+        bind_arguments = [{'user_id': user_id}]
+    else:
+        statement = statement.order_by(entries.c.id)
+        bind_arguments = [{'shard': shard} for shard in range(len(shard_engines))]
+
+    for arguments in bind_arguments:
+        result = session_db.execute(statement.execution_options(stream_results=True, yield_per=chunk_size),
+                                    bind_arguments=arguments)
+        while True:
+            chunk = list(islice(result, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_csv_gzip(session_db, user_id: int = None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Export tracker rows as a gzip-compressed CSV stream.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int, optional): Export a single user; all users when omitted.
+        chunk_size (int): Number of rows compressed and yielded at a time.
+
+    Yields:
+        bytes: Consecutive pieces of the gzip file.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([field for field, _ in EXPORT_FIELDS])
+
+    for chunk in iter_row_chunks(session_db, user_id, chunk_size):
+        for row in chunk:
+            writer.writerow([row[0], row[1], row[2].isoformat(), *row[3:]])
+        yield compressor.compress(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield compressor.compress(buffer.getvalue().encode('utf-8')) + compressor.flush()
+
+
+def export_columnar(session_db, user_id: int = None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Export tracker rows in the compact columnar binary format.
+
+    Layout (little-endian): the magic ``EXTC``, a version byte, the column count, then per column its
+    name length, name and array type code. Each chunk follows as a row count (uint32) and, per column,
+    the zlib-compressed length (uint32) and bytes of the packed value array. A row count of zero ends the
+    stream. Use `read_columnar` to load it back.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int, optional): Export a single user; all users when omitted.
+        chunk_size (int): Number of rows per columnar block.
+
+    Yields:
+        bytes: The header, then one encoded block per chunk.
+    """
+    header = bytearray(COLUMNAR_MAGIC)
+    header += struct.pack('<BB', COLUMNAR_VERSION, len(EXPORT_FIELDS))
+    for field, type_code in EXPORT_FIELDS:
+        header += struct.pack('<B', len(field)) + field.encode('ascii') + type_code.encode('ascii')
+    yield bytes(header)
+
+    for chunk in iter_row_chunks(session_db, user_id, chunk_size):
+        block = bytearray(struct.pack('<I', len(chunk)))
+        for position, (field, type_code) in enumerate(EXPORT_FIELDS):
+            if field == 'date':
+                values = array(type_code, ((row[position] - EPOCH) // timedelta(milliseconds=1) for row in chunk))
+            else:
+                values = array(type_code, (row[position] for row in chunk))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            data = zlib.compress(values.tobytes())
+            block += struct.pack('<I', len(data)) + data
+        yield bytes(block)
+
+    yield struct.pack('<I', 0)
+
+
+def read_columnar(stream):
+    """
+    Read a columnar export block by block.
+
+    Args:
+        stream: A binary file object positioned at the start of the export.
+
+    Yields:
+        dict: One mapping of column name to `array` of values per block.
+
+    Raises:
+        ValueError: If the stream is not a columnar export.
+    """
+    if stream.read(4) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar exercise export.")
+    version, column_count = struct.unpack('<BB', stream.read(2))
+    if version != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported columnar export version {version}.")
+
+    columns = []
+    for _ in range(column_count):
+        name_length, = struct.unpack('<B', stream.read(1))
+        columns.append((stream.read(name_length).decode('ascii'), stream.read(1).decode('ascii')))
+
+    while True:
+        row_count, = struct.unpack('<I', stream.read(4))
+        if not row_count:
+            return
+        block = {}
+        for name, type_code in columns:
+            data_length, = struct.unpack('<I', stream.read(4))
+            values = array(type_code, zlib.decompress(stream.read(data_length)))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            block[name] = values
+        yield block
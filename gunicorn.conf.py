@@ -0,0 +1,60 @@
+"""
+Gunicorn settings for the production entry point:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment (or on the command line).
+"""
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8181")
+# Worker processes; defaults to 2 x CPU + 1
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threads per worker; requests mostly wait on the database, so a few threads keep each worker busy
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+# Load the app once in the master and fork the workers from it: templates, modules and caches loaded at
+# startup are shared copy-on-write, and a restarted worker is ready as soon as it has forked
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# Recycle workers after this many requests (0 disables), with jitter so they do not all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Pages cached in one worker's memory are not invalidated by writes handled by the others, so several workers
+# share the file-backed response cache unless another backend is chosen. This has to happen before the app
+# (and with it the cache) is preloaded.
+if workers > 1:
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "file")
+
+
+def on_starting(server):
+    from response_cache import RESPONSE_CACHE_BACKEND
+    from session_store import SESSION_STORE
+
+    # Refuse per-process stores with several workers (e.g. workers raised with -w): they would serve stale
+    # pages, ETags and insights, and sessions only known to the worker that created them
+    if server.cfg.workers > 1:
+        for name, value, shared in (("RESPONSE_CACHE_BACKEND", RESPONSE_CACHE_BACKEND, "file"),
+                                    ("SESSION_STORE", SESSION_STORE, "sqlite")):
+            if value == "memory":
+                raise RuntimeError(f"{name}=memory only works with a single worker, but {server.cfg.workers} are "
+                                   f"configured; use {name}={shared} or a single worker.")
+
+
+def post_fork(server, worker):
+    from models import database_engines, warm_pool
+
+    # Drop any connection inherited from the master (e.g. opened by the archiver thread) without closing it
+    # under the master's feet, then open this worker's own connections before it accepts requests
+    opened = 0
+    for db_engine in database_engines():
+        db_engine.dispose(close=False)
+        opened += warm_pool(db_engine)
+    server.log.info(f"Worker {worker.pid} warmed {opened} database connections")
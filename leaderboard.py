@@ -0,0 +1,92 @@
+import heapq
+from datetime import date
+
+from sqlalchemy import select
+
+from models import User, WeeklyExerciseRollup, shard_engines
+from rollup import week_start
+
+# Leaderboards by URL name, ranking users on the weekly total of a tracker metric
+LEADERBOARD_METRICS = {
+    'steps': 'steps_taken',
+    'distance': 'distance',
+    'calories': 'calories_burned',
+    'duration': 'exercise_duration',
+}
+LEADERBOARD_DEFAULT_SIZE = 10
+LEADERBOARD_MAX_SIZE = 100
+# Extra rows read per shard to make up for deactivated users dropped from the top; read again with a larger
+# margin when that is not enough
+LEADERBOARD_INACTIVE_MARGIN = 10
+
+
+def weekly_leaderboard(session_db, metric: str, day: date, limit: int = LEADERBOARD_DEFAULT_SIZE) -> list:
+    """
+    Get the users with the highest weekly total of a metric.
+
+    The weekly rollups are kept up to date on every tracker write, and each leaderboard metric has a
+    (week_start, <metric>_sum) index, so each shard only reads its top `limit` index entries (plus a small
+    margin) no matter how many users or entries there are. The per-shard rankings are merged, and only those
+    users are looked up on the primary database, where deactivated ones are dropped; in the rare case that
+    leaves fewer than `limit` users while more rows exist, the rankings are read again with a larger margin.
+
+    Args:
+        session_db: The database session to use.
+        metric (str): One of the `LEADERBOARD_METRICS` names.
+        day (date): Any day of the week to rank.
+        limit (int, optional): The number of users to return. Defaults to LEADERBOARD_DEFAULT_SIZE.
+
+    Returns:
+        list: Dicts with ``rank``, ``user_id``, ``username``, ``fullname`` and ``value``, best first.
+    """
+    total = getattr(WeeklyExerciseRollup, f'{LEADERBOARD_METRICS[metric]}_sum')
+    fetch = limit + LEADERBOARD_INACTIVE_MARGIN
+    while True:
+        statement = select(WeeklyExerciseRollup.user_id, total).where(
+            WeeklyExerciseRollup.week_start == week_start(day)
+        ).order_by(total.desc()).limit(fetch)
+        rows, exhausted = [], True
+        for shard in range(len(shard_engines)):
+            shard_rows = session_db.execute(statement, bind_arguments={'shard': shard}).all()
+            exhausted = exhausted and len(shard_rows) < fetch
+            rows.extend(shard_rows)
+        if len(shard_engines) > 1:
+            rows = heapq.nlargest(fetch, rows, key=lambda row: row[1])
+
+        users = {user_id: (username, fullname) for user_id, username, fullname in session_db.execute(
+            select(User.id, User.username, User.fullname).where(
+                User.id.in_([user_id for user_id, _ in rows]),
+                User.is_active.is_(True),
+            )
+        )}
+        rows = [row for row in rows if row[0] in users][:limit]
+        if len(rows) == limit or exhausted:
+            break
+        fetch *= 4
+
+    return [
+        {'rank': rank, 'user_id': user_id, 'username': users[user_id][0], 'fullname': users[user_id][1],
+         'value': value}
+        for rank, (user_id, value) in enumerate(rows, start=1)
+    ]
+
+
+def weekly_total(session_db, metric: str, user_id: int, day: date):
+    """
+    Get one user's weekly total of a leaderboard metric, from a single unique-key lookup.
+
+    Args:
+        session_db: The database session to use.
+        metric (str): One of the `LEADERBOARD_METRICS` names.
+        user_id (int): The user to look up.
+        day (date): Any day of the week.
+
+    Returns:
+        The total, or 0 when the user has no entries that week.
+    """
+    total = getattr(WeeklyExerciseRollup, f'{LEADERBOARD_METRICS[metric]}_sum')
+    value = session_db.execute(select(total).where(
+        WeeklyExerciseRollup.user_id == user_id,
+        WeeklyExerciseRollup.week_start == week_start(day),
+    ), bind_arguments={'user_id': user_id}).scalar()
+    return value or 0
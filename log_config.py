@@ -1,50 +1,164 @@
+import atexit
+import itertools
+import json
 import logging
 import os
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+# Process-wide logging state; setup_logging() only configures the root logger once
+_setup_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only one in `every` records at or below `max_level`; records above it always pass."""
+
+    def __init__(self, max_level: int, every: int):
+        super().__init__()
+        self.max_level = max_level
+        self.every = every
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.every <= 1:
+            return True
+        # Decide once per record, even when the filter is attached to several handlers
+        if not hasattr(record, 'sampled'):
+            record.sampled = next(self._counter) % self.every == 0
+        return record.sampled
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    """Give a forked child its own log queue and listener thread; the parent's thread does not survive the fork."""
+    global _listener
+
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
 
 
 def setup_logging():
     """
     Set up logging configuration for the application with a rotating log file and console output.
+
+    The configuration is applied once per process; later calls are no-ops. By default records are handed
+    to a background thread through a queue (LOG_QUEUE), so request threads never wait on disk or console I/O.
+    LOG_FORMAT=json switches to structured output, and LOG_SAMPLE_EVERY keeps only one in N records at or
+    below LOG_SAMPLE_LEVEL.
     """
-    # Define log directory and file name
-    log_dir = 'logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-
-    log_file = os.path.join(log_dir, f'tracker-app-{datetime.now().strftime("%Y-%m-%d")}.log')
-
-    # Get log level from environment variable
-    log_level_str = os.getenv('LOG_LEVEL', 'INFO').upper()
-    log_level = getattr(logging, log_level_str, logging.INFO)  # Default to INFO if invalid
-
-    # Create a logger
-    logger = logging.getLogger()
-    logger.setLevel(log_level)
-
-    # Define log format
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    formatter = logging.Formatter(log_format)
-
-    # Create and configure console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-
-    # Set up log rotation for the file handler
-    try:
-        file_handler = RotatingFileHandler(
-            log_file, maxBytes=10 * 1024 * 1024, backupCount=5
-        )  # 10 MB size limit and 5 backup files
-        file_handler.setFormatter(formatter)
-    except Exception as e:
-        logger.error(f"Failed to set up file handler: {e}")
-        raise
-
-    # Remove existing handlers to prevent duplicate logs
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    # Add the handlers to the logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    global _listener, _queue_handler, _configured
+
+    with _setup_lock:
+        if _configured:
+            return
+
+        # Define log directory and file name
+        log_dir = 'logs'
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        log_file = os.path.join(log_dir, f'tracker-app-{datetime.now().strftime("%Y-%m-%d")}.log')
+
+        # Get log level from environment variable
+        log_level_str = os.getenv('LOG_LEVEL', 'INFO').upper()
+        log_level = getattr(logging, log_level_str, logging.INFO)  # Default to INFO if invalid
+
+        # Create a logger
+        logger = logging.getLogger()
+        logger.setLevel(log_level)
+
+        # Define log format
+        if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+            formatter = JsonFormatter()
+        else:
+            log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            formatter = logging.Formatter(log_format)
+
+        # Create and configure console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+
+        # Set up log rotation for the file handler
+        try:
+            file_handler = RotatingFileHandler(
+                log_file, maxBytes=10 * 1024 * 1024, backupCount=5
+            )  # 10 MB size limit and 5 backup files
+            file_handler.setFormatter(formatter)
+        except Exception as e:
+            logger.error(f"Failed to set up file handler: {e}")
+            raise
+
+        # Remove existing handlers to prevent duplicate logs
+        if logger.hasHandlers():
+            logger.handlers.clear()
+
+        sample_level_str = os.getenv('LOG_SAMPLE_LEVEL', 'DEBUG').upper()
+        sampling_filter = SamplingFilter(getattr(logging, sample_level_str, logging.DEBUG),
+                                         int(os.getenv('LOG_SAMPLE_EVERY', 1)))
+
+        if os.getenv('LOG_QUEUE', 'true').lower() in ('1', 'true', 'yes'):
+            # Request threads only enqueue records; a single listener thread does the formatting and I/O
+            queue_handler = DroppingQueueHandler(queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000))))
+            queue_handler.addFilter(sampling_filter)
+            logger.addHandler(queue_handler)
+
+            _queue_handler = queue_handler
+            _listener = QueueListener(queue_handler.queue, console_handler, file_handler,
+                                      respect_handler_level=True)
+            _listener.start()
+            atexit.register(_stop_listener)
+            # Pre-forking servers (gunicorn --preload) set logging up in the master before forking the workers
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=_restart_listener)
+        else:
+            # Add the handlers to the logger
+            console_handler.addFilter(sampling_filter)
+            file_handler.addFilter(sampling_filter)
+            logger.addHandler(console_handler)
+            logger.addHandler(file_handler)
+
+        _configured = True
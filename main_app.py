@@ -2,22 +2,34 @@ import os
 from datetime import timedelta
 
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, jsonify
 
-from models import init_db
+from archive import start_archiver
+from commands import register_commands
+from metrics import init_metrics
+from models import init_db, pool_metrics, shard_engines, SHARD_DATABASE_URLS
+from session_store import init_session_store
 from tracker_route import tracker_router
 from user_route import user_router
 
 
+def env_flag(name: str, default: bool) -> bool:
+    """Read a boolean setting; only 1/true/yes/on (any case) are true, so FLASK_DEBUG=False really is false."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 def create_app():
     app = Flask(__name__)
     load_dotenv()
 
     app.config.from_mapping(
         SECRET_KEY=os.getenv("SECRET_KEY", "Secret_Key-2024"),
-        SESSION_PERMANENT=bool(os.getenv("SESSION_PERMANENT", True)),
+        SESSION_PERMANENT=env_flag("SESSION_PERMANENT", True),
         PERMANENT_SESSION_LIFETIME=timedelta(minutes=int(os.getenv("PERMANENT_SESSION_LIFETIME", 30))),
-        DEBUG=bool(os.getenv("FLASK_DEBUG", True))
+        DEBUG=env_flag("FLASK_DEBUG", False)
     )
 
     with app.app_context():
@@ -25,6 +37,17 @@ def create_app():
 
     app.register_blueprint(user_router)
     app.register_blueprint(tracker_router)
+    init_session_store(app)
+    register_commands(app)
+    init_metrics(app)
+    start_archiver()
+
+    @app.route("/health")
+    def health():
+        health_status = {"status": "ok", "database": pool_metrics()}
+        if SHARD_DATABASE_URLS:
+            health_status["shards"] = [pool_metrics(shard_engine) for shard_engine in shard_engines]
+        return jsonify(health_status)
 
     @app.errorhandler(404)
     def page_not_found(error):
@@ -33,6 +56,25 @@ def create_app():
     return app
 
 
+def warm_up(app) -> int:
+    """
+    Compile every template ahead of the first requests.
+
+    Compiled templates stay in the Jinja environment's cache, so with a preloading server the workers inherit
+    them from the master instead of each compiling (and holding) their own copy.
+
+    Args:
+        app (Flask): The application to warm up.
+
+    Returns:
+        int: The number of templates compiled.
+    """
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
 if __name__ == '__main__':
     todo_app = create_app()
     todo_app.run(host='0.0.0.0', port=8181, debug=todo_app.config["DEBUG"])
@@ -0,0 +1,212 @@
+import bisect
+import logging
+import os
+import threading
+import time
+
+from flask import g, request, has_request_context, before_render_template, template_rendered, Response
+from sqlalchemy import event
+
+from analytics import insights_cache
+from log_config import setup_logging
+from models import database_engines, pool_metrics
+from response_cache import cache_stats
+from session_store import session_store_stats
+from utils import user_cache, token_cache
+from write_queue import get_write_queue
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Requests slower than this are logged with the SQL they ran; 0 disables the slow-request log
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(labelnames, labels, extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """A Prometheus-style counter, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus-style histogram with fixed buckets, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests served.", ("endpoint", "method", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency.",
+                            labelnames=("endpoint", "method"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries per HTTP request.",
+                            buckets=COUNT_BUCKETS, labelnames=("endpoint",))
+REQUEST_QUERY_TIME = Histogram("http_request_db_duration_seconds", "Database time per HTTP request.",
+                               labelnames=("endpoint",))
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "Database query latency.")
+TEMPLATE_LATENCY = Histogram("template_render_duration_seconds", "Jinja template render time.",
+                             labelnames=("template",))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    QUERY_LATENCY.observe(elapsed)
+
+    if has_request_context() and "metrics_started" in g:
+        g.metrics_query_count += 1
+        g.metrics_query_seconds += elapsed
+        if SLOW_REQUEST_MS and len(g.metrics_statements) < SLOW_REQUEST_MAX_STATEMENTS:
+            g.metrics_statements.append((elapsed, statement))
+
+
+def instrument_engine(db_engine):
+    """
+    Record the latency of every query run on an engine, and count it against the current request.
+
+    Args:
+        db_engine (Engine): The engine to instrument; pass `AsyncEngine.sync_engine` for asyncio engines.
+    """
+    event.listen(db_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(db_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+for db_engine in database_engines():
+    instrument_engine(db_engine)
+
+
+def _before_render_template(sender, template, context, **extra):
+    if has_request_context():
+        g.metrics_template_started = time.perf_counter()
+
+
+def _template_rendered(sender, template, context, **extra):
+    if has_request_context() and "metrics_template_started" in g:
+        TEMPLATE_LATENCY.observe(time.perf_counter() - g.pop("metrics_template_started"), template.name)
+
+
+def render_metrics() -> str:
+    """Render every metric, plus the connection pool and cache gauges, in the Prometheus text format."""
+    lines = []
+    for metric in (REQUESTS, REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_QUERY_TIME, QUERY_LATENCY, TEMPLATE_LATENCY):
+        lines.extend(metric.render())
+
+    for name, value in pool_metrics().items():
+        if isinstance(value, (int, float)):
+            lines.extend([f"# TYPE db_pool_{name} gauge", f"db_pool_{name} {value}"])
+
+    caches = (("user", user_cache.stats()), ("token", token_cache.stats()), ("response", cache_stats()),
+              ("analytics", insights_cache.stats()), ("session", session_store_stats()))
+    for name, metric_name, kind in (("size", "cache_size", "gauge"), ("maxsize", "cache_maxsize", "gauge"),
+                                    ("hits", "cache_hits_total", "counter"),
+                                    ("misses", "cache_misses_total", "counter")):
+        lines.append(f"# TYPE {metric_name} {kind}")
+        lines.extend(f'{metric_name}{{cache="{cache_name}"}} {stats[name]}' for cache_name, stats in caches)
+
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        stats = write_queue.stats()
+        for name, kind in (("depth", "gauge"), ("maxsize", "gauge"), ("written", "counter"), ("failed", "counter"),
+                           ("rejected", "counter"), ("commits", "counter")):
+            metric_name = f"write_queue_{name}" if kind == "gauge" else f"write_queue_{name}_total"
+            lines.extend([f"# TYPE {metric_name} {kind}", f"{metric_name} {stats[name]}"])
+
+    return "\n".join(lines) + "\n"
+
+
+def init_metrics(app):
+    """
+    Instrument a Flask app: per-endpoint latency, per-request query count and time, template render time,
+    an optional slow-request log and a `/metrics` endpoint in the Prometheus text format.
+
+    Args:
+        app (Flask): The application to instrument.
+    """
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_query_count = 0
+        g.metrics_query_seconds = 0.0
+        g.metrics_statements = []
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "metrics_started" not in g:
+            return response
+
+        elapsed = time.perf_counter() - g.metrics_started
+        endpoint = request.endpoint or "unmatched"
+        REQUESTS.inc(endpoint, request.method, response.status_code)
+        REQUEST_LATENCY.observe(elapsed, endpoint, request.method)
+        REQUEST_QUERIES.observe(g.metrics_query_count, endpoint)
+        REQUEST_QUERY_TIME.observe(g.metrics_query_seconds, endpoint)
+
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            statements = "\n".join(f"  [{seconds * 1000:.1f} ms] {statement}"
+                                   for seconds, statement in g.metrics_statements)
+            logger.warning(f"Slow request {request.method} {request.path} took {elapsed * 1000:.1f} ms "
+                           f"with {g.metrics_query_count} queries ({g.metrics_query_seconds * 1000:.1f} ms):\n"
+                           f"{statements}")
+        return response
+
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
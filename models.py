@@ -1,19 +1,301 @@
+import bisect
+import hashlib
 import os
+import threading
+import time
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Text, DateTime, ForeignKey, Float
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy import create_engine, event, make_url, Column, Integer, String, Boolean, Text, Date, DateTime, ForeignKey, Float, Index, \
+    UniqueConstraint, delete, insert, inspect, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session as OrmSession
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.sql.util import find_tables
 from sqlalchemy.sql import func
 
 # Load environment variables from .env file
 load_dotenv()
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL", "sqlite:///./exercise-tracker.db")
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=False)
-Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+# Connection pool settings (ignored for in-memory SQLite, which shares a single connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# SQLite pragmas applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+# Databases the per-user tables are spread over, comma-separated. The primary database (SQLALCHEMY_DATABASE_URL)
+# keeps the users table and, when no shards are configured, everything else too. Shards must share its dialect.
+SHARD_DATABASE_URLS = [url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()]
+# Points each shard gets on the consistent hash ring; more points spread users more evenly
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", 64))
+# Tables whose rows belong to one user, stored on that user's shard
+SHARDED_TABLES = frozenset({'daily_exercise_tracker', 'archived_exercise_tracker', 'daily_exercise_rollup',
+                            'weekly_exercise_rollup'})
+
+# asyncio drivers used by create_async_db_engine, per dialect
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+
+class MeteredQueuePool(QueuePool):
+    """A QueuePool that also records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._wait_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._wait_lock:
+                self.wait_count += 1
+                self.wait_seconds_total += elapsed
+                self.wait_seconds_max = max(self.wait_seconds_max, elapsed)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def create_db_engine(database_url: str, **kwargs):
+    """
+    Create a database engine with pooling suited to its dialect.
+
+    SQLite files get a metered connection pool plus WAL journaling, `synchronous=NORMAL` and a busy timeout
+    so readers do not block on writers; in-memory SQLite shares one connection. Other databases get a
+    metered QueuePool sized by the DB_POOL_* settings, with pre-ping and connection recycling.
+
+    Args:
+        database_url (str): The SQLAlchemy database URL.
+        **kwargs: Extra keyword arguments passed on to `create_engine`.
+
+    Returns:
+        Engine: The configured engine.
+    """
+    url = make_url(database_url)
+
+    if url.get_backend_name() == 'sqlite':
+        kwargs.setdefault('connect_args', {})['check_same_thread'] = False
+        if url.database in (None, '', ':memory:'):
+            return create_engine(url, poolclass=StaticPool, echo=False, **kwargs)
+
+        db_engine = create_engine(url, poolclass=MeteredQueuePool, pool_size=DB_POOL_SIZE,
+                                  max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT, echo=False, **kwargs)
+        event.listen(db_engine, 'connect', _set_sqlite_pragmas)
+        return db_engine
+
+    return create_engine(url, poolclass=MeteredQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                         pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=DB_POOL_PRE_PING,
+                         echo=False, **kwargs)
+
+
+def create_async_db_engine(database_url: str, **kwargs):
+    """
+    Create an asyncio engine on the same database, for the ASGI entry point.
+
+    The driver in the URL is replaced by the asyncio driver of its dialect (see ASYNC_DRIVERS), which must be
+    installed. The pool is sized by the same DB_POOL_* settings, and SQLite files get the same pragmas as
+    `create_db_engine`.
+
+    Args:
+        database_url (str): The SQLAlchemy database URL.
+        **kwargs: Extra keyword arguments passed on to `create_async_engine`.
+
+    Returns:
+        AsyncEngine: The configured engine.
+
+    Raises:
+        ValueError: If the dialect has no known asyncio driver or the database is in-memory SQLite.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend} databases.")
+    url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            raise ValueError("An in-memory SQLite database cannot be shared with an asyncio engine.")
+        db_engine = create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                        pool_timeout=DB_POOL_TIMEOUT, echo=False, **kwargs)
+        event.listen(db_engine.sync_engine, 'connect', _set_sqlite_pragmas)
+        return db_engine
+
+    return create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                               pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=DB_POOL_PRE_PING, echo=False, **kwargs)
+
+
+def pool_metrics(db_engine=None) -> dict:
+    """
+    Report the state of an engine's connection pool for monitoring.
+
+    Args:
+        db_engine (Engine, optional): The engine to inspect; the application engine when omitted.
+
+    Returns:
+        dict: Pool size, checked-out/checked-in connections, overflow and checkout wait statistics.
+    """
+    pool = (db_engine or engine).pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+
+    metrics = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    if isinstance(pool, MeteredQueuePool):
+        metrics.update({
+            "wait_count": pool.wait_count,
+            "wait_seconds_total": round(pool.wait_seconds_total, 6),
+            "wait_seconds_max": round(pool.wait_seconds_max, 6),
+        })
+    return metrics
+
+
+class ShardRoutingError(Exception):
+    """Raised when a statement on the per-user tables cannot be routed to a single shard."""
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ShardRing:
+    """
+    A consistent hash ring mapping user ids to shards.
+
+    Every shard is placed on the ring at `virtual_nodes` points derived from its key (its database URL), and a
+    user belongs to the shard owning the first point after the hash of their id. Adding or removing a shard
+    only moves the users of the ring segments it gains or loses, about 1/N of them, instead of reshuffling
+    everyone as `user_id % N` would.
+
+    Args:
+        keys (list): One stable key per shard, in shard order.
+        virtual_nodes (int, optional): Points per shard. Defaults to SHARD_VIRTUAL_NODES.
+    """
+
+    def __init__(self, keys, virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        points = sorted((_ring_hash(f"{key}#{node}"), shard)
+                        for shard, key in enumerate(keys) for node in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+        self.size = len(keys)
+
+    def shard_for(self, user_id: int) -> int:
+        if self.size == 1:
+            return 0
+        position = bisect.bisect(self._hashes, _ring_hash(str(user_id))) % len(self._hashes)
+        return self._shards[position]
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+# Without SHARD_DATABASE_URLS the primary database is the only shard
+shard_engines = [engine if url == SQLALCHEMY_DATABASE_URL else create_db_engine(url)
+                 for url in SHARD_DATABASE_URLS] or [engine]
+shard_ring = ShardRing(SHARD_DATABASE_URLS or [SQLALCHEMY_DATABASE_URL])
+
+_current_user_resolver = None
+
+
+def shard_for_user(user_id: int) -> int:
+    """Get the index in `shard_engines` of the shard holding a user's rows."""
+    return shard_ring.shard_for(user_id)
+
+
+def database_engines() -> list:
+    """Get the primary engine followed by every shard engine that is not the primary."""
+    return [engine] + [shard_engine for shard_engine in shard_engines if shard_engine is not engine]
+
+
+def set_current_user_resolver(resolver):
+    """
+    Register the function giving the id of the user a session works for when it was not told explicitly,
+    typically the logged-in user of the current request; it returns None when there is none.
+    """
+    global _current_user_resolver
+    _current_user_resolver = resolver
+
+
+class RoutingSession(OrmSession):
+    """
+    A Session sending statements on the per-user tables (SHARDED_TABLES) to their user's shard and everything
+    else to the primary database, so callers keep using one `Session()` whatever the number of shards.
+
+    The shard is taken from, in order: the `shard` or `user_id` bind argument of a statement
+    (``session_db.execute(statement, bind_arguments={'user_id': ...})``), the `shard` or `user_id` the session was
+    created with, then the current user resolver. A statement joining per-user tables with primary ones cannot be
+    routed once shards are configured.
+
+    Args:
+        shard (int, optional): Route to this index of `shard_engines`.
+        user_id (int, optional): Route to the shard of this user.
+    """
+
+    def __init__(self, *args, shard: int = None, user_id: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard = shard
+        self.user_id = user_id
+
+    def get_bind(self, mapper=None, *, clause=None, shard: int = None, user_id: int = None, **kwargs):
+        if not SHARD_DATABASE_URLS:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+
+        tables = set() if mapper is None else {table.name for table in mapper.tables}
+        if clause is not None:
+            tables.update(table.name for table in find_tables(clause, include_crud=True))
+        sharded = tables & SHARDED_TABLES
+        if not sharded:
+            return engine
+        if tables - sharded:
+            raise ShardRoutingError(f"Cannot join {', '.join(sorted(sharded))} with {', '.join(sorted(tables - sharded))}"
+                                    f" across shards.")
+        if len(shard_engines) == 1:
+            return shard_engines[0]
+
+        if shard is None and user_id is None:
+            shard, user_id = self.shard, self.user_id
+        if shard is None and user_id is None and _current_user_resolver is not None:
+            user_id = _current_user_resolver()
+        if shard is None and user_id is None:
+            raise ShardRoutingError(f"No user or shard to route a statement on {', '.join(sorted(sharded))} to.")
+        return shard_engines[shard if shard is not None else shard_for_user(user_id)]
+
+
+Session = sessionmaker(class_=RoutingSession, bind=engine, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
 
+def _owner_column():
+    """
+    The `user_id` column of a per-user table (SHARDED_TABLES). Users only live on the primary database, so once
+    shards are configured the column carries no foreign key, which the shards' empty `users` tables would fail.
+    """
+    if SHARD_DATABASE_URLS:
+        return Column(Integer, nullable=False)
+    return Column(Integer, ForeignKey('users.id'), nullable=False)
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -27,7 +309,8 @@ class User(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     # Relationship with the exercise tracker
-    exercises = relationship('DailyExerciseTracker', back_populates='user', lazy=True)
+    exercises = relationship('DailyExerciseTracker', back_populates='user', lazy=True,
+                             primaryjoin='User.id == foreign(DailyExerciseTracker.user_id)')
 
 
 class DailyExerciseTracker(Base):
@@ -42,15 +325,230 @@ class DailyExerciseTracker(Base):
     min_heart_rate = Column(Integer, nullable=False)
     avg_heart_rate = Column(Integer, nullable=False)
     exercise_duration = Column(Integer, nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = _owner_column()
     is_active = Column(Boolean, default=True, server_default='1')
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     # Relationship with User
-    user = relationship('User', back_populates='exercises')
+    user = relationship('User', back_populates='exercises',
+                        primaryjoin='User.id == foreign(DailyExerciseTracker.user_id)')
+
+    # Dashboard and report queries filter by user and a date range, so serve them from an index range scan.
+    # The archiver finds old entries by date and soft-deleted ones by their last update, across all users.
+    __table_args__ = (
+        Index('ix_daily_exercise_tracker_user_id_date', 'user_id', 'date'),
+        Index('ix_daily_exercise_tracker_date', 'date'),
+        Index('ix_daily_exercise_tracker_is_active_updated_at', 'is_active', 'updated_at'),
+    )
+
+
+class ArchivedExerciseTracker(Base):
+    """
+    Cold tier of DailyExerciseTracker: old entries and soft-deleted ones are moved here by `archive.py`, keeping
+    the hot table (and the range scans of the dashboard and reports) small. Archived entries get ids of their own,
+    so an id identifies an entry within one table only.
+    """
+    __tablename__ = 'archived_exercise_tracker'
+
+    id = Column(Integer, primary_key=True)
+    date = Column(DateTime, nullable=False)
+    steps_taken = Column(Integer, nullable=False)
+    distance = Column(Float, nullable=False)
+    calories_burned = Column(Float, nullable=False)
+    max_heart_rate = Column(Integer, nullable=False)
+    min_heart_rate = Column(Integer, nullable=False)
+    avg_heart_rate = Column(Integer, nullable=False)
+    exercise_duration = Column(Integer, nullable=False)
+    user_id = _owner_column()
+    # False for soft-deleted entries, which are kept for the record but never reported
+    is_active = Column(Boolean, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_archived_exercise_tracker_user_id_date', 'user_id', 'date'),
+    )
+
+
+class ExerciseRollupMixin:
+    """Columns shared by the pre-aggregated exercise rollup tables (count plus sum/min/max per metric)."""
+
+    id = Column(Integer, primary_key=True, index=True)
+    entry_count = Column(Integer, nullable=False, default=0)
+    steps_taken_sum = Column(Integer, nullable=False, default=0)
+    steps_taken_min = Column(Integer)
+    steps_taken_max = Column(Integer)
+    distance_sum = Column(Float, nullable=False, default=0)
+    distance_min = Column(Float)
+    distance_max = Column(Float)
+    calories_burned_sum = Column(Float, nullable=False, default=0)
+    calories_burned_min = Column(Float)
+    calories_burned_max = Column(Float)
+    max_heart_rate_sum = Column(Integer, nullable=False, default=0)
+    max_heart_rate_min = Column(Integer)
+    max_heart_rate_max = Column(Integer)
+    min_heart_rate_sum = Column(Integer, nullable=False, default=0)
+    min_heart_rate_min = Column(Integer)
+    min_heart_rate_max = Column(Integer)
+    avg_heart_rate_sum = Column(Integer, nullable=False, default=0)
+    avg_heart_rate_min = Column(Integer)
+    avg_heart_rate_max = Column(Integer)
+    exercise_duration_sum = Column(Integer, nullable=False, default=0)
+    exercise_duration_min = Column(Integer)
+    exercise_duration_max = Column(Integer)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class DailyExerciseRollup(ExerciseRollupMixin, Base):
+    __tablename__ = 'daily_exercise_rollup'
+
+    user_id = _owner_column()
+    day = Column(Date, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'day', name='uq_daily_exercise_rollup_user_id_day'),
+    )
+
+
+class WeeklyExerciseRollup(ExerciseRollupMixin, Base):
+    __tablename__ = 'weekly_exercise_rollup'
+
+    user_id = _owner_column()
+    # Monday of the ISO week the rollup covers
+    week_start = Column(Date, nullable=False)
+
+    # Leaderboards read the top K users of a week straight off these indexes, whatever the number of users
+    __table_args__ = (
+        UniqueConstraint('user_id', 'week_start', name='uq_weekly_exercise_rollup_user_id_week_start'),
+        Index('ix_weekly_exercise_rollup_week_start_steps_taken_sum', 'week_start', 'steps_taken_sum'),
+        Index('ix_weekly_exercise_rollup_week_start_distance_sum', 'week_start', 'distance_sum'),
+        Index('ix_weekly_exercise_rollup_week_start_calories_burned_sum', 'week_start', 'calories_burned_sum'),
+        Index('ix_weekly_exercise_rollup_week_start_exercise_duration_sum', 'week_start', 'exercise_duration_sum'),
+    )
+
+
+class SchemaInfo(Base):
+    __tablename__ = 'schema_info'
+
+    id = Column(Integer, primary_key=True)
+    # schema_fingerprint() of the models the schema was last created/migrated for
+    fingerprint = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+def schema_fingerprint() -> str:
+    """A hash of the tables, columns and indexes the models define; it changes whenever the schema does."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        columns = ",".join(f"{column.name}:{column.type}" for column in table.columns)
+        indexes = ",".join(sorted(index.name for index in table.indexes))
+        parts.append(f"{table.name}({columns})[{indexes}]")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def stored_schema_fingerprint(db_engine=None):
+    """The fingerprint recorded by the last init_db() on the database, or None when there is none."""
+    try:
+        with (db_engine or engine).connect() as connection:
+            return connection.execute(select(SchemaInfo.fingerprint).where(SchemaInfo.id == 1)).scalar()
+    except DBAPIError:
+        # The schema_info table does not exist yet
+        return None
+
+
+def migrate_db(db_engine=None):
+    """
+    Bring the schema of an existing database up to date.
+
+    `create_all` skips tables that already exist, so indexes added to those tables later on
+    (such as the composite user/date index) are created here when they are missing.
+
+    Args:
+        db_engine (Engine, optional): The database to migrate; the primary database when omitted.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db_engine or engine, checkfirst=True)
+
+
+def backfill_rollups(db_engine=None) -> int:
+    """
+    Rebuild every rollup of a database from its exercise entries, e.g. after the rollup tables were added to it.
+
+    The session is bound to the database directly, so the rollups of a shard are built from that shard's
+    entries whatever the routing of the application session.
+
+    Args:
+        db_engine (Engine, optional): The database to backfill; the primary database when omitted.
+
+    Returns:
+        int: The number of daily buckets rebuilt.
+    """
+    # rollup imports the models, so it can only be imported once they are defined
+    from rollup import rebuild_rollups
+
+    with OrmSession(bind=db_engine or engine) as session_db:
+        buckets = rebuild_rollups(session_db)
+        session_db.commit()
+    return buckets
+
+
+def init_db(force: bool = False) -> bool:
+    """
+    Create all tables in the database and apply pending schema migrations.
+
+    Every shard gets the full schema, though only its per-user tables are used (their `user_id` then references
+    no table, see `_owner_column`). Creating and checking every table and index costs a round trip each, so it is
+    skipped for each database that already records the fingerprint of the current models. When the rollup tables
+    are created on a database that already holds exercise entries, they are backfilled from those entries.
+
+    Args:
+        force (bool, optional): Create and migrate even when the schema is current. Defaults to False.
+
+    Returns:
+        bool: True if the schema of any database was created or migrated, False if they were all current.
+    """
+    fingerprint = schema_fingerprint()
+    changed = False
+    for db_engine in database_engines():
+        if not force and stored_schema_fingerprint(db_engine) == fingerprint:
+            continue
+
+        existing_tables = set(inspect(db_engine).get_table_names())
+        Base.metadata.create_all(bind=db_engine)
+        migrate_db(db_engine)
+        if not {DailyExerciseRollup.__tablename__, WeeklyExerciseRollup.__tablename__} <= existing_tables:
+            backfill_rollups(db_engine)
+        with db_engine.begin() as connection:
+            connection.execute(delete(SchemaInfo))
+            connection.execute(insert(SchemaInfo).values(id=1, fingerprint=fingerprint))
+        changed = True
+    return changed
+
+
+def warm_pool(db_engine=None, connections: int = DB_POOL_SIZE) -> int:
+    """
+    Open pool connections ahead of the first requests, so they do not pay for connecting (and the SQLite pragmas).
+
+    Call it in each worker process after forking: connections must not be shared across processes.
+
+    Args:
+        db_engine (Engine, optional): The engine to warm; the application engine when omitted.
+        connections (int, optional): Connections to open, at most the pool size. Defaults to DB_POOL_SIZE.
 
+    Returns:
+        int: The number of connections opened.
+    """
+    db_engine = db_engine or engine
+    if not isinstance(db_engine.pool, QueuePool):
+        return 0
 
-def init_db():
-    """Create all tables in the database."""
-    Base.metadata.create_all(bind=engine)
+    opened = []
+    try:
+        for _ in range(min(connections, db_engine.pool.size())):
+            opened.append(db_engine.connect())
+    finally:
+        # Closing returns them to the pool, where they stay open for the next checkouts
+        for connection in opened:
+            connection.close()
+    return len(opened)
@@ -0,0 +1,269 @@
+import os
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+
+from archive import active_entries
+from models import DailyExerciseRollup
+from rollup import ROLLUP_METRICS
+
+load_dotenv()
+
+# Report views served by tracker_report and the metrics each of them charts
+REPORT_ACTIONS = {
+    'by_steps': ('steps_taken',),
+    'by_distance': ('distance',),
+    'by_calories': ('calories_burned',),
+    'by_heart_rate': ('avg_heart_rate',),
+    'by_duration': ('exercise_duration',),
+    'all': ('steps_taken', 'distance', 'calories_burned', 'avg_heart_rate', 'min_heart_rate', 'max_heart_rate',
+            'exercise_duration'),
+}
+
+# Preset report windows (days back from today) selectable with `?range=`, plus `custom` with `start` / `end`
+REPORT_RANGES = {'7d': 7, '30d': 30, '90d': 90, '1y': 365}
+REPORT_DEFAULT_RANGE = '7d'
+REPORT_BUCKETS = ('hour', 'day', 'week', 'month')
+REPORT_DEFAULT_BUCKET = 'day'
+
+# Upper bound on the length of a custom window, and on the points of each chart series sent to the browser
+REPORT_MAX_DAYS = int(os.getenv("REPORT_MAX_DAYS", 3660))
+REPORT_MAX_POINTS = int(os.getenv("REPORT_MAX_POINTS", 300))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_report_window(args, today: date) -> dict:
+    """
+    Parse the report window and bucket size from request arguments.
+
+    Args:
+        args: The request arguments, read for ``range`` (one of `REPORT_RANGES` or ``custom``),
+            ``start`` / ``end`` (ISO dates of a custom window, ``end`` defaulting to today) and ``bucket``.
+        today (date): The current day, which preset windows end on.
+
+    Returns:
+        dict: The ``range`` name, the ``start`` and ``end`` days (both inclusive) and the ``bucket`` size.
+
+    Raises:
+        ValueError: If any argument is invalid or the window is empty or too long.
+    """
+    range_name = args.get('range', REPORT_DEFAULT_RANGE)
+    if range_name == 'custom':
+        if not args.get('start'):
+            raise ValueError("A custom range needs a start date.")
+        start_day = date.fromisoformat(args['start'])
+        end_day = date.fromisoformat(args['end']) if args.get('end') else today
+    elif range_name in REPORT_RANGES:
+        start_day = today - timedelta(days=REPORT_RANGES[range_name])
+        end_day = today
+    else:
+        raise ValueError(f"Invalid report range {range_name}.")
+
+    if start_day > end_day:
+        raise ValueError("The report start date must not be after its end date.")
+    if (end_day - start_day).days > REPORT_MAX_DAYS:
+        raise ValueError(f"Reports cover at most {REPORT_MAX_DAYS} days.")
+
+    bucket = args.get('bucket', REPORT_DEFAULT_BUCKET)
+    if bucket not in REPORT_BUCKETS:
+        raise ValueError(f"Invalid report bucket {bucket}.")
+
+    return {'range': range_name, 'start': start_day, 'end': end_day, 'bucket': bucket}
+
+
+def bucket_expression(column, bucket: str, dialect_name: str):
+    """Truncate a date or datetime column to the start of its hour, day, week (Monday) or month in SQL."""
+    if dialect_name == 'sqlite':
+        if bucket == 'hour':
+            return func.strftime('%Y-%m-%d %H:00:00', column)
+        if bucket == 'day':
+            return func.date(column)
+        if bucket == 'week':
+            return func.date(column, '-6 days', 'weekday 1')
+        return func.strftime('%Y-%m-01', column)
+    if dialect_name == 'postgresql':
+        return func.date_trunc(bucket, column)
+    if dialect_name in ('mysql', 'mariadb'):
+        if bucket == 'hour':
+            return func.date_format(column, '%Y-%m-%d %H:00:00')
+        if bucket == 'day':
+            return func.date(column)
+        if bucket == 'week':
+            return func.subdate(func.date(column), func.weekday(column))
+        return func.date_format(column, '%Y-%m-01')
+    raise ValueError(f"Time bucketing is not supported on {dialect_name}.")
+
+
+def _as_datetime(value) -> datetime:
+    # Bucket expressions come back as strings on SQLite and as dates or datetimes elsewhere
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
+
+
+def build_report(session_db, user_id: int, start_day: date, end_day: date, bucket: str = REPORT_DEFAULT_BUCKET) -> dict:
+    """
+    Build the report of every metric for a user between two days (inclusive) in a single query.
+
+    One GROUP BY pass yields the average, minimum and maximum of all metrics per time bucket, with the
+    buckets computed in SQL: day, week and month buckets are folded from the daily rollups, hour buckets
+    from the active raw tracker rows, hot and archived. The summary over the whole range is folded from
+    those buckets, so every report view is served from the same result.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int): The user to report on.
+        start_day (date): The first day of the report.
+        end_day (date): The last day of the report.
+        bucket (str, optional): One of `REPORT_BUCKETS`. Defaults to ``day``.
+
+    Returns:
+        dict: ``buckets`` (one dict per bucket with ``date``, ``entry_count`` and ``<metric>``,
+        ``<metric>_min``, ``<metric>_max`` for every metric) and ``summary`` (the same keys over the range).
+    """
+    dialect_name = session_db.get_bind().dialect.name
+
+    if bucket == 'hour':
+        entries = active_entries(user_id, _as_datetime(start_day), _as_datetime(end_day + timedelta(days=1)))
+        bucket_column = bucket_expression(entries.c.date, bucket, dialect_name)
+        columns = [bucket_column, func.count(entries.c.id)]
+        for metric in ROLLUP_METRICS:
+            column = entries.c[metric]
+            columns.extend([func.sum(column), func.min(column), func.max(column)])
+        query = session_db.query(*columns)
+    else:
+        if bucket == 'day':
+            bucket_column = DailyExerciseRollup.day
+        else:
+            bucket_column = bucket_expression(DailyExerciseRollup.day, bucket, dialect_name)
+        columns = [bucket_column, func.sum(DailyExerciseRollup.entry_count)]
+        for metric in ROLLUP_METRICS:
+            columns.extend([
+                func.sum(getattr(DailyExerciseRollup, f'{metric}_sum')),
+                func.min(getattr(DailyExerciseRollup, f'{metric}_min')),
+                func.max(getattr(DailyExerciseRollup, f'{metric}_max')),
+            ])
+        query = session_db.query(*columns).filter(
+            DailyExerciseRollup.user_id == user_id,
+            DailyExerciseRollup.day >= start_day,
+            DailyExerciseRollup.day <= end_day,
+        )
+
+    rows = query.group_by(bucket_column).order_by(bucket_column).all()
+
+    buckets = []
+    summary = {'entry_count': 0}
+    totals = dict.fromkeys(ROLLUP_METRICS, 0)
+    for row in rows:
+        entry_count = row[1]
+        bucket_values = {'date': _as_datetime(row[0]), 'entry_count': entry_count}
+        for position, metric in enumerate(ROLLUP_METRICS):
+            total, minimum, maximum = row[2 + position * 3:5 + position * 3]
+            bucket_values[metric] = total / entry_count
+            bucket_values[f'{metric}_min'] = minimum
+            bucket_values[f'{metric}_max'] = maximum
+
+            totals[metric] += total
+            summary[f'{metric}_min'] = min(minimum, summary.get(f'{metric}_min', minimum))
+            summary[f'{metric}_max'] = max(maximum, summary.get(f'{metric}_max', maximum))
+        summary['entry_count'] += entry_count
+        buckets.append(bucket_values)
+
+    for metric in ROLLUP_METRICS:
+        summary[metric] = totals[metric] / summary['entry_count'] if summary['entry_count'] else None
+        summary.setdefault(f'{metric}_min', None)
+        summary.setdefault(f'{metric}_max', None)
+
+    return {'buckets': buckets, 'summary': summary}
+
+
+def downsample(points: list, max_points: int) -> list:
+    """
+    Reduce a time series to at most `max_points` points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; in between, the points are split into equal buckets and from each
+    the point forming the largest triangle with the previously kept point and the average of the next
+    bucket is kept, which preserves peaks and troughs far better than plain striding.
+
+    Args:
+        points (list): ``(datetime, value)`` pairs in time order.
+        max_points (int): The maximum number of points to return.
+
+    Returns:
+        list: The kept ``(datetime, value)`` pairs, in time order.
+    """
+    if max_points < 3 or len(points) <= max_points:
+        return points
+
+    xs = [point[0].timestamp() for point in points]
+    ys = [point[1] for point in points]
+    every = (len(points) - 2) / (max_points - 2)
+
+    sampled = [points[0]]
+    previous = 0
+    for index in range(max_points - 2):
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = int((index + 1) * every) + 1
+        next_end = min(int((index + 2) * every) + 1, len(points))
+        next_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        next_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        # Keep the point of the current bucket spanning the largest triangle
+        best, best_area = None, -1.0
+        for candidate in range(int(index * every) + 1, int((index + 1) * every) + 1):
+            area = abs((xs[previous] - next_x) * (ys[candidate] - ys[previous])
+                       - (xs[previous] - xs[candidate]) * (next_y - ys[previous]))
+            if area > best_area:
+                best, best_area = candidate, area
+
+        sampled.append(points[best])
+        previous = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def chart_series(report: dict, metrics, max_points: int = REPORT_MAX_POINTS) -> dict:
+    """
+    Get the chart series of a report, each downsampled to at most `max_points` points.
+
+    Args:
+        report (dict): A report from `build_report`.
+        metrics: The metrics to chart.
+        max_points (int, optional): The maximum number of points per series. Defaults to REPORT_MAX_POINTS.
+
+    Returns:
+        dict: ``(datetime, value)`` pairs per metric.
+    """
+    return {
+        metric: downsample([(bucket['date'], bucket[metric]) for bucket in report['buckets']], max_points)
+        for metric in metrics
+    }
+
+
+def encode_series(series: dict, delta: bool = False) -> dict:
+    """
+    Encode chart series compactly for the chart API: parallel arrays of timestamps and values per metric.
+
+    Timestamps are epoch milliseconds of the (naive, server-local) bucket starts, read as if they were UTC;
+    values are rounded to two decimals.
+
+    Args:
+        series (dict): ``(datetime, value)`` pairs per metric, as returned by `chart_series`.
+        delta (bool, optional): Send each timestamp but the first as the difference to the previous one, which
+            turns evenly spaced buckets into a repeated constant. Defaults to False.
+
+    Returns:
+        dict: ``{"t": [...], "v": [...]}`` per metric.
+    """
+    encoded = {}
+    for metric, points in series.items():
+        times = [int((bucket_start - _EPOCH).total_seconds()) * 1000 for bucket_start, _ in points]
+        if delta:
+            times = times[:1] + [current - previous for previous, current in zip(times, times[1:])]
+        encoded[metric] = {"t": times, "v": [round(value, 2) for _, value in points]}
+    return encoded
@@ -0,0 +1,288 @@
+import hashlib
+import itertools
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from dotenv import load_dotenv
+from flask import g, request, session, make_response, Response
+
+from log_config import setup_logging
+
+load_dotenv()
+
+# `memory` keeps pages per process (single worker deployments only), `file` shares them between workers
+# through a local directory, `none` disables the cache
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "exercise-tracker-cache"))
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    An in-process LRU store of rendered pages, evicting the least recently used pages beyond `max_bytes`.
+
+    Data versions only live in this process, so they are prefixed with a nonce drawn when the process starts (and
+    again in forked children): a restarted process never hands out the key or ETag of an older dataset. A write
+    in one process cannot invalidate the pages cached by another, so this backend is for a single worker only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.reset()
+
+    def reset(self):
+        """Drop every page and version and draw a new nonce."""
+        # A new lock too: one held by another thread when the process forked would never be released in the child
+        self._lock = threading.Lock()
+        self.size = 0
+        self._entries = OrderedDict()
+        self._nonce = os.urandom(8).hex()
+        self._versions = {}
+        self._version_counter = itertools.count(1)
+
+    def version(self, user_id: int) -> str:
+        with self._lock:
+            return f"{self._nonce}-{self._versions.get(user_id, 0)}"
+
+    def bump(self, user_id: int):
+        with self._lock:
+            self._versions[user_id] = next(self._version_counter)
+
+    def get(self, key: str):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class FileBackend:
+    """
+    A local-directory store of rendered pages shared by every worker process on the host.
+
+    Each user's data version is a file rewritten with a unique token on every change, so concurrent bumps
+    from different workers can never be lost. Pages are written atomically, and once the directory grows
+    beyond `max_bytes` the least recently read pages are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries_dir = os.path.join(directory, "entries")
+        self._versions_dir = os.path.join(directory, "versions")
+        os.makedirs(self._entries_dir, exist_ok=True)
+        os.makedirs(self._versions_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.size = sum(entry.stat().st_size for entry in os.scandir(self._entries_dir))
+
+    def _write(self, path: str, data: bytes):
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as temporary_file:
+            temporary_file.write(data)
+        os.replace(temporary_path, path)
+
+    def version(self, user_id: int) -> str:
+        try:
+            with open(os.path.join(self._versions_dir, str(user_id)), "r") as version_file:
+                return version_file.read()
+        except FileNotFoundError:
+            return "0"
+
+    def bump(self, user_id: int):
+        self._write(os.path.join(self._versions_dir, str(user_id)), os.urandom(8).hex().encode("ascii"))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._entries_dir, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                body = entry_file.read()
+            os.utime(path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return body
+
+    def set(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        self._write(self._path(key), body)
+        with self._lock:
+            self.size += len(body)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(os.scandir(self._entries_dir), key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        # Evict down to 90% so eviction does not run again on the very next write
+        for entry in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                self.size -= entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _create_backend():
+    if RESPONSE_CACHE_BACKEND == "file":
+        return FileBackend(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_BYTES)
+    if RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryBackend(RESPONSE_CACHE_MAX_BYTES)
+    return None
+
+
+response_cache = _create_backend()
+
+
+def _reset_memory_backend():
+    # A forked worker must not share versions (and with them ETags) with its siblings
+    if isinstance(response_cache, MemoryBackend):
+        response_cache.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_memory_backend)
+
+
+def bump_data_version(user_id: int):
+    """
+    Mark a user's tracker data as changed, invalidating every cached page and ETag of that user.
+
+    Args:
+        user_id (int): The user whose DailyExerciseTracker rows were added, updated or deleted.
+    """
+    if response_cache is not None:
+        response_cache.bump(user_id)
+
+
+def data_version(user_id: int):
+    """
+    Get the current version of a user's tracker data, for memoizing anything derived from it.
+
+    Args:
+        user_id (int): The user to look up.
+
+    Returns:
+        str: The data version, or None when the response cache (and with it version tracking) is disabled.
+    """
+    if response_cache is None:
+        return None
+    return response_cache.version(user_id)
+
+
+def cache_stats() -> dict:
+    """Get the size and hit/miss counters of the response cache."""
+    if response_cache is None:
+        return {"size": 0, "maxsize": 0, "hits": 0, "misses": 0}
+    return {"size": response_cache.size, "maxsize": response_cache.max_bytes,
+            "hits": response_cache.hits, "misses": response_cache.misses}
+
+
+def page_cache_key(user) -> tuple:
+    """
+    Get the cache key and ETag of the page the current request asks for.
+
+    The key covers the user, their data version, the current day (pages show rolling windows) and the
+    full request path.
+
+    Args:
+        user (CurrentUser): The authenticated user.
+
+    Returns:
+        tuple: The cache key and the ETag derived from it.
+    """
+    key = (f"{user.id}:{response_cache.version(user.id)}:{date.today().isoformat()}:{user.fullname}:"
+           f"{request.full_path}")
+    return key, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def cached_page(key: str, etag: str, mimetype: str = "text/html"):
+    """
+    Answer the current request from the cache: a 304 when the client already holds the page, else the cached page.
+
+    Args:
+        key (str): The cache key, see `page_cache_key`.
+        etag (str): The ETag of the page.
+        mimetype (str, optional): The mimetype of the cached body. Defaults to text/html.
+
+    Returns:
+        Response: The response, or None on a cache miss.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = response_cache.get(key)
+        if body is None:
+            return None
+        response = Response(body, mimetype=mimetype)
+    return _set_validators(response, etag)
+
+
+def store_page(key: str, etag: str, response: Response) -> Response:
+    """Cache a freshly rendered page if it is a complete 200 response, and set its validators."""
+    if response.status_code != 200 or response.direct_passthrough:
+        return response
+    response_cache.set(key, response.get_data())
+    return _set_validators(response, etag)
+
+
+def _set_validators(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_response(view):
+    """
+    Cache a user's rendered page until their tracker data changes, with ETag / If-None-Match support.
+
+    Must be applied below `session_token_required`, which provides `g.current_user`; see `page_cache_key`.
+    Pages are neither served from nor stored in the cache while flash messages are pending.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if response_cache is None or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        key, etag = page_cache_key(g.current_user)
+        response = cached_page(key, etag)
+        if response is None:
+            response = store_page(key, etag, make_response(view(*args, **kwargs)))
+        return response
+
+    return wrapper
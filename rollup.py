@@ -0,0 +1,281 @@
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, case, func, insert, inspect, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from log_config import setup_logging
+from models import DailyExerciseTracker, ArchivedExerciseTracker, DailyExerciseRollup, WeeklyExerciseRollup
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Tracker columns that are pre-aggregated into the rollup tables
+ROLLUP_METRICS = (
+    'steps_taken',
+    'distance',
+    'calories_burned',
+    'max_heart_rate',
+    'min_heart_rate',
+    'avg_heart_rate',
+    'exercise_duration',
+)
+
+
+def week_start(day: date) -> date:
+    """
+    Get the Monday of the week a day belongs to.
+
+    Args:
+        day (date): Any day of the week.
+
+    Returns:
+        date: The first day (Monday) of that week.
+    """
+    return day - timedelta(days=day.weekday())
+
+
+def _as_datetime(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def _aggregate_model(session_db, model, user_id: int, start: date, end: date):
+    columns = [func.count(model.id)]
+    for metric in ROLLUP_METRICS:
+        column = getattr(model, metric)
+        columns.extend([func.sum(column), func.min(column), func.max(column)])
+
+    return session_db.query(*columns).filter(
+        model.user_id == user_id,
+        model.date >= _as_datetime(start),
+        model.date < _as_datetime(end),
+        model.is_active.is_(True),
+    ).one()
+
+
+def _aggregate(session_db, user_id: int, start: date, end: date):
+    """Aggregate the active tracker rows of a user in [start, end), hot and archived, with one pass per table."""
+    hot = _aggregate_model(session_db, DailyExerciseTracker, user_id, start, end)
+    archived = _aggregate_model(session_db, ArchivedExerciseTracker, user_id, start, end)
+    if not archived[0]:
+        return hot
+    if not hot[0]:
+        return archived
+
+    aggregates = [hot[0] + archived[0]]
+    for position in range(len(ROLLUP_METRICS)):
+        offset = 1 + position * 3
+        aggregates.extend([hot[offset] + archived[offset], min(hot[offset + 1], archived[offset + 1]),
+                           max(hot[offset + 2], archived[offset + 2])])
+    return aggregates
+
+
+def _upsert_dialect(session_db, model):
+    """The dialect module with an upserting INSERT for the database holding `model`, or None if it has none."""
+    dialect_name = session_db.get_bind(inspect(model)).dialect.name
+    return {'sqlite': sqlite, 'postgresql': postgresql, 'mysql': mysql, 'mariadb': mysql}.get(dialect_name)
+
+
+def _refresh_bucket(session_db, model, bucket_column: str, user_id: int, bucket: date, end: date):
+    """Re-aggregate one bucket into its rollup row, inserting, updating or dropping it."""
+    # Create the rollup row if it is missing, then lock it before aggregating: a writer refreshing or adding to
+    # the same bucket, even one creating it, waits until this transaction commits and then works from its result,
+    # so under READ COMMITTED no update is lost and no duplicate row is inserted
+    table = model.__table__
+    dialect = _upsert_dialect(session_db, model)
+    if dialect is mysql:
+        statement = mysql.insert(table).values(user_id=user_id, **{bucket_column: bucket})
+        session_db.execute(statement.on_duplicate_key_update(user_id=table.c.user_id))
+    elif dialect is not None:
+        statement = dialect.insert(table).values(user_id=user_id, **{bucket_column: bucket})
+        statement = statement.on_conflict_do_nothing(index_elements=[table.c.user_id, table.c[bucket_column]])
+        session_db.execute(statement)
+
+    rollup = session_db.query(model).filter(
+        model.user_id == user_id,
+        getattr(model, bucket_column) == bucket,
+    ).with_for_update().first()
+    aggregates = _aggregate(session_db, user_id, bucket, end)
+
+    entry_count = aggregates[0]
+    if not entry_count:
+        if rollup:
+            session_db.delete(rollup)
+        return
+
+    if not rollup:
+        rollup = model(user_id=user_id, **{bucket_column: bucket})
+        session_db.add(rollup)
+
+    rollup.entry_count = entry_count
+    for position, metric in enumerate(ROLLUP_METRICS):
+        total, minimum, maximum = aggregates[1 + position * 3:4 + position * 3]
+        setattr(rollup, f'{metric}_sum', total)
+        setattr(rollup, f'{metric}_min', minimum)
+        setattr(rollup, f'{metric}_max', maximum)
+
+
+def refresh_rollups(session_db, user_id: int, *dates: datetime):
+    """
+    Recompute the daily and weekly rollups affected by changes to tracker entries.
+
+    Only the buckets containing the given entry dates are recomputed, each with one index range scan,
+    so the cost does not grow with the size of the user's history. Each rollup row is created if missing and
+    locked while it is recomputed, so concurrent writers to a bucket are serialized. New entries are added with
+    the cheaper `add_to_rollups`. Pending changes are flushed first and the caller is responsible for committing.
+
+    Args:
+        session_db: The database session holding the tracker changes.
+        user_id (int): The owner of the changed entries.
+        *dates (datetime): The dates of the inserted, updated or deleted entries.
+    """
+    session_db.flush()
+
+    days = {entry_date.date() for entry_date in dates}
+    for day in sorted(days):
+        _refresh_bucket(session_db, DailyExerciseRollup, 'day', user_id, day, day + timedelta(days=1))
+
+    for week in sorted({week_start(day) for day in days}):
+        _refresh_bucket(session_db, WeeklyExerciseRollup, 'week_start', user_id, week, week + timedelta(days=7))
+
+
+def _accumulate(buckets: dict, key, values):
+    bucket = buckets.get(key)
+    if bucket is None:
+        buckets[key] = [1] + [value for value in values for _ in range(3)]
+        return
+    bucket[0] += 1
+    for position, value in enumerate(values):
+        offset = 1 + position * 3
+        bucket[offset] += value
+        bucket[offset + 1] = min(bucket[offset + 1], value)
+        bucket[offset + 2] = max(bucket[offset + 2], value)
+
+
+def _bucket_rows(buckets: dict, bucket_column: str) -> list:
+    rows = []
+    for (user_id, bucket), aggregates in buckets.items():
+        row = {'user_id': user_id, bucket_column: bucket, 'entry_count': aggregates[0]}
+        for position, metric in enumerate(ROLLUP_METRICS):
+            offset = 1 + position * 3
+            row[f'{metric}_sum'], row[f'{metric}_min'], row[f'{metric}_max'] = aggregates[offset:offset + 3]
+        rows.append(row)
+    return rows
+
+
+def _merged_values(table, new_value) -> dict:
+    """The SET clause adding new aggregates (`new_value(column name)`) to a rollup row's counts, sums and min/max."""
+    values = {'entry_count': table.c.entry_count + new_value('entry_count')}
+    for metric in ROLLUP_METRICS:
+        total, minimum, maximum = (table.c[f'{metric}_{part}'] for part in ('sum', 'min', 'max'))
+        new_minimum, new_maximum = new_value(f'{metric}_min'), new_value(f'{metric}_max')
+        values[f'{metric}_sum'] = total + new_value(f'{metric}_sum')
+        values[f'{metric}_min'] = case((minimum <= new_minimum, minimum), else_=new_minimum)
+        values[f'{metric}_max'] = case((maximum >= new_maximum, maximum), else_=new_maximum)
+    return values
+
+
+def add_to_rollups(session_db, entries) -> None:
+    """
+    Add newly inserted tracker entries to their daily and weekly rollups.
+
+    Inserts only raise counts and sums and widen min/max, so the entries are folded into their buckets in memory
+    and applied to the rollup rows with set-based statements (one per table on SQLite, PostgreSQL and MySQL,
+    whatever the number of entries) instead of re-aggregating the tracker rows of every bucket as
+    `refresh_rollups` does. Each bucket is upserted with its increments applied in SQL, so concurrent writers
+    neither lose each other's updates nor race to create the same bucket. The caller is responsible for
+    committing.
+
+    Args:
+        session_db: The database session the entries are inserted with.
+        entries (list): The new DailyExerciseTracker entries, or the dicts of column values they were inserted from.
+    """
+    daily, weekly = {}, {}
+    for entry in entries:
+        get = entry.__getitem__ if isinstance(entry, dict) else entry.__getattribute__
+        values = [get(metric) for metric in ROLLUP_METRICS]
+        day = get('date').date()
+        _accumulate(daily, (get('user_id'), day), values)
+        _accumulate(weekly, (get('user_id'), week_start(day)), values)
+
+    for model, bucket_column, buckets in ((DailyExerciseRollup, 'day', daily),
+                                          (WeeklyExerciseRollup, 'week_start', weekly)):
+        if not buckets:
+            continue
+        table = model.__table__
+        dialect = _upsert_dialect(session_db, model)
+        if dialect is mysql:
+            statement = mysql.insert(table)
+            statement = statement.on_duplicate_key_update(_merged_values(table, lambda name: statement.inserted[name]))
+            session_db.execute(statement, _bucket_rows(buckets, bucket_column))
+            continue
+        if dialect is not None:
+            statement = dialect.insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c[bucket_column]],
+                set_=_merged_values(table, lambda name: statement.excluded[name]),
+            )
+            session_db.execute(statement, _bucket_rows(buckets, bucket_column))
+            continue
+
+        # Other databases: update the existing buckets and insert the others
+        bucket = getattr(model, bucket_column)
+        existing = set(session_db.execute(
+            select(model.user_id, bucket).where(model.user_id.in_({user_id for user_id, _ in buckets}),
+                                                bucket.in_({day for _, day in buckets}))
+        ).all())
+
+        rows = _bucket_rows(buckets, bucket_column)
+        new_rows = [row for row in rows if (row['user_id'], row[bucket_column]) not in existing]
+        changed_rows = [{f'b_{name}': value for name, value in row.items()}
+                        for row in rows if (row['user_id'], row[bucket_column]) in existing]
+
+        if changed_rows:
+            # A Core UPDATE on the table (the ORM one would be a bulk update by primary key) executed through the
+            # session, so that it is routed to the shard of the rollup table like every other statement here
+            values = _merged_values(table, lambda name: bindparam(f'b_{name}'))
+            statement = update(table).where(table.c.user_id == bindparam('b_user_id'),
+                                            table.c[bucket_column] == bindparam(f'b_{bucket_column}')).values(values)
+            session_db.execute(statement, changed_rows)
+        if new_rows:
+            session_db.execute(insert(model), new_rows)
+
+
+def rebuild_rollups(session_db, user_id: int = None) -> int:
+    """
+    Rebuild the rollups from the raw tracker rows, e.g. to backfill an existing database.
+
+    The raw rows are streamed once and folded in memory per bucket, so memory grows with the number of
+    buckets rather than rows. The caller is responsible for committing.
+
+    Args:
+        session_db: The database session to use.
+        user_id (int, optional): Restrict the rebuild to one user; all users when omitted.
+
+    Returns:
+        int: The number of daily buckets rebuilt.
+    """
+    for model in (DailyExerciseRollup, WeeklyExerciseRollup):
+        query = session_db.query(model)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        query.delete(synchronize_session=False)
+
+    daily, weekly = {}, {}
+    for model in (DailyExerciseTracker, ArchivedExerciseTracker):
+        query = session_db.query(model.user_id, model.date, *[getattr(model, metric) for metric in ROLLUP_METRICS])
+        query = query.filter(model.is_active.is_(True))
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+
+        for owner_id, entry_date, *values in query.yield_per(10000):
+            day = entry_date.date()
+            _accumulate(daily, (owner_id, day), values)
+            _accumulate(weekly, (owner_id, week_start(day)), values)
+
+    if daily:
+        session_db.execute(insert(DailyExerciseRollup), _bucket_rows(daily, 'day'))
+        session_db.execute(insert(WeeklyExerciseRollup), _bucket_rows(weekly, 'week_start'))
+
+    logger.info(f"Rebuilt {len(daily)} daily and {len(weekly)} weekly rollups.")
+    return len(daily)
@@ -0,0 +1,314 @@
+import hashlib
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from log_config import setup_logging
+from models import create_db_engine
+
+load_dotenv()
+
+# `cookie` keeps Flask's signed-cookie sessions (checked against the JWT `token` cookie), `memory` stores sessions
+# per process (single worker deployments), `sqlite` shares them between workers through a local SQLite file
+SESSION_STORE = os.getenv("SESSION_STORE", "cookie").lower()
+SESSION_STORE_SIZE = int(os.getenv("SESSION_STORE_SIZE", 100000))
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH",
+                               os.path.join(tempfile.gettempdir(), "exercise-tracker-sessions.db"))
+# Sessions slide: their expiry is pushed back by PERMANENT_SESSION_LIFETIME on use, but at most once per this
+# many seconds so that reading a session does not turn every request into a write
+SESSION_STORE_TOUCH_SECONDS = int(os.getenv("SESSION_STORE_TOUCH_SECONDS", 60))
+# Expired sessions are deleted in batches by a short-lived background thread, at most once per interval
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", 60))
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", 1000))
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class MemorySessionStore:
+    """
+    An in-process store of sessions, ordered by their last write.
+
+    Every write sets the expiry to the same lifetime ahead, so the oldest writes are the first to expire:
+    sweeping only ever looks at the front, and the least recently written sessions are evicted beyond
+    `maxsize`.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, data: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (data, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sweep(self, now: float, limit: int) -> int:
+        removed = 0
+        with self._lock:
+            while removed < limit and self._entries:
+                _, (_, expires_at) = next(iter(self._entries.items()))
+                if expires_at > now:
+                    break
+                self._entries.popitem(last=False)
+                removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+session_table = Table(
+    'sessions', MetaData(),
+    Column('id', String(64), primary_key=True),
+    Column('data', Text, nullable=False),
+    Column('expires_at', Float, nullable=False, index=True),
+)
+
+
+class SQLiteSessionStore:
+    """
+    A store of sessions in a local SQLite file, shared by every worker process on the host.
+
+    Lookups go through the primary key; expired rows are skipped on read and deleted in batches through the
+    `expires_at` index.
+    """
+
+    def __init__(self, path: str):
+        self.hits = 0
+        self.misses = 0
+        self.engine = create_db_engine(f"sqlite:///{path}")
+        session_table.metadata.create_all(self.engine)
+        # Return the connection, so a preloading server does not fork workers sharing it
+        self.engine.dispose()
+
+    def get(self, key: str):
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(session_table.c.data, session_table.c.expires_at).where(session_table.c.id == key)
+            ).first()
+        if row is None or row.expires_at <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row.data, row.expires_at
+
+    def set(self, key: str, data: str, expires_at: float):
+        statement = insert(session_table).values(id=key, data=data, expires_at=expires_at)
+        with self.engine.begin() as connection:
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[session_table.c.id],
+                set_={'data': statement.excluded.data, 'expires_at': statement.excluded.expires_at},
+            ))
+
+    def delete(self, key: str):
+        with self.engine.begin() as connection:
+            connection.execute(delete(session_table).where(session_table.c.id == key))
+
+    def sweep(self, now: float, limit: int) -> int:
+        expired = select(session_table.c.id).where(session_table.c.expires_at <= now).limit(limit)
+        with self.engine.begin() as connection:
+            return connection.execute(delete(session_table).where(session_table.c.id.in_(expired))).rowcount
+
+    def stats(self) -> dict:
+        with self.engine.connect() as connection:
+            size = connection.scalar(select(func.count()).select_from(session_table))
+        return {"size": size, "maxsize": 0, "hits": self.hits, "misses": self.misses}
+
+
+def _create_store():
+    if SESSION_STORE == "sqlite":
+        return SQLiteSessionStore(SESSION_STORE_PATH)
+    if SESSION_STORE == "memory":
+        return MemorySessionStore(SESSION_STORE_SIZE)
+    return None
+
+
+session_store = _create_store()
+
+
+class ServerSideSession(SecureCookieSession):
+    """
+    A session whose data lives in the session store; the cookie only carries its random id.
+
+    Args:
+        initial (dict, optional): The stored session data.
+        sid (str, optional): The session id, None until the session is first saved.
+        expires_at (float, optional): When the stored session expires, as a `time.time()` timestamp.
+    """
+
+    def __init__(self, initial=None, sid: str = None, expires_at: float = None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.revoked = []
+
+    def rotate(self):
+        """Revoke the current session id and issue a new one on save, keeping the data."""
+        if self.sid is not None:
+            self.revoked.append(self.sid)
+        self.sid = None
+        self.modified = True
+
+
+def _store_key(sid: str) -> str:
+    # Only a hash of the id is stored, so the store's contents cannot be replayed as cookies
+    return hashlib.sha256(sid.encode('utf-8')).hexdigest()
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Load and save sessions from a session store, with one lookup per request.
+
+    A session expires PERMANENT_SESSION_LIFETIME after its last use (sliding expiry), is written back when it
+    changes or at most every `touch_seconds` otherwise, and is deleted from the store once emptied or rotated,
+    which revokes its id for good.
+
+    Args:
+        store: The session store.
+        touch_seconds (float): Least time between two writes that only extend a session's expiry.
+        sweep_interval (float): Least time between two sweeps of expired sessions.
+        sweep_batch_size (int): Expired sessions deleted per sweep transaction.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, touch_seconds: float = SESSION_STORE_TOUCH_SECONDS,
+                 sweep_interval: float = SESSION_SWEEP_INTERVAL_SECONDS,
+                 sweep_batch_size: int = SESSION_SWEEP_BATCH_SIZE):
+        self.store = store
+        self.touch_seconds = touch_seconds
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._next_sweep = 0
+        self._sweeping = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.get(_store_key(sid))
+            if entry is not None:
+                data, expires_at = entry
+                try:
+                    return ServerSideSession(self.serializer.loads(data), sid=sid, expires_at=expires_at)
+                except ValueError:
+                    logger.error("Discarded an unreadable stored session.")
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+        for sid in session.revoked:
+            self.store.delete(_store_key(sid))
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(_store_key(session.sid))
+            if session.sid is not None or session.revoked:
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, partitioned=partitioned,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        touch_due = (app.config["SESSION_REFRESH_EACH_REQUEST"] and session.expires_at is not None
+                     and now - (session.expires_at - lifetime) >= self.touch_seconds)
+        if session.sid is not None and not session.modified and not touch_due:
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires_at = now + lifetime
+        self.store.set(_store_key(session.sid), self.serializer.dumps(dict(session)), session.expires_at)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                            domain=domain, path=path, secure=secure, partitioned=partitioned, samesite=samesite)
+        response.vary.add("Cookie")
+        self._sweep_if_due(now)
+
+    def _sweep_if_due(self, now: float):
+        if now < self._next_sweep or not self._sweeping.acquire(blocking=False):
+            return
+        self._next_sweep = now + self.sweep_interval
+        threading.Thread(target=self._sweep, args=(now,), name="session-sweeper", daemon=True).start()
+
+    def _sweep(self, now: float):
+        removed = 0
+        try:
+            # One short transaction per batch, so request threads are never locked out for the whole sweep
+            while True:
+                batch = self.store.sweep(now, self.sweep_batch_size)
+                removed += batch
+                if batch < self.sweep_batch_size:
+                    break
+        except Exception as e:
+            logger.error(f"Sweeping expired sessions failed: {str(e)}")
+        finally:
+            self._sweeping.release()
+        if removed:
+            logger.info(f"Swept {removed} expired sessions.")
+
+
+def init_session_store(app):
+    """
+    Serve the app's sessions from the session store selected by SESSION_STORE, if any.
+
+    Args:
+        app (Flask): The application to configure.
+    """
+    if session_store is not None:
+        app.session_interface = ServerSideSessionInterface(session_store)
+
+
+def rotate_session():
+    """Give the current session a new id and revoke the old one, e.g. on login and logout; a no-op for cookies."""
+    rotate = getattr(session, 'rotate', None)
+    if rotate is not None:
+        rotate()
+
+
+def session_store_stats() -> dict:
+    """Get the size and hit/miss counters of the session store."""
+    if session_store is None:
+        return {"size": 0, "maxsize": 0, "hits": 0, "misses": 0}
+    return session_store.stats()
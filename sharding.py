@@ -0,0 +1,105 @@
+import logging
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select
+
+from log_config import setup_logging
+from models import DailyExerciseTracker, ArchivedExerciseTracker, DailyExerciseRollup, WeeklyExerciseRollup, \
+    create_db_engine, engine, shard_engines, shard_for_user
+from response_cache import bump_data_version
+
+load_dotenv()
+
+# Rows copied per executemany while moving a user to another shard
+REBALANCE_BATCH_SIZE = int(os.getenv("REBALANCE_BATCH_SIZE", 5000))
+
+# Models whose rows belong to one user and move with them
+SHARDED_MODELS = (DailyExerciseTracker, ArchivedExerciseTracker, DailyExerciseRollup, WeeklyExerciseRollup)
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def _stored_user_ids(db_engine) -> set:
+    """The ids of every user with rows in any per-user table of a database."""
+    user_ids = set()
+    with db_engine.connect() as connection:
+        for model in SHARDED_MODELS:
+            user_ids.update(connection.scalars(select(model.user_id).distinct()))
+    return user_ids
+
+
+def _move_user(user_id: int, source_engine, target_engine, batch_size: int) -> int:
+    """
+    Copy every per-user row of a user to the target database, then delete them from the source.
+
+    Rows get new ids on the target, since ids are only unique within a shard. The copy is committed before
+    the source rows are deleted, and rows a previous, interrupted run left on the target are dropped first,
+    so a failed move can simply be run again.
+
+    Returns:
+        int: The number of rows moved.
+    """
+    moved = 0
+    with source_engine.connect() as source, target_engine.begin() as target:
+        for model in SHARDED_MODELS:
+            table = model.__table__
+            target.execute(delete(table).where(table.c.user_id == user_id))
+
+            columns = [column for column in table.columns if column.name != 'id']
+            result = source.execution_options(yield_per=batch_size).execute(
+                select(*columns).where(table.c.user_id == user_id)
+            )
+            for partition in result.partitions():
+                target.execute(insert(table), [dict(row._mapping) for row in partition])
+                moved += len(partition)
+
+    with source_engine.begin() as source:
+        for model in SHARDED_MODELS:
+            source.execute(delete(model.__table__).where(model.__table__.c.user_id == user_id))
+
+    bump_data_version(user_id)
+    return moved
+
+
+def rebalance_shards(drain_urls=(), batch_size: int = REBALANCE_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """
+    Move every user whose rows are not on the shard the hash ring assigns them to.
+
+    Run it after changing SHARD_DATABASE_URLS, with the application stopped: until a user is moved their
+    rows are not where the application looks for them. The primary database is drained too when it is not
+    one of the shards (e.g. when sharding an existing database), and databases removed from
+    SHARD_DATABASE_URLS are passed as `drain_urls` so their users are moved out as well.
+
+    Args:
+        drain_urls (optional): URLs of former shards to empty.
+        batch_size (int, optional): Rows copied per executemany. Defaults to REBALANCE_BATCH_SIZE.
+        dry_run (bool, optional): Only report the moves. Defaults to False.
+
+    Returns:
+        dict: The ``moves`` as (user_id, source, target) tuples, with targets named by shard index and sources
+        by shard index, ``primary`` or drained URL, and the number of ``rows`` moved.
+    """
+    sources = [(shard, shard_engine) for shard, shard_engine in enumerate(shard_engines)]
+    if not any(shard_engine is engine for shard_engine in shard_engines):
+        sources.append(('primary', engine))
+    drained = [(url, create_db_engine(url)) for url in drain_urls]
+    sources += drained
+
+    moves, rows = [], 0
+    for source, source_engine in sources:
+        for user_id in sorted(_stored_user_ids(source_engine)):
+            target = shard_for_user(user_id)
+            if shard_engines[target] is source_engine:
+                continue
+
+            moves.append((user_id, source, target))
+            if not dry_run:
+                moved = _move_user(user_id, source_engine, shard_engines[target], batch_size)
+                rows += moved
+                logger.info(f"Moved {moved} rows of user {user_id} from shard {source} to shard {target}.")
+
+    for _, drained_engine in drained:
+        drained_engine.dispose()
+    return {'moves': moves, 'rows': rows}
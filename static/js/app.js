@@ -20,3 +20,100 @@ function toggle_password() {
   }
 
 }
+
+
+// Chart series labels, and the factor each metric's values are divided by for display
+const SERIES_NAMES = {
+  steps_taken: 'Steps Taken (in 1000 steps)',
+  distance: 'Distance Covered (in km)',
+  calories_burned: 'Calories Burned (in kcal)',
+  avg_heart_rate: 'Average Heart Rate (in bpm)',
+  min_heart_rate: 'Min Heart Rate (in bpm)',
+  max_heart_rate: 'Max Heart Rate (in bpm)',
+  exercise_duration: 'Exercise Duration (in minutes)'
+};
+const SERIES_SCALE = {
+  steps_taken: 1000
+};
+
+
+function decode_points(metric, series, delta) {
+
+  // Timestamps are server-local wall clock times encoded as if they were UTC
+  const scale = SERIES_SCALE[metric] || 1;
+  const points = [];
+  let time = 0;
+
+  for (let i = 0; i < series.t.length; i++) {
+
+    time = delta ? time + series.t[i] : series.t[i];
+    const day = new Date(time);
+    points.push({
+      x: new Date(day.getUTCFullYear(), day.getUTCMonth(), day.getUTCDate(), day.getUTCHours(), day.getUTCMinutes()),
+      y: Math.round(series.v[i] / scale * 100) / 100
+    });
+
+  }
+
+  return points;
+
+}
+
+
+function toggle_data_series(e) {
+
+  e.dataSeries.visible = typeof (e.dataSeries.visible) !== 'undefined' && !e.dataSeries.visible;
+  e.chart.render();
+
+}
+
+
+function render_chart(container) {
+
+  fetch(container.dataset.chartUrl, {credentials: 'same-origin'})
+    .then(function (response) {
+
+      if (!response.ok) {
+        throw new Error('Chart data request failed with ' + response.status);
+      }
+      return response.json();
+
+    })
+    .then(function (payload) {
+
+      const data = Object.keys(payload.series).map(function (metric) {
+        return {
+          type: 'line',
+          name: SERIES_NAMES[metric] || metric,
+          showInLegend: true,
+          dataPoints: decode_points(metric, payload.series[metric], payload.delta)
+        };
+      });
+
+      const chart = new CanvasJS.Chart(container, {
+        animationEnabled: true,
+        title: {text: 'Exercise Data Report'},
+        axisX: {title: 'Date', valueFormatString: payload.bucket === 'hour' ? 'YYYY-MM-DD HH:mm' : 'YYYY-MM-DD'},
+        axisY: {title: 'Values', includeZero: true},
+        toolTip: {shared: true},
+        legend: {cursor: 'pointer', itemclick: toggle_data_series},
+        data: data
+      });
+      chart.render();
+
+    })
+    .catch(function (error) {
+
+      container.textContent = 'The chart could not be loaded.';
+      console.error(error);
+
+    });
+
+}
+
+
+window.addEventListener('load', function () {
+
+  document.querySelectorAll('[data-chart-url]').forEach(render_chart);
+
+});
@@ -0,0 +1,110 @@
+"""
+Shared fixtures of the in-process tests.
+
+Settings are read when the modules are imported, so the environment is set here, before any module of the app is
+imported: the tests share a throwaway SQLite database and isolate themselves by working on users of their own.
+Scenarios needing other settings (e.g. shards) run in a fresh interpreter, see test_sharding.py.
+"""
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+from flask.testing import FlaskClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_DIR = tempfile.mkdtemp(prefix="exercise-tracker-tests-")
+
+os.environ.update({
+    "SQLALCHEMY_DATABASE_URL": f"sqlite:///{os.path.join(DATABASE_DIR, 'tracker.db')}",
+    "SHARD_DATABASE_URLS": "",
+    "RESPONSE_CACHE_BACKEND": "memory",
+    "SESSION_STORE": "cookie",
+    "WRITE_QUEUE": "false",
+    "ARCHIVE_INTERVAL_SECONDS": "0",
+    "LOG_QUEUE": "false",
+    "BCRYPT_ROUNDS": "4",
+    "SECRET_KEY": "exercise-tracker-test-secret-key-0123456789",
+})
+sys.path.insert(0, REPO_ROOT)
+
+TEST_PASSWORD = "test-password"
+
+_user_numbers = itertools.count(1)
+
+
+class SecureClient(FlaskClient):
+    """A test client talking HTTPS, so the `secure` token cookie set on login is sent back."""
+
+    def open(self, *args, **kwargs):
+        kwargs.setdefault("base_url", "https://localhost")
+        return super().open(*args, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from main_app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    app.test_client_class = SecureClient
+    return app
+
+
+@pytest.fixture
+def user(app):
+    """A new user, so every test starts without tracker data."""
+    from models import Session, User
+    from utils import hash_password
+
+    username = f"test-user-{next(_user_numbers)}"
+    with Session() as session_db:
+        user = User(username=username, fullname=username.replace('-', ' ').title(), email=f"{username}@example.com",
+                    password=hash_password(TEST_PASSWORD))
+        session_db.add(user)
+        session_db.commit()
+        session_db.refresh(user)
+        session_db.expunge(user)
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    """A test client logged in as `user`."""
+    client = app.test_client()
+    response = client.post("/login", data={"username_or_email": user.username, "password": TEST_PASSWORD})
+    assert response.status_code == 302 and "/dashboard" in response.headers["Location"]
+    return client
+
+
+def entry_values(user_id: int, entry_date: datetime, steps_taken: int = 1000, **values) -> dict:
+    """The column values of a tracker entry, with plausible defaults for every metric but the steps."""
+    row = {'user_id': user_id, 'date': entry_date, 'steps_taken': steps_taken, 'distance': 1.5,
+           'calories_burned': 100.0, 'max_heart_rate': 150, 'min_heart_rate': 60, 'exercise_duration': 30}
+    row.update(values)
+    row['avg_heart_rate'] = (row['max_heart_rate'] + row['min_heart_rate']) // 2
+    return row
+
+
+@pytest.fixture
+def add_entries(app):
+    """Insert tracker entries, hot or archived, and fold them into the rollups like the app's write paths do."""
+    from sqlalchemy import insert
+
+    from models import ArchivedExerciseTracker, DailyExerciseTracker, Session
+    from response_cache import bump_data_version
+    from rollup import add_to_rollups
+
+    def add(user_id: int, rows: list, archived: bool = False):
+        with Session(user_id=user_id) as session_db:
+            if archived:
+                session_db.execute(insert(ArchivedExerciseTracker), [dict(row, is_active=True) for row in rows])
+            else:
+                session_db.execute(insert(DailyExerciseTracker), rows)
+            add_to_rollups(session_db, rows)
+            session_db.commit()
+        bump_data_version(user_id)
+
+    return add
@@ -0,0 +1,90 @@
+"""Insights: the vectorized trends, streaks, records and percentiles, and their memoization."""
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from conftest import entry_values
+
+
+def synthetic_arrays(days: list, **values) -> dict:
+    """Column arrays like `load_columns` returns, with every metric but those given set to 1."""
+    from rollup import ROLLUP_METRICS
+
+    arrays = {'day': np.array(days, dtype='datetime64[D]')}
+    for metric in ROLLUP_METRICS:
+        arrays[metric] = np.array(values.get(metric, [1.0] * len(days)), dtype=np.float64)
+    return arrays
+
+
+@pytest.mark.parametrize("window", [1, 3, 7, 50])
+def test_rolling_mean_matches_a_naive_trailing_mean(window):
+    from analytics import rolling_mean
+
+    values = np.random.default_rng(7).uniform(0, 1000, 40)
+    naive = [values[max(index - window + 1, 0):index + 1].mean() for index in range(len(values))]
+
+    np.testing.assert_allclose(rolling_mean(values, window), naive)
+
+
+# The current streak survives a day without entries yet, but not a whole missed day
+@pytest.mark.parametrize("today, current", [("2024-03-11", 2), ("2024-03-12", 2), ("2024-03-13", 0)])
+def test_streaks_count_consecutive_active_days(today, current):
+    from analytics import _streaks
+
+    active_days = np.array(["2024-03-01", "2024-03-02", "2024-03-04", "2024-03-05", "2024-03-06", "2024-03-07",
+                            "2024-03-08", "2024-03-10", "2024-03-11"], dtype='datetime64[D]')
+
+    assert _streaks(active_days, np.datetime64(today)) == {'current': current, 'longest': 5}
+
+
+def test_compute_insights():
+    from analytics import ANALYTICS_PERCENTILES, compute_insights
+
+    # Monday 2024-03-04 starts the first week; two entries on one day, a rest day, then the next week
+    days = ["2024-03-04", "2024-03-04", "2024-03-05", "2024-03-07", "2024-03-11", "2024-03-12"]
+    steps = [1000.0, 500.0, 3000.0, 2000.0, 9000.0, 1000.0]
+    insights = compute_insights(synthetic_arrays(days, steps_taken=steps), date(2024, 3, 13))
+
+    assert insights['summary'] == {'entry_count': 6, 'active_days': 5, 'first_day': '2024-03-04',
+                                   'last_day': '2024-03-12'}
+    assert insights['streaks'] == {'current': 2, 'longest': 2}
+    assert insights['personal_bests']['steps_taken'] == {
+        'entry': {'value': 9000.0, 'day': '2024-03-11'},
+        'day': {'value': 9000.0, 'day': '2024-03-11'},
+        'week': {'value': 10000.0, 'week_start': '2024-03-11'},
+    }
+    assert insights['personal_bests']['distance']['day'] == {'value': 2.0, 'day': '2024-03-04'}
+
+    assert [week['week_start'] for week in insights['weeks']] == ['2024-03-04', '2024-03-11']
+    first_week, second_week = insights['weeks']
+    assert first_week['totals']['steps_taken'] == 6500.0 and first_week['changes']['steps_taken'] is None
+    assert second_week['deltas']['steps_taken'] == 3500.0
+    assert second_week['changes']['steps_taken'] == round(3500 / 6500, 4)
+
+    # The last 7 days run from 2024-03-07 to 2024-03-13, rest days counting as zero
+    assert insights['rolling_averages']['steps_taken']['7d'] == round(12000 / 7, 2)
+    assert insights['rolling_averages']['steps_taken']['30d'] == round(16500 / 10, 2)
+    assert insights['percentiles']['steps_taken'] == {
+        f'p{percentile}': round(float(value), 2)
+        for percentile, value in zip(ANALYTICS_PERCENTILES, np.percentile(steps, ANALYTICS_PERCENTILES))
+    }
+
+
+def test_insights_are_memoized_until_the_data_changes(user, add_entries):
+    import analytics
+    from models import Session
+    from response_cache import bump_data_version
+
+    add_entries(user.id, [entry_values(user.id, datetime(2024, 3, 10, 8), steps_taken=4000)])
+    with Session(user_id=user.id) as session_db:
+        first = analytics.get_insights(session_db, user.id, date(2024, 3, 10))
+        assert analytics.get_insights(session_db, user.id, date(2024, 3, 10)) is first
+        assert analytics.get_insights(session_db, user.id, date(2024, 3, 11)) is not first
+
+        add_entries(user.id, [entry_values(user.id, datetime(2024, 3, 10, 18), steps_taken=6000)])
+        changed = analytics.get_insights(session_db, user.id, date(2024, 3, 10))
+        assert changed is not first and changed['summary']['entry_count'] == 2
+
+        bump_data_version(user.id)
+        assert analytics.get_insights(session_db, user.id, date(2024, 3, 10)) is not changed
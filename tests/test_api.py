@@ -0,0 +1,92 @@
+"""The JSON exercise API: keyset pagination over hot and archived entries, and its date bounds."""
+import base64
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from conftest import entry_values
+
+
+def fetch_all_pages(client, **query) -> list:
+    entries, cursor = [], None
+    while True:
+        response = client.get("/api/exercises", query_string=dict(query, **({'cursor': cursor} if cursor else {})))
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        entries += page['data']
+        cursor = page['next_cursor']
+        if not cursor:
+            return entries
+
+
+@pytest.mark.parametrize("archived", [False, True])
+def test_cursor_round_trip(archived):
+    from tracker_route import _decode_cursor, _encode_cursor
+
+    entry_date = datetime(2024, 3, 10, 8, 30, 15, 123456)
+    assert _decode_cursor(_encode_cursor(entry_date, archived, 42)) == (entry_date, archived, 42)
+
+
+def test_legacy_cursor_points_at_a_hot_entry():
+    from tracker_route import _decode_cursor
+
+    legacy = base64.urlsafe_b64encode(b"2024-03-10T08:30:00|42").decode('ascii')
+    assert _decode_cursor(legacy) == (datetime(2024, 3, 10, 8, 30), False, 42)
+
+
+@pytest.mark.parametrize("cursor", ["zzz", base64.urlsafe_b64encode(b"2024-03-10").decode('ascii'),
+                                    base64.urlsafe_b64encode(b"yesterday|1|0").decode('ascii')])
+def test_invalid_cursor_is_a_bad_request(client, cursor):
+    from tracker_route import _decode_cursor
+
+    with pytest.raises(ValueError, match="Invalid cursor."):
+        _decode_cursor(cursor)
+    response = client.get("/api/exercises", query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor."}
+
+
+def test_pages_interleave_hot_and_archived_entries_on_the_same_date(client, user, add_entries):
+    from models import Session
+    from user_route import load_dashboard
+
+    same_time = datetime(2024, 3, 10, 8)
+    add_entries(user.id, [entry_values(user.id, same_time, steps_taken=steps) for steps in (1, 2)])
+    add_entries(user.id, [entry_values(user.id, same_time, steps_taken=steps) for steps in (3, 4)], archived=True)
+    add_entries(user.id, [entry_values(user.id, same_time - timedelta(days=1), steps_taken=5)])
+    add_entries(user.id, [entry_values(user.id, same_time + timedelta(hours=1), steps_taken=6)], archived=True)
+
+    everything = fetch_all_pages(client, limit=1000)
+    # Newest first; on the same date archived entries come first, then the highest ids
+    assert [entry['steps_taken'] for entry in everything] == [6, 4, 3, 2, 1, 5]
+    assert [entry['archived'] for entry in everything] == [True, True, True, False, False, False]
+
+    for limit in (1, 2, 3):
+        assert fetch_all_pages(client, limit=limit) == everything
+
+    # A cursor landing on either kind of entry resumes right after it
+    for position, entry in enumerate(everything[:-1]):
+        page = client.get("/api/exercises", query_string={'limit': position + 1}).get_json()
+        assert page['data'][-1] == entry
+        assert fetch_all_pages(client, limit=1000, cursor=page['next_cursor']) == everything[position + 1:]
+
+    # The dashboard lists the same entries in the same order
+    with Session() as session_db:
+        dashboard = load_dashboard(session_db, user.id, {'start': date(2024, 3, 9), 'end': date(2024, 3, 10)})
+    assert [(row.id, row.archived) for row in dashboard['user_exercises']] == \
+           [(entry['id'], entry['archived']) for entry in everything]
+
+
+def test_date_only_end_includes_that_whole_day(client, user, add_entries):
+    dates = [datetime(2024, 3, 9, 12), datetime(2024, 3, 10), datetime(2024, 3, 10, 23, 59, 59, 999999),
+             datetime(2024, 3, 11)]
+    add_entries(user.id, [entry_values(user.id, entry_date) for entry_date in dates])
+
+    def listed(**query):
+        return [entry['date'] for entry in fetch_all_pages(client, **query)]
+
+    assert listed(start="2024-03-10", end="2024-03-10") == ["2024-03-10T23:59:59.999999", "2024-03-10T00:00:00"]
+    assert listed(end="2024-03-10") == ["2024-03-10T23:59:59.999999", "2024-03-10T00:00:00", "2024-03-09T12:00:00"]
+    # A datetime `end` is inclusive of that instant only
+    assert listed(end="2024-03-10T00:00:00") == ["2024-03-10T00:00:00", "2024-03-09T12:00:00"]
+    assert listed(start="2024-03-11", end="2024-03-11", limit=1) == ["2024-03-11T00:00:00"]
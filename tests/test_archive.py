@@ -0,0 +1,91 @@
+"""Archiving moves entries to the cold table without changing anything the user sees."""
+from datetime import date, datetime
+
+from sqlalchemy import event, insert, text
+
+from conftest import entry_values
+from test_api import fetch_all_pages
+
+# Far enough in the past that archiving as of NOW leaves the entries of every other test alone
+NOW = datetime(1993, 1, 1)
+ROLLUP_IGNORED_COLUMNS = ('id', 'updated_at')
+
+
+def snapshot(session_db, client, user_id: int) -> dict:
+    """Everything derived from a user's entries: listings, reports and rollups, minus table-specific ids."""
+    from models import DailyExerciseRollup, WeeklyExerciseRollup
+    from reports import build_report
+    from user_route import load_dashboard
+
+    listing = [{key: value for key, value in entry.items() if key not in ('id', 'archived')}
+               for entry in fetch_all_pages(client, limit=3)]
+    dashboard = [{key: value for key, value in row._asdict().items() if key not in ('id', 'archived')}
+                 for row in load_dashboard(session_db, user_id, {'start': date(1990, 1, 1),
+                                                                 'end': date(1992, 12, 31)})['user_exercises']]
+    reports = {bucket: build_report(session_db, user_id, date(1990, 1, 1), date(1992, 12, 31), bucket)
+               for bucket in ('hour', 'day', 'week', 'month')}
+    rollups = {
+        model.__tablename__: [
+            {column.name: getattr(row, column.name) for column in model.__table__.columns
+             if column.name not in ROLLUP_IGNORED_COLUMNS}
+            for row in session_db.query(model).filter(model.user_id == user_id).order_by(model.id)
+        ]
+        for model in (DailyExerciseRollup, WeeklyExerciseRollup)
+    }
+    return {'listing': listing, 'dashboard': dashboard, 'reports': reports, 'rollups': rollups}
+
+
+def test_archiving_keeps_listings_reports_and_rollups(client, user, add_entries):
+    from archive import archive_entries
+    from models import DailyExerciseTracker, Session
+
+    # Old entries, one week straddling the archive cut-off (1991-01-02), and recent ones
+    add_entries(user.id, [entry_values(user.id, entry_date, steps_taken=steps) for steps, entry_date in enumerate([
+        datetime(1990, 6, 1, 8), datetime(1990, 6, 1, 8), datetime(1990, 6, 1, 18), datetime(1991, 1, 1, 9),
+        datetime(1991, 1, 3, 9), datetime(1992, 12, 20, 7), datetime(1992, 12, 20, 7),
+    ], start=100)])
+    # Soft-deleted entries, one deleted long enough ago to be archived
+    with Session(user_id=user.id) as session_db:
+        session_db.execute(insert(DailyExerciseTracker), [
+            dict(entry_values(user.id, datetime(1992, 12, 1, 8)), is_active=False, updated_at=datetime(1992, 11, 1)),
+            dict(entry_values(user.id, datetime(1992, 12, 15, 8)), is_active=False, updated_at=datetime(1992, 12, 25)),
+        ])
+        session_db.commit()
+
+    with Session(user_id=user.id) as session_db:
+        before = snapshot(session_db, client, user.id)
+        assert len(before['listing']) == 7
+
+        assert archive_entries(session_db, now=NOW, batch_size=2) == 5
+        assert archive_entries(session_db, now=NOW, batch_size=2) == 0
+
+        assert snapshot(session_db, client, user.id) == before
+        hot = session_db.execute(text("SELECT date, is_active FROM daily_exercise_tracker WHERE user_id = :user_id "
+                                      "ORDER BY date"), {'user_id': user.id}).all()
+        assert [(str(entry_date)[:10], bool(is_active)) for entry_date, is_active in hot] == [
+            ('1991-01-03', True), ('1992-12-15', False), ('1992-12-20', True), ('1992-12-20', True)]
+    assert [entry['archived'] for entry in fetch_all_pages(client)] == [False, False, False, True, True, True, True]
+
+
+def test_archive_batches_are_found_through_indexes(app):
+    from archive import archive_entries
+    from models import Session
+
+    statements = []
+    with Session() as session_db:
+        def record(connection, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().startswith("SELECT daily_exercise_tracker.id"):
+                statements.append((statement, parameters))
+
+        engine = session_db.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            archive_entries(session_db, now=NOW)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        statement, parameters = statements[0]
+        plan = " ".join(row[-1] for row in session_db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}",
+                                                                                 tuple(parameters)))
+    assert "SCAN daily_exercise_tracker" not in plan, plan
+    assert "ix_daily_exercise_tracker_date" in plan and "ix_daily_exercise_tracker_is_active_updated_at" in plan, plan
@@ -0,0 +1,120 @@
+"""Bulk import: incremental parsing, record validation and deduplication, through the route and the CLI."""
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import entry_values
+
+RECORDS = [
+    {"date": f"2024-01-0{day}T08:00:00", "steps_taken": 1000 + day, "distance": 2.5, "calories_burned": 120.5,
+     "max_heart_rate": 150, "min_heart_rate": 60, "exercise_duration": 30}
+    for day in range(1, 6)
+]
+
+
+def read_json(text: str, chunk_size: int = 64 * 1024) -> list:
+    from bulk_import import iter_json_records
+
+    return list(iter_json_records(io.BytesIO(text.encode('utf-8')), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_json_array_is_read_across_chunk_boundaries(chunk_size):
+    assert read_json(json.dumps(RECORDS, indent=2), chunk_size) == RECORDS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_json_lines_are_read_across_chunk_boundaries(chunk_size):
+    text = "\n".join(json.dumps(record) for record in RECORDS) + "\n"
+    assert read_json(text, chunk_size) == RECORDS
+
+
+def test_json_with_byte_order_mark_and_empty_array():
+    assert read_json("\ufeff" + json.dumps(RECORDS[:1])) == RECORDS[:1]
+    assert read_json(" [ ] ") == []
+    assert read_json("") == []
+
+
+@pytest.mark.parametrize("text", ['[{"date": "2024-01-01"}, {"date":', '{"date": "2024-01-01"} nope', '[1, 2'])
+def test_invalid_json_raises_value_error(text):
+    with pytest.raises(ValueError):
+        read_json(text, chunk_size=4)
+
+
+def test_parse_record_converts_a_valid_record():
+    from bulk_import import parse_record
+
+    record = dict(RECORDS[0], date="2024-01-01T08:00:00+02:00", steps_taken="1001", distance="2.5")
+    row = parse_record(record, 7)
+
+    assert row == {'user_id': 7, 'date': datetime(2024, 1, 1, 8), 'steps_taken': 1001, 'distance': 2.5,
+                   'calories_burned': 120.5, 'max_heart_rate': 150, 'min_heart_rate': 60, 'exercise_duration': 30,
+                   'avg_heart_rate': 105}
+
+
+@pytest.mark.parametrize("record, message", [
+    (["not", "an", "object"], "Record is not an object."),
+    (dict(RECORDS[0], steps_taken=None, distance=""), "Missing fields: steps_taken, distance."),
+    (dict(RECORDS[0], date="yesterday"), "Invalid value"),
+    (dict(RECORDS[0], steps_taken="many"), "Invalid value"),
+    (dict(RECORDS[0], calories_burned=-1), "Values must not be negative."),
+    (dict(RECORDS[0], min_heart_rate=160), "Min heart rate is above max heart rate."),
+])
+def test_parse_record_rejects_invalid_records(record, message):
+    from bulk_import import parse_record
+
+    with pytest.raises(ValueError, match=message):
+        parse_record(record, 7)
+
+
+def test_import_skips_dates_of_hot_archived_and_earlier_records(user, add_entries):
+    from bulk_import import import_records
+    from models import ArchivedExerciseTracker, Session
+
+    add_entries(user.id, [entry_values(user.id, datetime(2024, 1, 1, 8))])
+    add_entries(user.id, [entry_values(user.id, datetime(2024, 1, 2, 8))], archived=True)
+    # A soft-deleted archived entry does not block importing its date again
+    with Session(user_id=user.id) as session_db:
+        session_db.add(ArchivedExerciseTracker(is_active=False, **entry_values(user.id, datetime(2024, 1, 3, 8))))
+        session_db.commit()
+
+    records = RECORDS + [RECORDS[4], dict(RECORDS[0], steps_taken=-5)]
+    with Session(user_id=user.id) as session_db:
+        result = import_records(session_db, user.id, records, batch_size=2)
+
+    assert result == {'inserted': 3, 'duplicates': 3, 'invalid': 1,
+                      'errors': ["Record 7: Values must not be negative."]}
+
+
+def write_csv_with_oversized_field(path):
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(RECORDS[0].keys())
+        writer.writerow(["x" * (csv.field_size_limit() + 1)] + list(RECORDS[0].values())[1:])
+
+
+def test_route_reports_malformed_csv(client, tmp_path):
+    path = tmp_path / "broken.csv"
+    write_csv_with_oversized_field(path)
+
+    with open(path, "rb") as upload:
+        response = client.post("/import_exercise_tracker", data={"tracker_file": (upload, "broken.csv")},
+                               content_type="multipart/form-data", follow_redirects=True)
+
+    assert response.status_code == 200
+    assert response.request.path == "/import_exercise_tracker"
+    assert "Import failed: field larger than field limit" in response.get_data(as_text=True)
+
+
+def test_cli_reports_malformed_csv(app, user, tmp_path):
+    path = tmp_path / "broken.csv"
+    write_csv_with_oversized_field(path)
+
+    result = app.test_cli_runner().invoke(args=["import-exercises", user.username, str(path)])
+
+    assert result.exit_code == 1
+    assert "Import failed: field larger than field limit" in result.output
+    assert result.exception is None or isinstance(result.exception, SystemExit)
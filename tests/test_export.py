@@ -0,0 +1,62 @@
+"""Exports: the gzip CSV stream and the columnar binary format read back with `read_columnar`."""
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import entry_values
+
+
+@pytest.fixture
+def exported_entries(user, add_entries):
+    hot = [entry_values(user.id, datetime(2024, 3, day, 7, 30, 15, 250000), steps_taken=day * 100,
+                        distance=day + 0.25) for day in (2, 4, 6)]
+    archived = [entry_values(user.id, datetime(2024, 3, day, 18), steps_taken=day * 100, distance=day + 0.5)
+                for day in (1, 3)]
+    add_entries(user.id, hot)
+    add_entries(user.id, archived, archived=True)
+    return sorted(hot + archived, key=lambda entry: entry['date'])
+
+
+def test_columnar_export_round_trips(user, exported_entries):
+    from export import EPOCH, EXPORT_FIELDS, export_columnar, read_columnar
+    from models import Session
+
+    with Session(user_id=user.id) as session_db:
+        stream = io.BytesIO(b"".join(export_columnar(session_db, user.id, chunk_size=2)))
+
+    blocks = list(read_columnar(stream))
+    assert [len(block['id']) for block in blocks] == [2, 2, 1]
+    assert all(list(block) == [field for field, _ in EXPORT_FIELDS] for block in blocks)
+    assert stream.read() == b""
+
+    columns = {field: [value for block in blocks for value in block[field]] for field, _ in EXPORT_FIELDS}
+    assert columns['user_id'] == [user.id] * 5
+    assert columns['date'] == [(entry['date'] - EPOCH) // timedelta(milliseconds=1) for entry in exported_entries]
+    for field in ('steps_taken', 'distance', 'calories_burned', 'max_heart_rate', 'min_heart_rate', 'avg_heart_rate',
+                  'exercise_duration'):
+        assert columns[field] == [entry[field] for entry in exported_entries], field
+
+
+def test_read_columnar_rejects_other_files():
+    from export import read_columnar
+
+    with pytest.raises(ValueError, match="Not a columnar exercise export."):
+        next(read_columnar(io.BytesIO(b"id,user_id\n")))
+    with pytest.raises(ValueError, match="Unsupported columnar export version 9."):
+        next(read_columnar(io.BytesIO(b"EXTC\x09\x00")))
+
+
+def test_csv_export_is_one_gzip_file(user, exported_entries):
+    from export import EXPORT_FIELDS, export_csv_gzip
+    from models import Session
+
+    with Session(user_id=user.id) as session_db:
+        pieces = list(export_csv_gzip(session_db, user.id, chunk_size=2))
+
+    rows = list(csv.reader(io.StringIO(gzip.decompress(b"".join(pieces)).decode('utf-8'))))
+    assert rows[0] == [field for field, _ in EXPORT_FIELDS]
+    assert [row[2] for row in rows[1:]] == [entry['date'].isoformat() for entry in exported_entries]
+    assert [int(row[3]) for row in rows[1:]] == [entry['steps_taken'] for entry in exported_entries]
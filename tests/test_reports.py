@@ -0,0 +1,89 @@
+"""Report and dashboard pages, and the chart API they load their series from."""
+import re
+from datetime import datetime, timedelta
+from html import unescape
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from conftest import entry_values
+
+
+def hourly_points(values) -> list:
+    return [(datetime(2024, 3, 10) + timedelta(hours=hour), value) for hour, value in enumerate(values)]
+
+
+def chart_url(response) -> str:
+    match = re.search(r'data-chart-url="([^"]+)"', response.get_data(as_text=True))
+    assert match, "The page has no chart"
+    return unescape(match.group(1))
+
+
+@pytest.mark.parametrize("path", [
+    "/dashboard?range=30d&_method=POST&_external=1&_scheme=javascript&_anchor=x",
+    "/report/by_steps?range=30d&endpoint=x&action=all&_external=1&_scheme=javascript&_anchor=x",
+])
+def test_chart_url_ignores_stray_query_arguments(client, user, add_entries, path):
+    add_entries(user.id, [entry_values(user.id, datetime.now() - timedelta(days=1))])
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    url = urlsplit(chart_url(response))
+    assert not url.scheme and not url.netloc and not url.fragment
+    assert url.path == f"/api/chart/{'all' if path.startswith('/dashboard') else 'by_steps'}"
+    query = parse_qs(url.query)
+    assert set(query) == {'range', 'start', 'end', 'bucket', 'delta'}
+    assert query['range'] == ['30d']
+    assert client.get(chart_url(response)).status_code == 200
+
+
+@pytest.mark.parametrize("max_points", [0, 2, 5, 10])
+def test_downsample_keeps_short_series_and_tiny_limits_unchanged(max_points):
+    from reports import downsample
+
+    points = hourly_points([3, 1, 4, 1, 5])
+    assert downsample(points, max_points) == points
+
+
+def test_downsample_keeps_the_ends_and_peaks_in_time_order():
+    from reports import downsample
+
+    values = [10.0] * 100
+    values[37], values[71] = 500.0, -200.0
+    points = hourly_points(values)
+
+    sampled = downsample(points, 10)
+
+    assert len(sampled) == 10
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert points[37] in sampled and points[71] in sampled
+    assert [point[0] for point in sampled] == sorted({point[0] for point in sampled})
+    assert set(sampled) <= set(points)
+
+
+def test_chart_series_downsamples_every_metric():
+    from reports import chart_series
+
+    report = {'buckets': [{'date': point_date, 'steps_taken': value, 'distance': value / 10}
+                          for point_date, value in hourly_points(range(50))]}
+
+    series = chart_series(report, ('steps_taken', 'distance'), max_points=20)
+
+    assert set(series) == {'steps_taken', 'distance'}
+    assert all(len(points) == 20 for points in series.values())
+    assert series['steps_taken'][-1] == (datetime(2024, 3, 10) + timedelta(hours=49), 49)
+
+
+@pytest.mark.parametrize("delta, times", [
+    (False, [1710028800000, 1710032400000, 1710039600000]),
+    (True, [1710028800000, 3600000, 7200000]),
+])
+def test_encode_series_sends_epoch_milliseconds_and_rounded_values(delta, times):
+    from reports import encode_series
+
+    points = [(datetime(2024, 3, 10), 1.005), (datetime(2024, 3, 10, 1), 2.5), (datetime(2024, 3, 10, 3), 1 / 3)]
+
+    encoded = encode_series({'distance': points, 'steps_taken': []}, delta=delta)
+
+    assert encoded == {'distance': {'t': times, 'v': [round(1.005, 2), 2.5, 0.33]}, 'steps_taken': {'t': [], 'v': []}}
@@ -0,0 +1,121 @@
+"""The response cache: its backends, data versions and the ETag / 304 revalidation of cached pages."""
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import entry_values
+from test_tracker_route import FORM
+
+
+@pytest.fixture(params=["memory", "file"])
+def backend(request, tmp_path):
+    from response_cache import FileBackend, MemoryBackend
+
+    if request.param == "memory":
+        return MemoryBackend(max_bytes=100)
+    return FileBackend(str(tmp_path / "cache"), max_bytes=100)
+
+
+def test_bump_changes_only_that_users_version(backend):
+    first, other = backend.version(1), backend.version(2)
+
+    backend.bump(1)
+
+    assert backend.version(1) != first
+    assert backend.version(2) == other
+    bumped = backend.version(1)
+    backend.bump(1)
+    assert backend.version(1) not in (first, bumped)
+
+
+def test_pages_are_stored_within_the_size_limit(backend):
+    for key in "abc":
+        backend.set(key, key.encode("ascii") * 40)
+    backend.set("too-large", b"x" * 101)
+
+    assert backend.get("c") == b"c" * 40
+    assert backend.get("too-large") is None
+    assert backend.size <= backend.max_bytes
+    assert backend.hits == 1 and backend.misses == 1
+
+
+def test_memory_pages_are_evicted_least_recently_used_first():
+    from response_cache import MemoryBackend
+
+    backend = MemoryBackend(max_bytes=100)
+    backend.set("a", b"a" * 40)
+    backend.set("b", b"b" * 40)
+    assert backend.get("a") == b"a" * 40  # "b" is now the least recently used
+    backend.set("c", b"c" * 40)
+
+    assert backend.get("b") is None
+    assert backend.get("a") == b"a" * 40 and backend.get("c") == b"c" * 40
+    assert backend.size == 80
+
+
+def test_memory_versions_are_not_reused_after_a_reset():
+    from response_cache import MemoryBackend
+
+    backend = MemoryBackend(max_bytes=100)
+    before = backend.version(1)
+    backend.set("page", b"body")
+
+    # A restarted or forked process starts over with a new nonce instead of handing out old versions again
+    backend.reset()
+
+    assert backend.version(1) != before
+    assert backend.get("page") is None and backend.size == 0
+
+
+def test_file_versions_are_shared_between_backends_on_the_same_directory(tmp_path):
+    from response_cache import FileBackend
+
+    worker, other_worker = FileBackend(str(tmp_path), 100), FileBackend(str(tmp_path), 100)
+    worker.set("page", b"body")
+    worker.bump(1)
+
+    assert other_worker.version(1) == worker.version(1) != "0"
+    assert other_worker.get("page") == b"body"
+
+
+def test_dashboard_is_revalidated_until_the_data_changes(client):
+    first = client.get("/dashboard")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+
+    cached = client.get("/dashboard")
+    assert cached.status_code == 200 and cached.headers["ETag"] == etag and cached.data == first.data
+
+    not_modified = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not not_modified.data
+
+    # Adding an entry bumps the data version: the old ETag no longer matches and the page is rendered again
+    client.post("/add_exercise_tracker", data=FORM)
+    client.get("/dashboard")  # Shows and consumes the flash message; pages with flashes are never cached
+    changed = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert b"8000" in changed.data
+
+
+def test_chart_api_is_revalidated_and_gzipped(client, user, add_entries):
+    add_entries(user.id, [entry_values(user.id, datetime.now() - timedelta(days=1), steps_taken=1234)])
+
+    response = client.get("/api/chart/by_steps", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    payload = json.loads(gzip.decompress(response.data))
+    assert payload["series"]["steps_taken"]["v"] == [1234]
+
+    etag = response.headers["ETag"]
+    plain = client.get("/api/chart/by_steps")
+    assert plain.headers["ETag"] != etag and json.loads(plain.data) == payload
+
+    not_modified = client.get("/api/chart/by_steps", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    add_entries(user.id, [entry_values(user.id, datetime.now() - timedelta(days=1), steps_taken=766)])
+    changed = client.get("/api/chart/by_steps", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert json.loads(gzip.decompress(changed.data))["series"]["steps_taken"]["v"] == [1000]
@@ -0,0 +1,63 @@
+"""Rollups kept up to date by concurrent writers."""
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from conftest import entry_values
+
+
+def rollup_rows(session_db, user_id: int) -> dict:
+    from models import DailyExerciseRollup, WeeklyExerciseRollup
+
+    return {
+        model.__tablename__: [(row.entry_count, row.steps_taken_sum, row.steps_taken_min, row.steps_taken_max)
+                              for row in session_db.query(model).filter(model.user_id == user_id)]
+        for model in (DailyExerciseRollup, WeeklyExerciseRollup)
+    }
+
+
+def test_refresh_and_add_on_the_same_new_bucket(user, monkeypatch):
+    import rollup
+    from models import DailyExerciseTracker, Session
+
+    entry_date = datetime(2023, 3, 15, 8)
+    # An entry whose buckets have no rollup rows yet, e.g. written before the rollups were backfilled
+    with Session(user_id=user.id) as session_db:
+        session_db.execute(insert(DailyExerciseTracker), [entry_values(user.id, entry_date, steps_taken=100)])
+        session_db.commit()
+
+    errors = []
+
+    def add_entry():
+        try:
+            with Session(user_id=user.id) as session_db:
+                entry = DailyExerciseTracker(**entry_values(user.id, entry_date.replace(hour=9), steps_taken=50))
+                session_db.add(entry)
+                rollup.add_to_rollups(session_db, [entry])
+                session_db.commit()
+        except Exception as e:
+            errors.append(e)
+
+    # Run the adding writer while the refreshing one is between looking up the bucket and writing it
+    aggregate = rollup._aggregate
+    writer = threading.Thread(target=add_entry)
+
+    def aggregate_after_concurrent_add(*args):
+        if writer.ident is None:
+            writer.start()
+            writer.join(timeout=1)
+        return aggregate(*args)
+
+    monkeypatch.setattr(rollup, '_aggregate', aggregate_after_concurrent_add)
+    with Session(user_id=user.id) as session_db:
+        rollup.refresh_rollups(session_db, user.id, entry_date)
+        session_db.commit()
+    writer.join(timeout=10)
+
+    assert not writer.is_alive() and errors == []
+    with Session(user_id=user.id) as session_db:
+        assert rollup_rows(session_db, user.id) == {
+            'daily_exercise_rollup': [(2, 150, 50, 100)],
+            'weekly_exercise_rollup': [(2, 150, 50, 100)],
+        }
@@ -0,0 +1,304 @@
+"""
+Sharding: the per-user tables (entries, archived entries and rollups) must be read and written on their user's shard,
+whichever path touches them, and move with the user when the shards change.
+
+Settings are read when the modules are imported, so each scenario runs in a fresh interpreter.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WRITE_PATH_SCENARIO = textwrap.dedent("""
+    from datetime import datetime
+    from sqlalchemy import create_engine, text
+
+    from models import Session, User, DailyExerciseTracker, shard_for_user, SHARD_DATABASE_URLS
+    from write_queue import WriteQueue
+
+    with Session() as session_db:
+        users = [User(username=f"user{number}", fullname=f"User {number}", email=f"user{number}@example.com",
+                      password="x") for number in range(8)]
+        session_db.add_all(users)
+        session_db.commit()
+        user_ids = [user.id for user in users]
+
+    write_queue = WriteQueue(flush_ms=0)
+    day = datetime(2024, 5, 6, 8)
+    futures = []
+    for steps in (100, 50, 300):
+        for user_id in user_ids:
+            entry = DailyExerciseTracker(date=day, steps_taken=steps + user_id, distance=1, calories_burned=1,
+                                         max_heart_rate=150, min_heart_rate=60, avg_heart_rate=100,
+                                         exercise_duration=30, user_id=user_id)
+            futures.append(write_queue.submit(entry))
+        # One group per step value, so later groups update the rollups created by the first
+        for future in futures:
+            future.result(timeout=10)
+    write_queue.close()
+
+    for user_id in user_ids:
+        shard = create_engine(SHARD_DATABASE_URLS[shard_for_user(user_id)])
+        with shard.connect() as connection:
+            entries = connection.execute(text(
+                "SELECT count(*), sum(steps_taken) FROM daily_exercise_tracker WHERE user_id = :user_id"
+            ), {"user_id": user_id}).one()
+            for table in ("daily_exercise_rollup", "weekly_exercise_rollup"):
+                rollup = connection.execute(text(
+                    f"SELECT entry_count, steps_taken_sum, steps_taken_min, steps_taken_max FROM {table} "
+                    "WHERE user_id = :user_id"
+                ), {"user_id": user_id}).one()
+                assert tuple(rollup) == (3, 450 + 3 * user_id, 50 + user_id, 300 + user_id), (table, tuple(rollup))
+        assert tuple(entries) == (3, 450 + 3 * user_id), tuple(entries)
+    print("ok")
+""")
+
+
+# Helpers shared by the scenarios: users with a logged-in test client, and direct reads of a user's shard
+SCENARIO_HELPERS = textwrap.dedent("""
+    from flask.testing import FlaskClient
+    from sqlalchemy import create_engine, text
+
+    from models import Session, User, SHARD_DATABASE_URLS, shard_for_user
+
+    FORM = {"steps_taken": "1000", "distance": "2.5", "calories_burned": "100", "max_heart_rate": "150",
+            "min_heart_rate": "60", "exercise_duration": "30"}
+
+
+    class SecureClient(FlaskClient):
+        def open(self, *args, **kwargs):
+            kwargs.setdefault("base_url", "https://localhost")
+            return super().open(*args, **kwargs)
+
+
+    def create_users(count):
+        from utils import hash_password
+
+        password = hash_password("password")
+        with Session() as session_db:
+            users = [User(username=f"user{number}", fullname=f"User {number}", email=f"user{number}@example.com",
+                          password=password) for number in range(count)]
+            session_db.add_all(users)
+            session_db.commit()
+            return [user.id for user in users]
+
+
+    def login(user_id):
+        app.test_client_class = SecureClient
+        client = app.test_client()
+        response = client.post("/login", data={"username_or_email": f"user{user_id - 1}", "password": "password"})
+        assert "/dashboard" in response.headers["Location"], response.headers
+        return client
+
+
+    def shard_rows(url, statement, user_id):
+        shard = create_engine(url)
+        with shard.connect() as connection:
+            rows = connection.execute(text(statement), {"user_id": user_id}).all()
+        shard.dispose()
+        return rows
+
+
+    def user_rows(user_id, statement):
+        \"\"\"Run a statement on the user's shard, asserting that no other database holds rows of the user.\"\"\"
+        for number, url in enumerate(SHARD_DATABASE_URLS):
+            rows = shard_rows(url, statement, user_id)
+            if number != shard_for_user(user_id):
+                assert not any(any(row) for row in rows), (user_id, number, statement, rows)
+            else:
+                user_shard_rows = rows
+        return user_shard_rows
+""")
+
+ROUTED_READS_AND_WRITES_SCENARIO = textwrap.dedent("""
+    from sqlalchemy import inspect
+
+    from models import SHARDED_TABLES, shard_engines
+
+    # Users only exist on the primary, so the per-user tables of the shards must not reference them
+    for shard_engine in shard_engines:
+        for table in SHARDED_TABLES:
+            assert inspect(shard_engine).get_foreign_keys(table) == [], table
+
+    user_ids = create_users(6)
+    assert len({shard_for_user(user_id) for user_id in user_ids}) == 2, "Both shards should hold users"
+    clients = {user_id: login(user_id) for user_id in user_ids}
+    for user_id, client in clients.items():
+        for steps in (1000, 2000, 3000):
+            response = client.post("/add_exercise_tracker", data=dict(FORM, steps_taken=str(steps + user_id)))
+            assert "/dashboard" in response.headers["Location"], response.headers
+
+    for user_id, client in clients.items():
+        # Routed reads: each user lists their own entries only
+        entries = client.get("/api/exercises").get_json()["data"]
+        assert sorted(entry["steps_taken"] for entry in entries) == [1000 + user_id, 2000 + user_id, 3000 + user_id]
+        assert client.get("/dashboard").status_code == 200
+        assert client.get("/report/all").status_code == 200
+
+        # Routed update and delete, with the rollups following on the same shard
+        first, second = sorted(entries, key=lambda entry: entry["steps_taken"])[:2]
+        response = client.post(f"/update_exercise_tracker/{first['id']}", data=dict(FORM, steps_taken="5000"))
+        assert "/dashboard" in response.headers["Location"], response.headers
+        response = client.get(f"/delete_exercise_tracker/{second['id']}")
+        assert "/dashboard" in response.headers["Location"], response.headers
+
+        entries = client.get("/api/exercises").get_json()["data"]
+        assert sorted(entry["steps_taken"] for entry in entries) == [3000 + user_id, 5000]
+        assert user_rows(user_id, "SELECT count(*), sum(steps_taken) FROM daily_exercise_tracker "
+                                  "WHERE user_id = :user_id AND is_active") == [(2, 8000 + user_id)]
+        assert user_rows(user_id, "SELECT entry_count, steps_taken_sum FROM daily_exercise_rollup "
+                                  "WHERE user_id = :user_id") == [(2, 8000 + user_id)]
+    print("ok")
+""")
+
+ARCHIVER_SCENARIO = textwrap.dedent("""
+    from datetime import datetime, timedelta
+
+    from archive import archive_all_shards
+    from models import DailyExerciseTracker
+    from rollup import add_to_rollups
+
+    user_ids = create_users(6)
+    old = datetime.now() - timedelta(days=1000)
+    for user_id in user_ids:
+        with Session(user_id=user_id) as session_db:
+            entries = [DailyExerciseTracker(date=old + timedelta(days=day), steps_taken=100 * day + user_id,
+                                            distance=1, calories_burned=1, max_heart_rate=150, min_heart_rate=60,
+                                            avg_heart_rate=105, exercise_duration=30, user_id=user_id)
+                       for day in range(3)]
+            session_db.add_all(entries)
+            add_to_rollups(session_db, entries)
+            session_db.commit()
+
+    assert archive_all_shards() == 3 * len(user_ids)
+
+    for user_id in user_ids:
+        assert user_rows(user_id, "SELECT count(*) FROM daily_exercise_tracker WHERE user_id = :user_id") == [(0,)]
+        assert user_rows(user_id, "SELECT count(*), sum(steps_taken) FROM archived_exercise_tracker "
+                                  "WHERE user_id = :user_id") == [(3, 300 + 3 * user_id)]
+        entries = login(user_id).get("/api/exercises").get_json()["data"]
+        assert sorted(entry["steps_taken"] for entry in entries) == [user_id, 100 + user_id, 200 + user_id]
+        assert all(entry["archived"] for entry in entries)
+    print("ok")
+""")
+
+SEED_SCENARIO = textwrap.dedent("""
+    from datetime import datetime
+
+    from models import DailyExerciseTracker
+    from rollup import add_to_rollups
+
+    for user_id in create_users(12):
+        with Session(user_id=user_id) as session_db:
+            entry = DailyExerciseTracker(date=datetime(2024, 5, 6, 8), steps_taken=user_id, distance=1,
+                                         calories_burned=1, max_heart_rate=150, min_heart_rate=60,
+                                         avg_heart_rate=105, exercise_duration=30, user_id=user_id)
+            session_db.add(entry)
+            add_to_rollups(session_db, [entry])
+            session_db.commit()
+    print("ok")
+""")
+
+REBALANCE_SCENARIO = textwrap.dedent("""
+    import sys
+
+    from sharding import rebalance_shards
+
+    drain_urls = sys.argv[1:]
+    planned = rebalance_shards(drain_urls, dry_run=True)
+    result = rebalance_shards(drain_urls)
+    assert result["moves"] == planned["moves"] and result["moves"], result
+    # Every row of a user moves: the entry plus its daily and weekly rollup
+    assert result["rows"] == 3 * len(result["moves"]), result
+    assert rebalance_shards(drain_urls)["moves"] == [], "A second run has nothing left to move"
+
+    for user_id in range(1, 13):
+        assert user_rows(user_id, "SELECT count(*), sum(steps_taken) FROM daily_exercise_tracker "
+                                  "WHERE user_id = :user_id") == [(1, user_id)]
+        assert user_rows(user_id, "SELECT entry_count, steps_taken_sum FROM weekly_exercise_rollup "
+                                  "WHERE user_id = :user_id") == [(1, user_id)]
+    for url in drain_urls:
+        assert shard_rows(url, "SELECT count(*) FROM daily_exercise_tracker", None) == [(0,)]
+    print("ok")
+""")
+
+ROUTING_ERROR_SCENARIO = textwrap.dedent("""
+    from models import DailyExerciseTracker, ShardRoutingError
+
+    with Session() as session_db:
+        try:
+            session_db.query(DailyExerciseTracker.id).join(User, User.id == DailyExerciseTracker.user_id).all()
+        except ShardRoutingError as e:
+            assert "across shards" in str(e), str(e)
+        else:
+            raise AssertionError("A join of a shard table with a primary one was routed")
+
+        # Without a user to route to, a statement on a shard table is refused too
+        try:
+            session_db.query(DailyExerciseTracker).all()
+        except ShardRoutingError as e:
+            assert "No user or shard" in str(e), str(e)
+        else:
+            raise AssertionError("A statement without a user was routed")
+    print("ok")
+""")
+
+
+def run_scenario(tmp_path, scenario: str, shards: int = 2, args=()):
+    environment = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT,
+        SQLALCHEMY_DATABASE_URL=f"sqlite:///{tmp_path / 'primary.db'}",
+        SHARD_DATABASE_URLS=",".join(f"sqlite:///{tmp_path / f'shard{number}.db'}" for number in range(shards)),
+        RESPONSE_CACHE_BACKEND="none",
+        SESSION_STORE="cookie",
+        WRITE_QUEUE="false",
+        LOG_QUEUE="false",
+        BCRYPT_ROUNDS="4",
+    )
+    # Create the app first so the schema exists on every database
+    script = "import main_app\napp = main_app.create_app()\n" + SCENARIO_HELPERS + scenario
+    return subprocess.run([sys.executable, "-c", script, *args], cwd=tmp_path, env=environment, capture_output=True,
+                          text=True, timeout=120)
+
+
+def test_write_queue_updates_rollups_on_the_users_shard(tmp_path):
+    result = run_scenario(tmp_path, WRITE_PATH_SCENARIO)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+def test_reads_updates_and_deletes_are_routed_to_the_users_shard(tmp_path):
+    result = run_scenario(tmp_path, ROUTED_READS_AND_WRITES_SCENARIO)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+def test_archiver_archives_on_every_shard(tmp_path):
+    result = run_scenario(tmp_path, ARCHIVER_SCENARIO)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+def test_rebalance_moves_users_to_added_shards_and_out_of_drained_ones(tmp_path):
+    result = run_scenario(tmp_path, SEED_SCENARIO, shards=2)
+    assert result.returncode == 0, result.stderr
+
+    result = run_scenario(tmp_path, REBALANCE_SCENARIO, shards=3)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+    result = run_scenario(tmp_path, REBALANCE_SCENARIO, shards=2, args=[f"sqlite:///{tmp_path / 'shard2.db'}"])
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+
+def test_statements_mixing_primary_and_shard_tables_are_refused(tmp_path):
+    result = run_scenario(tmp_path, ROUTING_ERROR_SCENARIO)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
@@ -0,0 +1,65 @@
+"""Adding tracker entries, committed directly or through the write queue."""
+from concurrent.futures import Future
+
+import pytest
+
+FORM = {"steps_taken": "8000", "distance": "5.5", "calories_burned": "320", "max_heart_rate": "160",
+        "min_heart_rate": "65", "exercise_duration": "45"}
+
+
+class StalledWriteQueue:
+    """A write queue whose writer acknowledges submissions only when the test says so."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, entry) -> Future:
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def write_queue(monkeypatch):
+    import tracker_route
+
+    write_queue = StalledWriteQueue()
+    monkeypatch.setattr(tracker_route, 'get_write_queue', lambda: write_queue)
+    monkeypatch.setattr(tracker_route, 'WRITE_QUEUE_ACK', 'commit')
+    monkeypatch.setattr(tracker_route, 'WRITE_QUEUE_ACK_TIMEOUT_SECONDS', 0.05)
+
+    # Queued entries are written by the queue's writer, so the request must not open a session of its own
+    def no_session(*args, **kwargs):
+        raise AssertionError("The request opened a database session")
+
+    monkeypatch.setattr(tracker_route, 'Session', no_session)
+    return write_queue
+
+
+def test_add_commits_directly_without_a_write_queue(client):
+    response = client.post("/add_exercise_tracker", data=FORM)
+
+    assert response.status_code == 302 and response.headers["Location"].endswith("/dashboard")
+    entries = client.get("/api/exercises").get_json()["data"]
+    assert [entry["steps_taken"] for entry in entries] == [8000]
+
+
+def test_add_answers_503_when_the_commit_is_not_acknowledged_in_time(client, write_queue):
+    response = client.post("/add_exercise_tracker", data=FORM)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert "taking longer than usual, check the dashboard before retrying" in response.get_data(as_text=True)
+    assert len(write_queue.futures) == 1 and not write_queue.futures[0].done()
+
+
+def test_add_redirects_once_the_write_queue_commits(client, write_queue):
+    def submit_and_commit(entry):
+        future = Future()
+        future.set_result(None)
+        return future
+
+    write_queue.submit = submit_and_commit
+    response = client.post("/add_exercise_tracker", data=FORM)
+
+    assert response.status_code == 302 and response.headers["Location"].endswith("/dashboard")
@@ -1,109 +1,203 @@
+import base64
+import csv
+import gzip
+import json
 import logging
-from datetime import datetime, timedelta
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, date, timedelta
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session
+from flask import Blueprint, render_template, request, flash, redirect, url_for, g, jsonify, Response
+from sqlalchemy import and_, literal, or_, select, union_all
 
+from analytics import get_insights
+from bulk_import import iter_csv_records, iter_json_records, import_records
+from export import export_csv_gzip, export_columnar
+from leaderboard import LEADERBOARD_METRICS, LEADERBOARD_DEFAULT_SIZE, LEADERBOARD_MAX_SIZE, weekly_leaderboard, \
+    weekly_total
 from log_config import setup_logging
-from models import DailyExerciseTracker, User, Session
+from models import DailyExerciseTracker, ArchivedExerciseTracker, Session
+from reports import REPORT_ACTIONS, REPORT_RANGES, REPORT_BUCKETS, build_report, chart_series, encode_series, \
+    parse_report_window
+from response_cache import response_cache, cached_response, bump_data_version, page_cache_key, cached_page, store_page
+from rollup import add_to_rollups, refresh_rollups, week_start
 from utils import session_token_required
+from write_queue import WRITE_QUEUE_ACK, WRITE_QUEUE_ACK_TIMEOUT_SECONDS, WriteQueueFull, get_write_queue
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
 tracker_router = Blueprint('tracker', __name__)
 
+# Columns exposed by the JSON API; `id` and `date` are always returned since they form the pagination cursor
+API_FIELDS = ('id', 'date', 'steps_taken', 'distance', 'calories_burned', 'max_heart_rate', 'min_heart_rate',
+              'avg_heart_rate', 'exercise_duration')
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
+API_STREAM_BATCH_SIZE = 1000
+
+# Export formats: (generator, mimetype, download file name)
+EXPORT_FORMATS = {
+    'csv': (export_csv_gzip, 'application/gzip', 'exercise-tracker.csv.gz'),
+    'columnar': (export_columnar, 'application/octet-stream', 'exercise-tracker.extc'),
+}
+
 
 @tracker_router.route("/add_exercise_tracker", methods=['GET', 'POST'])
 @session_token_required
 def add_exercise_tracker():
-    username = session['user_name']
+    user = g.current_user
+
+    if request.method == "POST":
+        steps_taken = int(request.form['steps_taken'])
+        distance = float(request.form['distance'])
+        calories_burned = float(request.form['calories_burned'])
+        max_heart_rate = int(request.form['max_heart_rate'])
+        min_heart_rate = int(request.form['min_heart_rate'])
+        exercise_duration = int(request.form['exercise_duration'])
+
+        if not steps_taken or not distance or not calories_burned or not max_heart_rate or not min_heart_rate or not exercise_duration:
+            message = "All fields are required."
+            flash(message, "Error")
+            logger.error(message)
+            return redirect(url_for("tracker.add_tracker"))
+
+        user_id = user.id
+
+        new_exercise = DailyExerciseTracker(
+            date=datetime.now(),
+            steps_taken=steps_taken,
+            distance=distance,
+            calories_burned=calories_burned,
+            max_heart_rate=max_heart_rate,
+            min_heart_rate=min_heart_rate,
+            avg_heart_rate=(max_heart_rate + min_heart_rate) // 2,
+            exercise_duration=exercise_duration,
+            user_id=user_id
+        )
+
+        write_queue = get_write_queue()
+        if write_queue is not None:
+            # Committed with other submissions by the write queue's background writer
+            try:
+                future = write_queue.submit(new_exercise)
+            except WriteQueueFull as e:
+                message = str(e)
+                flash(message, "Error")
+                logger.error(message)
+                return redirect(url_for("tracker.add_exercise_tracker"))
+
+            if WRITE_QUEUE_ACK == 'commit':
+                try:
+                    error = future.exception(timeout=WRITE_QUEUE_ACK_TIMEOUT_SECONDS)
+                except FutureTimeoutError:
+                    # The entry stays queued and may still be saved, so the user is told to check first
+                    message = "Saving the tracker is taking longer than usual, check the dashboard before retrying."
+                    flash(message, "Error")
+                    logger.error(f"Write queue did not commit an entry of user {user_id} within "
+                                 f"{WRITE_QUEUE_ACK_TIMEOUT_SECONDS}s.")
+                    return render_template("add_tracker.html", user=user.fullname), 503, {"Retry-After": "5"}
+                if error is not None:
+                    message = "Failed to save the tracker, please try again."
+                    flash(message, "Error")
+                    logger.error(f"{message} {str(error)}")
+                    return redirect(url_for("tracker.add_exercise_tracker"))
+        else:
+            with Session() as session_db:
+                session_db.add(new_exercise)
+                add_to_rollups(session_db, [new_exercise])
+                session_db.commit()
+            bump_data_version(user_id)
+
+        message = "Tracker added successfully."
+        flash(message, "Success")
+        return redirect(url_for("user.dashboard"))
+
+    return render_template("add_tracker.html", user=user.fullname)
+
+
+@tracker_router.route("/import_exercise_tracker", methods=['GET', 'POST'])
+@session_token_required
+def import_exercise_tracker():
+    user = g.current_user
 
     with Session() as session_db:
-        user = session_db.query(User).filter_by(username=username).first()
 
         if request.method == "POST":
-            steps_taken = int(request.form['steps_taken'])
-            distance = float(request.form['distance'])
-            calories_burned = float(request.form['calories_burned'])
-            max_heart_rate = int(request.form['max_heart_rate'])
-            min_heart_rate = int(request.form['min_heart_rate'])
-            exercise_duration = int(request.form['exercise_duration'])
-
-            if not steps_taken or not distance or not calories_burned or not max_heart_rate or not min_heart_rate or not exercise_duration:
-                message = "All fields are required."
+            upload = request.files.get('tracker_file')
+            if not upload or not upload.filename:
+                message = "Please choose a file to import."
                 flash(message, "Error")
                 logger.error(message)
-                return redirect(url_for("tracker.add_tracker"))
-
-            user_id = user.id
-
-            new_exercise = DailyExerciseTracker(
-                date=datetime.now(),
-                steps_taken=steps_taken,
-                distance=distance,
-                calories_burned=calories_burned,
-                max_heart_rate=max_heart_rate,
-                min_heart_rate=min_heart_rate,
-                avg_heart_rate=(max_heart_rate + min_heart_rate) // 2,
-                exercise_duration=exercise_duration,
-                user_id=user_id
-            )
-
-            session_db.add(new_exercise)
-            session_db.commit()
-            session_db.close()
+                return redirect(url_for("tracker.import_exercise_tracker"))
+
+            if upload.filename.lower().endswith('.csv'):
+                records = iter_csv_records(upload.stream)
+            elif upload.filename.lower().endswith(('.json', '.jsonl', '.ndjson')):
+                records = iter_json_records(upload.stream)
+            else:
+                message = "Unsupported file type, please upload a CSV or JSON file."
+                flash(message, "Error")
+                logger.error(message)
+                return redirect(url_for("tracker.import_exercise_tracker"))
+
+            try:
+                result = import_records(session_db, user.id, records)
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                session_db.rollback()
+                bump_data_version(user.id)  # Batches committed before the failure are kept
+                message = f"Import failed: {str(e)}"
+                flash(message, "Error")
+                logger.error(message)
+                return redirect(url_for("tracker.import_exercise_tracker"))
 
-            message = "Tracker added successfully."
+            bump_data_version(user.id)
+            message = (f"Imported {result['inserted']} exercise entries, skipped {result['duplicates']} duplicates "
+                       f"and {result['invalid']} invalid records.")
             flash(message, "Success")
+            for error in result['errors']:
+                flash(error, "Error")
             return redirect(url_for("user.dashboard"))
 
-        return render_template("add_tracker.html", user=user.fullname)
+        return render_template("import_tracker.html", user=user.fullname)
 
 
 @tracker_router.route("/report/<action>")
 @session_token_required
+@cached_response
 def tracker_report(action):
-    if action not in ['by_steps', 'by_distance', 'by_calories', 'by_heart_rate', 'by_duration']:
+    if action not in REPORT_ACTIONS:
         flash("Invalid report action.", "Error")
         return redirect(url_for("user.dashboard"))
 
-    username = session['user_name']
-    today = datetime.now()
-    seven_days_ago = today - timedelta(days=7)
+    try:
+        window = parse_report_window(request.args, datetime.now().date())
+    except ValueError as e:
+        message = f"Invalid report window: {str(e)}"
+        flash(message, "Error")
+        logger.error(message)
+        return redirect(url_for("tracker.tracker_report", action=action))
 
+    user = g.current_user
     with Session() as session_db:
-        user = session_db.query(User).filter_by(username=username).first()
-
-        if action == 'by_steps':
-            tracker_data = session_db.query(DailyExerciseTracker.date, DailyExerciseTracker.steps_taken)
-        elif action == 'by_distance':
-            tracker_data = session_db.query(DailyExerciseTracker.date, DailyExerciseTracker.distance)
-        elif action == 'by_calories':
-            tracker_data = session_db.query(DailyExerciseTracker.date, DailyExerciseTracker.calories_burned)
-        elif action == 'by_heart_rate':
-            tracker_data = session_db.query(DailyExerciseTracker.date, DailyExerciseTracker.min_heart_rate,
-                                            DailyExerciseTracker.max_heart_rate, DailyExerciseTracker.avg_heart_rate)
-        elif action == 'by_duration':
-            tracker_data = session_db.query(DailyExerciseTracker.date, DailyExerciseTracker.exercise_duration)
-
-        tracker_data = tracker_data.filter(
-            DailyExerciseTracker.user_id == user.id,
-            DailyExerciseTracker.date >= seven_days_ago,
-            DailyExerciseTracker.date <= today,
-        ).all()
-    return render_template("tracker_report.html", action=action, tracker_data=tracker_data)
+        report = build_report(session_db, user.id, window['start'], window['end'], window['bucket'])
+    return render_report(action, window, report)
+
+
+def render_report(action: str, window: dict, report: dict) -> str:
+    """Render a report page from the result of `build_report`; its chart loads the series from `api_chart`."""
+    return render_template("tracker_report.html", action=action, metrics=REPORT_ACTIONS[action], report=report,
+                           window=window, ranges=REPORT_RANGES, buckets=REPORT_BUCKETS)
 
 
 @tracker_router.route("/update_exercise_tracker/<int:exercise_tracker_id>", methods=['GET', 'POST'])
 @session_token_required
 def update_exercise_tracker(exercise_tracker_id):
-    username = session['user_name']
+    user = g.current_user
 
     with Session() as session_db:
-        user = session_db.query(User).filter_by(username=username).first()
         exercise_to_update = session_db.query(DailyExerciseTracker).get(exercise_tracker_id)
 
-        if not exercise_to_update:
+        if not exercise_to_update or not exercise_to_update.is_active:
             message = f"Exercise with ID {exercise_tracker_id} not found."
             flash(message, "Error")
             logger.error(message)
@@ -140,7 +234,9 @@ def update_exercise_tracker(exercise_tracker_id):
             exercise_to_update.exercise_duration = exercise_duration
 
             session_db.add(exercise_to_update)
+            refresh_rollups(session_db, user_id, exercise_to_update.date)
             session_db.commit()
+            bump_data_version(user_id)
 
             message = "Exercise tracker updated successfully."
             flash(message, "Success")
@@ -154,13 +250,12 @@ def update_exercise_tracker(exercise_tracker_id):
 @tracker_router.route("/delete_exercise_tracker/<int:exercise_tracker_id>")
 @session_token_required
 def delete_exercise_tracker(exercise_tracker_id):
-    username = session['user_name']
+    user = g.current_user
 
     with Session() as session_db:
-        user = session_db.query(User).filter_by(username=username).first()
         exercise_to_delete = session_db.query(DailyExerciseTracker).get(exercise_tracker_id)
 
-        if not exercise_to_delete:
+        if not exercise_to_delete or not exercise_to_delete.is_active:
             message = f"Exercise with ID {exercise_tracker_id} not found."
             flash(message, "Error")
             logger.error(message)
@@ -172,10 +267,319 @@ def delete_exercise_tracker(exercise_tracker_id):
             logger.error(message)
             return redirect(url_for("user.dashboard"))
 
-        session_db.delete(exercise_to_delete)
+        # Soft delete; the archiver moves the entry out of the hot table later
+        exercise_to_delete.is_active = False
+        refresh_rollups(session_db, user.id, exercise_to_delete.date)
         session_db.commit()
+        bump_data_version(user.id)
         session_db.close()
 
         message = "Exercise deleted successfully."
         flash(message, "Success")
         return redirect(url_for("user.dashboard"))
+
+
+def _encode_cursor(entry_date: datetime, archived: bool, entry_id: int) -> str:
+    cursor = f"{entry_date.isoformat()}|{entry_id}|{int(archived)}"
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str):
+    try:
+        # Cursors from before archived entries were listed have no archived flag; they point at hot entries
+        entry_date, entry_id, *archived = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(entry_date), bool(int(archived[0])) if archived else False, int(entry_id)
+    except (ValueError, IndexError):
+        raise ValueError("Invalid cursor.")
+
+
+def _serialize(row) -> dict:
+    record = row._asdict()
+    record['date'] = record['date'].isoformat()
+    return record
+
+
+@tracker_router.route("/api/exercises")
+@session_token_required
+def api_exercises():
+    """
+    List the current user's exercise entries as JSON, newest first.
+
+    Archived entries are listed too, flagged with `archived` (their ids are only unique among archived entries);
+    on the same date they come before hot entries, like on the dashboard.
+
+    Query parameters:
+        - fields: Comma separated columns to return (defaults to all of `API_FIELDS`).
+        - start, end: Optional ISO dates bounding the entries.
+        - limit, cursor: Keyset pagination on (date, archived, id); pass back `next_cursor` to get the next page.
+        - format: `ndjson` streams every matching entry, one JSON object per line, in constant memory.
+    """
+    user_id = g.current_user.id
+
+    try:
+        params = parse_exercise_query(request.args)
+    except ValueError as e:
+        logger.error(f"Invalid exercise API request: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            # Runs after the request context is gone, so the session is routed to the user's shard explicitly
+            with Session(user_id=user_id) as session_db:
+                rows = session_db.execute(query_exercises(user_id, params),
+                                          execution_options={'yield_per': API_STREAM_BATCH_SIZE})
+                for row in rows:
+                    yield json.dumps(_serialize(row)) + "\n"
+
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    with Session() as session_db:
+        page = exercise_page(session_db, user_id, params)
+    return jsonify(page)
+
+
+def _parse_end(value: str) -> datetime:
+    """Parse the `end` of the exercise API into an exclusive bound: a date covers that whole day."""
+    try:
+        end_day = date.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value) + timedelta(microseconds=1)
+    return datetime(end_day.year, end_day.month, end_day.day) + timedelta(days=1)
+
+
+def parse_exercise_query(args) -> dict:
+    """
+    Parse the query parameters of the exercise API.
+
+    Args:
+        args: The request arguments.
+
+    Returns:
+        dict: The ``fields`` to return, the page ``limit``, the ``start`` / ``end`` bounds (``end`` exclusive, and
+        a date-only ``end`` includes that day like the dashboard and reports) and the decoded ``cursor``.
+
+    Raises:
+        ValueError: If any parameter is invalid.
+    """
+    fields = [field for field in args.get('fields', ','.join(API_FIELDS)).split(',') if field]
+    unknown_fields = set(fields) - set(API_FIELDS)
+    if unknown_fields:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown_fields))}.")
+    fields = ['id', 'date'] + [field for field in fields if field not in ('id', 'date')]
+
+    limit = min(int(args.get('limit', API_DEFAULT_LIMIT)), API_MAX_LIMIT)
+    if limit < 1:
+        raise ValueError("Limit must be positive.")
+
+    start = args.get('start')
+    end = args.get('end')
+    return {
+        'fields': fields,
+        'limit': limit,
+        'start': datetime.fromisoformat(start) if start else None,
+        'end': _parse_end(end) if end else None,
+        'cursor': _decode_cursor(args['cursor']) if args.get('cursor') else None,
+    }
+
+
+def query_exercises(user_id: int, params: dict, limit: int = None):
+    """
+    Build the query of a user's active entries, hot and archived, matching parsed API parameters, newest first.
+
+    Entries are ordered by (date, archived, id) descending. Each table is filtered, sorted and, for a page, limited
+    on its own through its (user_id, date) index before the two are merged, so a page costs the same however long
+    the user's history is.
+
+    Args:
+        user_id (int): The owner of the entries.
+        params (dict): The result of `parse_exercise_query`.
+        limit (int, optional): Most entries to return; all of them when omitted.
+
+    Returns:
+        Select: The query, with the requested fields plus `archived`.
+    """
+    selects = []
+    for archived, model in ((True, ArchivedExerciseTracker), (False, DailyExerciseTracker)):
+        statement = select(*[getattr(model, field) for field in params['fields']],
+                           literal(archived).label('archived')).where(
+            model.user_id == user_id,
+            model.is_active.is_(True),
+        )
+        if params['start']:
+            statement = statement.where(model.date >= params['start'])
+        if params['end']:
+            statement = statement.where(model.date < params['end'])
+        if params['cursor']:
+            cursor_date, cursor_archived, cursor_id = params['cursor']
+            # The table's place in the order relative to the cursor's decides how entries on its date compare
+            if archived == cursor_archived:
+                statement = statement.where(or_(model.date < cursor_date,
+                                                and_(model.date == cursor_date, model.id < cursor_id)))
+            elif cursor_archived:
+                statement = statement.where(model.date <= cursor_date)
+            else:
+                statement = statement.where(model.date < cursor_date)
+        if limit is not None:
+            statement = statement.order_by(model.date.desc(), model.id.desc()).limit(limit)
+        selects.append(select(statement.subquery()))
+
+    entries = union_all(*selects).subquery('entries')
+    query = select(entries).order_by(entries.c.date.desc(), entries.c.archived.desc(), entries.c.id.desc())
+    return query if limit is None else query.limit(limit)
+
+
+def exercise_page(session_db, user_id: int, params: dict) -> dict:
+    """Fetch one page of the exercise API, with the cursor of the next page if there is one."""
+    limit = params['limit']
+    rows = session_db.execute(query_exercises(user_id, params, limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].date, rows[-1].archived, rows[-1].id)
+
+    return {"data": [_serialize(row) for row in rows], "next_cursor": next_cursor}
+
+
+@tracker_router.route("/api/insights")
+@session_token_required
+def api_insights():
+    """
+    Get the current user's trends and records as JSON: rolling averages, week-over-week deltas, streaks,
+    percentiles and personal bests. Empty when the user has no entries yet.
+    """
+    with Session() as session_db:
+        insights = get_insights(session_db, g.current_user.id)
+    return jsonify(insights or {})
+
+
+@tracker_router.route("/api/chart/<action>")
+@session_token_required
+def api_chart(action):
+    """
+    Get the chart series of a report as compact JSON: per metric, parallel arrays of epoch-millisecond
+    timestamps (`t`) and values (`v`), downsampled to at most REPORT_MAX_POINTS points.
+
+    Takes the `range`, `start`, `end` and `bucket` arguments of the report pages, plus `delta=1` to send each
+    timestamp but the first as the difference to the previous one. The body is gzip-compressed for clients that
+    accept it, and its ETag only changes with the user's data, so unchanged charts are revalidated with a 304.
+    """
+    if action not in REPORT_ACTIONS:
+        return jsonify({"error": f"Unknown chart {action}."}), 404
+    try:
+        window = parse_report_window(request.args, datetime.now().date())
+    except ValueError as e:
+        return jsonify({"error": f"Invalid report window: {str(e)}"}), 400
+
+    user = g.current_user
+    delta = request.args.get('delta', '').lower() in ('1', 'true', 'yes')
+    gzipped = request.accept_encodings['gzip'] > 0
+
+    response = None
+    if response_cache is not None:
+        cache_key, etag = page_cache_key(user)
+        if gzipped:
+            cache_key, etag = f"{cache_key}:gzip", f"{etag}-gzip"
+        response = cached_page(cache_key, etag, mimetype="application/json")
+
+    if response is None:
+        with Session() as session_db:
+            report = build_report(session_db, user.id, window['start'], window['end'], window['bucket'])
+        payload = {
+            "bucket": window['bucket'],
+            "start": window['start'].isoformat(),
+            "end": window['end'].isoformat(),
+            "delta": delta,
+            "series": encode_series(chart_series(report, REPORT_ACTIONS[action]), delta),
+        }
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        response = Response(gzip.compress(body) if gzipped else body, mimetype="application/json")
+        if response_cache is not None:
+            response = store_page(cache_key, etag, response)
+        else:
+            response.add_etag()
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.make_conditional(request)
+
+    if gzipped and response.status_code == 200:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def _parse_leaderboard_args(args) -> tuple:
+    day = date.fromisoformat(args['week']) if args.get('week') else datetime.now().date()
+    limit = min(int(args.get('limit', LEADERBOARD_DEFAULT_SIZE)), LEADERBOARD_MAX_SIZE)
+    if limit < 1:
+        raise ValueError("Limit must be positive.")
+    return day, limit
+
+
+@tracker_router.route("/leaderboard/<metric>")
+@session_token_required
+def leaderboard(metric):
+    if metric not in LEADERBOARD_METRICS:
+        flash("Invalid leaderboard.", "Error")
+        return redirect(url_for("user.dashboard"))
+
+    try:
+        day, limit = _parse_leaderboard_args(request.args)
+    except ValueError as e:
+        message = f"Invalid leaderboard request: {str(e)}"
+        flash(message, "Error")
+        logger.error(message)
+        return redirect(url_for("tracker.leaderboard", metric=metric))
+
+    user = g.current_user
+    with Session() as session_db:
+        entries = weekly_leaderboard(session_db, metric, day, limit)
+        own_total = weekly_total(session_db, metric, user.id, day)
+    week = week_start(day)
+    return render_template("leaderboard.html", user=user.fullname, metric=metric, entries=entries,
+                           own_total=own_total, week_start=week, previous_week=week - timedelta(days=7),
+                           next_week=week + timedelta(days=7), metrics=LEADERBOARD_METRICS)
+
+
+@tracker_router.route("/api/leaderboard/<metric>")
+@session_token_required
+def api_leaderboard(metric):
+    """
+    Get the top users by weekly total of a metric as JSON.
+
+    Query parameters:
+        - week: Any ISO date of the week to rank (defaults to the current week).
+        - limit: Number of users to return, at most `LEADERBOARD_MAX_SIZE`.
+    """
+    if metric not in LEADERBOARD_METRICS:
+        return jsonify({"error": f"Unknown leaderboard {metric}."}), 404
+
+    try:
+        day, limit = _parse_leaderboard_args(request.args)
+    except ValueError as e:
+        logger.error(f"Invalid leaderboard API request: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+    with Session() as session_db:
+        entries = weekly_leaderboard(session_db, metric, day, limit)
+        own_total = weekly_total(session_db, metric, g.current_user.id, day)
+    return jsonify({"metric": metric, "week_start": week_start(day).isoformat(), "entries": entries,
+                    "own_total": own_total})
+
+
+@tracker_router.route("/export/<export_format>")
+@session_token_required
+def export_exercise_tracker(export_format):
+    if export_format not in EXPORT_FORMATS:
+        flash("Invalid export format.", "Error")
+        return redirect(url_for("user.dashboard"))
+
+    user = g.current_user
+    exporter, mimetype, filename = EXPORT_FORMATS[export_format]
+
+    def generate():
+        with Session() as session_db:
+            yield from exporter(session_db, user.id)
+
+    logger.info(f"Exporting exercise history of user {user.username} as {export_format}.")
+    return Response(generate(), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
@@ -1,12 +1,17 @@
 import logging
 from datetime import datetime, timedelta
 
-from flask import Blueprint, render_template, session, redirect, url_for, request, flash, make_response
-from sqlalchemy import or_
+from flask import Blueprint, render_template, session, redirect, url_for, request, flash, make_response, g
+from sqlalchemy import or_, select
 
+from archive import active_entries
 from log_config import setup_logging
-from models import User, Session, DailyExerciseTracker
-from utils import hash_password, verify_password, create_token, session_token_required
+from models import User, Session
+from reports import REPORT_RANGES, parse_report_window
+from response_cache import cached_response
+from session_store import session_store, rotate_session
+from utils import hash_password, verify_password, password_needs_rehash, create_token, session_token_required, \
+    PasswordHasherBusy
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -44,17 +49,36 @@ def login():
                 logger.error(message)
                 return redirect(url_for("user.login"))
 
-            if not verify_password(password, user.password):
-                message = "Invalid password."
+            if not user.is_active:
+                message = f"The account of {user.username} is deactivated."
                 flash(message, "Error")
                 logger.error(message)
                 return redirect(url_for("user.login"))
 
-            tokens = create_token(user.username)
+            try:
+                if not verify_password(password, user.password):
+                    message = "Invalid password."
+                    flash(message, "Error")
+                    logger.error(message)
+                    return redirect(url_for("user.login"))
+
+                if password_needs_rehash(user.password):
+                    user.password = hash_password(password)
+                    session_db.commit()
+                    logger.info(f"Re-hashed password of user {user.username} with the current work factor.")
+            except PasswordHasherBusy as e:
+                message = str(e)
+                flash(message, "Error")
+                logger.error(message)
+                return redirect(url_for("user.login"))
+
+            rotate_session()
             session['user_name'] = user.username
             session.permanent = True
             resp = make_response(redirect(url_for('user.dashboard')))
-            resp.set_cookie('token', tokens["access_token"], httponly=True, secure=True)
+            if session_store is None:
+                tokens = create_token(user.username)
+                resp.set_cookie('token', tokens["access_token"], httponly=True, secure=True)
             logger.info(f"User {user.fullname} logged in successfully.")
             return resp
 
@@ -88,7 +112,15 @@ def signup():
                 logger.error(message)
                 return redirect(url_for("user.signup"))
 
-            user = User(username=username, fullname=fullname, email=email, password=hash_password(password))
+            try:
+                hashed_password = hash_password(password)
+            except PasswordHasherBusy as e:
+                message = str(e)
+                flash(message, "Error")
+                logger.error(message)
+                return redirect(url_for("user.signup"))
+
+            user = User(username=username, fullname=fullname, email=email, password=hashed_password)
             session_db.add(user)
             session_db.commit()
             message = f"User {username} signed up successfully."
@@ -101,6 +133,7 @@ def signup():
 @user_router.route("/logout")
 def logout():
     session.pop('user_name', None)
+    rotate_session()
     resp = make_response(redirect(url_for('user.index')))
     resp.delete_cookie('token')
     flash("Logged out successfully", "Success")
@@ -109,22 +142,37 @@ def logout():
 
 @user_router.route("/dashboard")
 @session_token_required
+@cached_response
 def dashboard():
-    username = session['user_name']
+    try:
+        window = parse_report_window(request.args, datetime.now().date())
+    except ValueError as e:
+        message = f"Invalid dashboard window: {str(e)}"
+        flash(message, "Error")
+        logger.error(message)
+        return redirect(url_for("user.dashboard"))
+
+    user = g.current_user
     with Session() as session_db:
-        user = session_db.query(User).filter_by(username=username).first()
+        dashboard_data = load_dashboard(session_db, user.id, window)
+    return render_dashboard(user, window, dashboard_data)
 
-        today = datetime.now()
-        seven_days_ago = today - timedelta(days=7)
 
-        # Query to get data for current user from the last 7 days
+def load_dashboard(session_db, user_id: int, window: dict) -> dict:
+    """Load the entries listed on the dashboard for a window; the chart loads its series from the chart API."""
+    start_day, end_day = window['start'], window['end']
 
-        user_exercises = session_db.query(DailyExerciseTracker).filter(
-            DailyExerciseTracker.user_id == user.id,
-            DailyExerciseTracker.date >= seven_days_ago,
-            DailyExerciseTracker.date <= today
-        ).all()
+    # Query to get data for current user within the selected window (the last 7 days by default), hot and archived
+    entries = active_entries(user_id, datetime(start_day.year, start_day.month, start_day.day),
+                             datetime(end_day.year, end_day.month, end_day.day) + timedelta(days=1))
+    # Same order as the exercise API
+    user_exercises = session_db.execute(
+        select(entries).order_by(entries.c.date.desc(), entries.c.archived.desc(), entries.c.id.desc())
+    ).all()
+    return {'user_exercises': user_exercises}
 
-        user_exercises = sorted(user_exercises, key=lambda exercise: exercise.date, reverse=True)
 
-        return render_template("dashboard.html", user=user.fullname, user_exercises=user_exercises)
+def render_dashboard(user, window: dict, dashboard_data: dict) -> str:
+    """Render the dashboard page from the result of `load_dashboard`."""
+    return render_template("dashboard.html", user=user.fullname, window=window, ranges=REPORT_RANGES,
+                           **dashboard_data)
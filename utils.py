@@ -1,14 +1,23 @@
+import hashlib
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta, timezone
 from functools import wraps
+from typing import NamedTuple, Optional
 
 import bcrypt
 import jwt
 from dotenv import load_dotenv
-from flask import session, redirect, url_for, request, flash
+from flask import session, redirect, url_for, request, flash, g, has_request_context
+from sqlalchemy import event, inspect
 
+from cache import LRUCache
 from log_config import setup_logging
+from models import Session, User, set_current_user_resolver
+from session_store import session_store
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -19,6 +28,20 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
 
+# Authenticated user cache; entries are dropped when the user row changes in this process, so the TTL
+# only bounds how long other worker processes may serve a stale identity
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+
+# Verified token cache; entries expire together with the token itself
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+# Password hashing runs on a dedicated, bounded pool so login storms cannot pin every request thread
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", 10))
+
 # JWT Claim Keys
 SUBJECT_KEY = "sub"
 EXPIRATION_KEY = "exp"
@@ -26,20 +49,75 @@ EXPIRATION_KEY = "exp"
 setup_logging()
 logger = logging.getLogger(__name__)
 
+user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+# Caps hashing jobs that are queued or running; beyond it callers are turned away instead of piling up
+password_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE_SIZE)
+
+
+def _request_user_id():
+    """The id of the user authenticated by `session_token_required` for the current request, else None."""
+    if has_request_context() and 'current_user' in g:
+        return g.current_user.id
+    return None
+
+
+# Sessions opened while serving a request are routed to the shard of its user
+set_current_user_resolver(_request_user_id)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool is saturated or too slow to answer."""
+
+
+class CurrentUser(NamedTuple):
+    """Identity of the authenticated user, resolved once per request by `session_token_required`."""
+    id: int
+    username: str
+    fullname: str
+
 
 # Utility functions for password hashing and verification
+def _run_password_task(task, *args):
+    """
+    Run a bcrypt call on the password hashing pool and wait for its result.
+
+    Raises:
+        PasswordHasherBusy: If the pool's queue is full or the result takes too long.
+    """
+    if not password_slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many password checks in progress, please try again.")
+
+    try:
+        future = password_executor.submit(task, *args)
+    except Exception:
+        password_slots.release()
+        raise
+    future.add_done_callback(lambda _: password_slots.release())
+
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        raise PasswordHasherBusy("Password check timed out, please try again.")
+
+
 def hash_password(password: str) -> str:
     """
-    Hash a password using bcrypt.
+    Hash a password using bcrypt with the configured work factor.
 
     Args:
         password (str): The password to hash.
 
     Returns:
         str: The hashed password.
+
+    Raises:
+        PasswordHasherBusy: If the password hashing pool is saturated.
     """
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    hashed_password = _run_password_task(bcrypt.hashpw, password.encode('utf-8'), salt)
     return hashed_password.decode('utf-8')
 
 
@@ -53,8 +131,27 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
     Returns:
         bool: True if the password is valid, False otherwise.
+
+    Raises:
+        PasswordHasherBusy: If the password hashing pool is saturated.
+    """
+    return _run_password_task(bcrypt.checkpw, plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Check whether a stored hash was made with a different work factor than the configured one.
+
+    Args:
+        hashed_password (str): The stored bcrypt hash, e.g. ``$2b$12$...``.
+
+    Returns:
+        bool: True if the password should be re-hashed.
     """
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
 
 
 def create_token(subject: str) -> dict:
@@ -96,6 +193,9 @@ def get_current_user(token: str) -> str:
     """
     Extract the current user from the JWT token.
 
+    Verified tokens are memoized by their hash until they expire, so repeated requests with the same
+    token skip the signature check.
+
     Args:
         token (str): The JWT token.
 
@@ -105,6 +205,11 @@ def get_current_user(token: str) -> str:
     Raises:
         ValueError: If the token is invalid or expired.
     """
+    token_hash = hashlib.sha256(token.encode('utf-8')).digest()
+    username = token_cache.get(token_hash)
+    if username is not None:
+        return username
+
     try:
         # Decode the JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -113,6 +218,11 @@ def get_current_user(token: str) -> str:
         if not username:
             raise ValueError("Invalid token: No subject found")
 
+        expires_in = payload[EXPIRATION_KEY] - time.time() if EXPIRATION_KEY in payload else None
+        if expires_in is None or expires_in > 0:
+            token_cache.set(token_hash, username,
+                            expires_at=None if expires_in is None else time.monotonic() + expires_in)
+        logger.info(f"Token verified for user {username}.")
         return username
 
     except jwt.ExpiredSignatureError:
@@ -121,6 +231,43 @@ def get_current_user(token: str) -> str:
         raise ValueError("Invalid token")
 
 
+def load_current_user(username: str) -> Optional[CurrentUser]:
+    """
+    Resolve a username to the authenticated user's identity, using the in-process user cache.
+
+    Args:
+        username (str): The username taken from the session.
+
+    Returns:
+        CurrentUser: The user's id, username and full name, or None if no such active user exists.
+    """
+    current_user = user_cache.get(username)
+    if current_user is not None:
+        return current_user
+
+    with Session() as session_db:
+        row = session_db.query(User.id, User.username, User.fullname).filter(
+            User.username == username,
+            User.is_active.is_(True),
+        ).first()
+
+    if not row:
+        return None
+
+    current_user = CurrentUser(*row)
+    user_cache.set(username, current_user)
+    return current_user
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    """Drop a changed or deleted user from the user cache, under its old and new username."""
+    history = inspect(target).attrs.username.history
+    for username in (target.username, *history.deleted):
+        user_cache.pop(username)
+
+
 def session_token_required(func):
     """
         Decorator to validate session and token before accessing the route.
@@ -131,6 +278,10 @@ def session_token_required(func):
 
         Returns:
             - The original function if valid session and token; otherwise, redirects to login page.
+            The authenticated user is available to the view as `g.current_user`.
+
+        With a server-side session store (SESSION_STORE) the session itself cannot be forged and is revoked on
+        logout, so the JWT `token` cookie is not checked.
         """
 
     @wraps(func)
@@ -140,27 +291,37 @@ def session_token_required(func):
             logger.error("Invalid session: Attempt to access with no session.")
             return redirect(url_for('user.login'))
 
-        token = request.cookies.get('token')
-        if not token:
-            flash("Invalid token: Attempt to access with no token.", "Error")
-            logger.error("Invalid token: Attempt to access with no token.")
-            return redirect(url_for('user.login'))
+        cookies_username = session['user_name']
+        if session_store is None:
+            token = request.cookies.get('token')
+            if not token:
+                flash("Invalid token: Attempt to access with no token.", "Error")
+                logger.error("Invalid token: Attempt to access with no token.")
+                return redirect(url_for('user.login'))
 
-        try:
-            cookies_username = get_current_user(token)
-            if cookies_username != session.get('user_name'):
-                flash(f"Token mismatch: Attempt to access with invalid token for user {session.get('user_name')}",
-                      "Error")
-                logger.error(
-                    f"Token mismatch: Attempt to access with invalid token for user {session.get('user_name')}")
+            try:
+                cookies_username = get_current_user(token)
+                if cookies_username != session.get('user_name'):
+                    flash(f"Token mismatch: Attempt to access with invalid token for user {session.get('user_name')}",
+                          "Error")
+                    logger.error(
+                        f"Token mismatch: Attempt to access with invalid token for user {session.get('user_name')}")
+                    return redirect(url_for('user.login'))
+            except Exception as e:
+                flash(f"Token validation error: {str(e)}", "Error")
+                logger.error(f"Token validation error: {str(e)}")
+                session.pop('user_name', None)
                 return redirect(url_for('user.login'))
-        except Exception as e:
-            flash(f"Token validation error: {str(e)}", "Error")
-            logger.error(f"Token validation error: {str(e)}")
+
+        current_user = load_current_user(cookies_username)
+        if current_user is None:
+            flash(f"Invalid session: User {cookies_username} no longer exists.", "Error")
+            logger.error(f"Invalid session: User {cookies_username} no longer exists.")
             session.pop('user_name', None)
             return redirect(url_for('user.login'))
+        g.current_user = current_user
 
-        logger.info(f"Session and token validated successfully for user {session.get('user_name')}.")
+        logger.debug(f"Session and token validated successfully for user {session.get('user_name')}.")
         return func(*args, **kwargs)
 
     return wrapper
@@ -0,0 +1,213 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+from log_config import setup_logging
+from models import Session, shard_for_user
+from response_cache import bump_data_version
+from rollup import add_to_rollups
+
+load_dotenv()
+
+# Hand new tracker entries to a background writer that commits them in groups instead of one commit per request
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE", "false").lower() in ("1", "true", "yes")
+# Entries waiting to be written before submitters are made to wait (back-pressure)
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", 10000))
+# A group is committed once it holds this many entries or its first entry has waited this long; with no wait a
+# group is whatever queued up while the previous commit ran
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", 500))
+WRITE_QUEUE_FLUSH_MS = float(os.getenv("WRITE_QUEUE_FLUSH_MS", 0))
+# How long a submitter waits for room in a full queue before it is turned away
+WRITE_QUEUE_PUT_TIMEOUT_SECONDS = float(os.getenv("WRITE_QUEUE_PUT_TIMEOUT_SECONDS", 5))
+# `commit` acknowledges a submission once its group is committed; `enqueue` as soon as it is queued, which is
+# faster but loses the queued entries if the process crashes and lets the next page miss them for a moment
+WRITE_QUEUE_ACK = os.getenv("WRITE_QUEUE_ACK", "commit").lower()
+# How long a request waits for its group to be committed before it is answered with a 503
+WRITE_QUEUE_ACK_TIMEOUT_SECONDS = float(os.getenv("WRITE_QUEUE_ACK_TIMEOUT_SECONDS", 10))
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueFull(Exception):
+    """Raised when the write queue stays full for longer than the put timeout."""
+
+
+class WriteQueue:
+    """
+    A bounded queue of new tracker entries written by one background thread in group commits.
+
+    Each group is inserted, its rollups refreshed and committed in a single transaction, so many concurrent
+    submissions share one commit (and one SQLite write lock). Entries still queued when the process exits
+    are flushed by `close()`, which is registered with atexit.
+
+    Args:
+        maxsize (int): Entries waiting to be written before `submit()` blocks.
+        batch_size (int): Most entries committed per group.
+        flush_ms (float): Longest time the first entry of a group waits for more entries.
+    """
+
+    def __init__(self, maxsize: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_QUEUE_BATCH_SIZE,
+                 flush_ms: float = WRITE_QUEUE_FLUSH_MS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.commits = 0
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._writer.start()
+
+    def submit(self, entry, timeout: float = WRITE_QUEUE_PUT_TIMEOUT_SECONDS) -> Future:
+        """
+        Queue a new, validated tracker entry for the next group commit.
+
+        Args:
+            entry (DailyExerciseTracker): The entry to insert; it must not belong to a session.
+            timeout (float, optional): Seconds to wait for room in a full queue. Defaults to
+                WRITE_QUEUE_PUT_TIMEOUT_SECONDS.
+
+        Returns:
+            Future: Resolved with the entry once its group is committed, or with the error that prevented it.
+
+        Raises:
+            WriteQueueFull: If the queue is still full after `timeout` seconds, or is closed.
+        """
+        if self._closed.is_set():
+            raise WriteQueueFull("The write queue is shutting down, please try again.")
+
+        future = Future()
+        try:
+            self.queue.put((entry, future), timeout=timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise WriteQueueFull("Too many entries are waiting to be saved, please try again.")
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "commits": self.commits,
+        }
+
+    def close(self, timeout: float = 30):
+        """Stop accepting entries, write everything still queued and stop the writer thread."""
+        self._closed.set()
+        self._writer.join(timeout)
+
+    def _next_group(self) -> list:
+        """Wait for an entry, then collect more until the group is full or its flush deadline passes."""
+        try:
+            group = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_seconds
+        while len(group) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                group.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            if group:
+                self._write(group)
+            elif self._closed.is_set():
+                return
+
+    def _write(self, group: list):
+        try:
+            self._commit([entry for entry, _ in group])
+        except Exception as e:
+            logger.error(f"Group commit of {len(group)} entries failed, writing them one by one: {str(e)}")
+            # Isolate the entries that cannot be written instead of failing the whole group
+            for item in group:
+                self._write_one(*item)
+            return
+
+        self.written += len(group)
+        for entry, future in group:
+            future.set_result(entry)
+
+    def _write_one(self, entry, future: Future):
+        try:
+            self._commit([entry])
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to write the exercise entry of user {entry.user_id}: {str(e)}")
+            future.set_exception(e)
+            return
+        self.written += 1
+        future.set_result(entry)
+
+    def _commit(self, entries: list):
+        # One transaction per shard the group's users live on
+        by_shard = {}
+        for entry in entries:
+            by_shard.setdefault(shard_for_user(entry.user_id), []).append(entry)
+
+        for shard, shard_entries in by_shard.items():
+            with Session(shard=shard, expire_on_commit=False) as session_db:
+                session_db.add_all(shard_entries)
+                add_to_rollups(session_db, shard_entries)
+                try:
+                    session_db.commit()
+                except Exception:
+                    session_db.rollback()
+                    session_db.expunge_all()
+                    raise
+                session_db.expunge_all()
+        self.commits += 1
+
+        for user_id in {entry.user_id for entry in entries}:
+            bump_data_version(user_id)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def _forget_write_queue():
+    # A forked child has a copy of the queue but not the writer thread; it starts its own on first use
+    global _write_queue, _write_queue_lock
+    _write_queue = None
+    _write_queue_lock = threading.Lock()
+
+
+def _close_write_queue():
+    if _write_queue is not None:
+        _write_queue.close()
+
+
+def get_write_queue():
+    """The process's write queue, started on first use; None when WRITE_QUEUE is disabled."""
+    global _write_queue
+
+    if not WRITE_QUEUE_ENABLED:
+        return None
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteQueue()
+    return _write_queue
+
+
+atexit.register(_close_write_queue)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_write_queue)
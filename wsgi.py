@@ -0,0 +1,34 @@
+"""
+Production WSGI entry point.
+
+Serve it with a pre-forking server that loads the app once in the master, e.g. with the settings of
+`gunicorn.conf.py`:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+At import the app is created (the schema is only created or migrated when it is not current), every template
+is compiled, the connections opened meanwhile are closed so no worker inherits them, and the objects loaded so
+far are frozen out of the garbage collector, so forked workers share those pages instead of copying them.
+Each worker then warms its own connection pool (see `post_fork` in `gunicorn.conf.py`).
+"""
+import gc
+import logging
+import time
+
+from log_config import setup_logging
+from main_app import create_app, warm_up
+from models import database_engines
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+started = time.perf_counter()
+app = create_app()
+templates = warm_up(app)
+
+# Connections must not be shared across processes; workers open their own after forking
+for db_engine in database_engines():
+    db_engine.dispose()
+gc.collect()
+gc.freeze()
+
+logger.info(f"Application loaded in {(time.perf_counter() - started) * 1000:.0f} ms ({templates} templates compiled)")